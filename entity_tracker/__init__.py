@@ -10,7 +10,18 @@ This package provides comprehensive entity tracking capabilities including:
 
 __version__ = "1.0.0"
 
-from entity_tracker.agent import graph
+from entity_tracker.agent import graph, build_graph
+from entity_tracker.batch import track_entities
+from entity_tracker.metrics import get_pipeline_metrics, reset_pipeline_metrics
+from entity_tracker.sources import SourceAdapter, register_source_adapter
 
-__all__ = ["graph"]
+__all__ = [
+    "graph",
+    "build_graph",
+    "track_entities",
+    "get_pipeline_metrics",
+    "reset_pipeline_metrics",
+    "SourceAdapter",
+    "register_source_adapter",
+]
 
@@ -6,7 +6,11 @@ including entity initialization, multi-source search, source review,
 and timeline curation.
 """
 
-from typing import Literal
+import asyncio
+import functools
+import threading
+import time
+from typing import AsyncIterator, Iterable, List, Literal, Optional, Tuple, get_type_hints
 from datetime import datetime
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
@@ -15,6 +19,7 @@ from langgraph.graph import START, END, StateGraph
 from langgraph.pregel._retry import RetryPolicy
 from langgraph.types import Command
 from langchain_core.documents import Document
+from typing_extensions import TypedDict
 
 from entity_tracker.configuration import Configuration
 from entity_tracker.state import (
@@ -25,6 +30,7 @@ from entity_tracker.state import (
 from entity_tracker.schemas import (
     Queries,
     SourcesReview,
+    SourcesTriage,
     EntityHistory,
     EntityHistoryEntry,
     SourceModel,
@@ -32,20 +38,32 @@ from entity_tracker.schemas import (
     ShouldUpdateEntityHistory,
 )
 from entity_tracker.utils import (
+    ACCEPT,
+    ESCALATE,
+    RunningTopK,
     create_llm_configs,
     create_llm_from_config,
     parse_and_cap_sources,
+    chunk_sources,
+    classify_entries,
+    cluster_sources,
+    prefilter_sources,
+    profile_vector,
+    select_relevant,
+    window_start_for,
 )
-from entity_tracker.tools import (
-    search_web_tool,
-    mock_email_search,
-    mock_youtube_search,
-    mock_speeches_search,
-    mock_scraper_search,
+from entity_tracker.metrics import stage_metrics
+from entity_tracker.sources import (
+    SOURCE_TYPES,
+    SourceAdapter,
+    get_source_adapter,
+    source_adapters,
 )
 from entity_tracker.database import (
-    get_entity_history,
-    save_entity_history_entry,
+    get_entity_history_projections,
+    asave_entity_history_entry,
+    enqueue_entity_history_entry,
+    make_idempotency_key,
 )
 
 
@@ -76,26 +94,22 @@ async def initialize_search(state: EntityTrackerInput, config: RunnableConfig):
     else:
         full_entity_name = entity_name
     
-    # Retrieve existing entity history
+    # Retrieve existing entity history, plus a version without sources for
+    # prompts that don't need them (both are cached until the entity changes)
     last_hours = configurable.entity_history_last_hours
-    entity_history = get_entity_history(
+    entity_history, entity_history_without_sources = get_entity_history_projections(
         entity_id=entity_id,
         last_hours=last_hours,
         current_date=current_date,
         limit=configurable.entity_history_entry_limit
     )
     
-    # Create version without sources for prompts that don't need them
-    entity_history_without_sources = EntityHistory(
-        entries=[
-            EntityHistoryEntry(content=entry.content, sources=[])
-            for entry in entity_history.entries
-        ]
-    )
-    
     # Get graph settings (custom queries, prompts, etc.)
     graph_settings = state.get("graph_settings", {})
     
+    # Start the run deadline, if any
+    run_deadline = time.time() + configurable.run_deadline_seconds if configurable.run_deadline_seconds else None
+    
     return {
         "entity_history": entity_history,
         "entity_history_without_sources": entity_history_without_sources,
@@ -104,16 +118,32 @@ async def initialize_search(state: EntityTrackerInput, config: RunnableConfig):
         "main_entity_name": entity_name,
         "related_entity_name": related_entity_name,
         "graph_settings": graph_settings,
-        "current_date": current_date
+        "current_date": current_date,
+        "run_deadline": run_deadline
     }
 
 
+def base_queries(state: EntityTrackerState) -> List[str]:
+    """Return the queries known before query generation: the entity name and any custom queries."""
+    queries_list = [state.get("entity_name")]
+    
+    # Add any custom queries from graph settings
+    if state.get("graph_settings"):
+        search_queries = state.get("graph_settings").get("search_queries", [])
+        queries_list.extend(search_queries)
+    
+    return queries_list
+
+
 async def create_universal_queries(state: EntityTrackerState, config: RunnableConfig):
     """Create universal search queries for the entity."""
     configurable = Configuration.from_runnable_config(config)
     
+    # Start with base queries, which the search nodes are already running
+    queries_list = base_queries(state)
+    
     if not configurable.create_universal_queries_enabled:
-        return {"queries": []}
+        return {"queries": queries_list}
     
     llm_configs = create_llm_configs(configurable)
     llm_query_creator = await create_llm_from_config(llm_configs["llm_query_creator"], Queries)
@@ -121,334 +151,521 @@ async def create_universal_queries(state: EntityTrackerState, config: RunnableCo
     entity_history = (state["entity_history"] if configurable.create_queries_pass_previous_entries_sources 
                      else state["entity_history_without_sources"])
     
-    # Start with base queries
-    queries_list = [state.get("entity_name")]
-    
-    # Add any custom queries from graph settings
-    if state.get("graph_settings"):
-        search_queries = state.get("graph_settings").get("search_queries", [])
-        queries_list.extend(search_queries)
-    
-    # Generate additional queries
-    queries = await llm_query_creator.ainvoke([
-        SystemMessage(content=configurable.universal_query_writer_system_instructions.format(
-            entity=state.get("entity_name"),
-            number_of_queries=configurable.universal_queries_number_of_queries,
-            current_date=state.get("current_date"),
-            queries=queries_list,
-            entity_history=entity_history
-        )),
-        HumanMessage(content="Please return a list of queries.")
-    ])
+    # Generate additional queries, unless that would run into the search deadline
+    try:
+        queries = await asyncio.wait_for(llm_query_creator.ainvoke([
+            SystemMessage(content=configurable.universal_query_writer_system_instructions.format(
+                entity=state.get("entity_name"),
+                number_of_queries=configurable.universal_queries_number_of_queries,
+                current_date=state.get("current_date"),
+                queries=queries_list,
+                entity_history=entity_history
+            )),
+            HumanMessage(content="Please return a list of queries.")
+        ]), seconds_left(sources_deadline(state, configurable)))
+    except asyncio.TimeoutError:
+        if configurable.debug:
+            print("Query generation ran into the run deadline; searching the base queries only")
+        return {"queries": queries_list}
     
     queries_list.extend(queries.queries[:configurable.universal_queries_number_of_queries])
     
     return {"queries": queries_list}
 
 
-async def search_web(state: EntityTrackerState, config: RunnableConfig):
-    """Search the web for entity-related content."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_web_enabled:
-        return {"web_sources": []}
-    
-    queries_list = state.get("queries", [state.get("entity_name")])
-    sources = []
-    
-    for query in queries_list:
-        results = search_web_tool(
-            query=query,
-            max_results=configurable.search_web_max_results,
-            last_days=configurable.search_web_last_days,
-            current_date=state.get("current_date"),
-        )
-        sources.extend(results)
-    
-    # Add source numbers
-    for i, source in enumerate(sources):
-        if source.metadata is None:
-            source.metadata = {}
-        source.metadata["source_number"] = i + 1
-    
-    # Cap source content length
-    capped_sources = parse_and_cap_sources(sources, max_length=configurable.source_content_max_length)
-    
-    return {"web_sources": capped_sources}
+def sources_deadline(state: EntityTrackerState, configurable: Configuration) -> Optional[float]:
+    """Return when source branches must finish for the run to meet its deadline, if it has one."""
+    if not state.get("run_deadline"):
+        return None
+    return state["run_deadline"] - configurable.run_deadline_reserve_seconds
 
 
-async def review_web_sources(state: EntityTrackerState, config: RunnableConfig):
-    """Review web sources and filter for relevance."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_web_enabled or not state.get("web_sources"):
-        return {"web_sources": []}
-    
-    llm_configs = create_llm_configs(configurable)
-    llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], SourcesReview)
-    
-    entity_history = (state["entity_history"] if configurable.review_sources_pass_previous_entries_sources
-                     else state["entity_history_without_sources"])
-    
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.sources_review_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            sources=state["web_sources"],
-            last_hours=configurable.search_web_last_hours,
-            entity_history=entity_history
-        )),
-        HumanMessage(content="Please review the sources and return numbers to keep.")
-    ])
-    
-    sources_to_keep = review_result.sources_to_keep
-    sources = [source for i, source in enumerate(state["web_sources"]) if i + 1 in sources_to_keep]
-    
-    return {"web_sources": sources}
+def seconds_left(deadline: Optional[float]) -> Optional[float]:
+    """Return the seconds until a deadline (never negative), or None without one."""
+    return None if deadline is None else max(0.0, deadline - time.time())
 
 
-async def search_email(state: EntityTrackerState, config: RunnableConfig):
-    """Search email for entity-related content."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_email_enabled:
-        return {"email_sources": []}
-    
-    queries_list = state.get("queries", [state.get("entity_name")])
-    sources = []
-    
-    for query in queries_list:
-        results = mock_email_search(
-            query=query,
-            max_results=configurable.search_email_max_results,
-            last_hours=configurable.search_email_last_hours,
-        )
-        sources.extend(results)
-    
-    # Add source numbers and cap content
+def number_sources(sources: list) -> list:
+    """Number sources from 1 in their metadata, in list order."""
     for i, source in enumerate(sources):
         if source.metadata is None:
             source.metadata = {}
         source.metadata["source_number"] = i + 1
-    
-    capped_sources = parse_and_cap_sources(sources, max_length=configurable.source_content_max_length)
-    return {"email_sources": capped_sources}
+    return sources
 
 
-async def review_email_sources(state: EntityTrackerState, config: RunnableConfig):
-    """Review email sources for relevance."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_email_enabled or not state.get("email_sources"):
-        return {"email_sources": []}
-    
-    llm_configs = create_llm_configs(configurable)
-    llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], SourcesReview)
-    
-    entity_history = (state["entity_history"] if configurable.review_sources_pass_previous_entries_sources
-                     else state["entity_history_without_sources"])
-    
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.sources_review_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            sources=state["email_sources"],
-            last_hours=configurable.search_email_last_hours,
-            entity_history=entity_history
-        )),
-        HumanMessage(content="Please review the sources.")
-    ])
-    
-    sources_to_keep = review_result.sources_to_keep
-    sources = [source for i, source in enumerate(state["email_sources"]) if i + 1 in sources_to_keep]
-    
-    return {"email_sources": sources}
+async def iter_search_results(
+    adapter: SourceAdapter,
+    queries_list: List[str],
+    state: EntityTrackerState,
+    configurable: Configuration,
+    timed_out_queries: List[str],
+    deadline: Optional[float] = None
+) -> AsyncIterator[Tuple[int, List[Document]]]:
+    """
+    Yield (query index, documents) for each query as soon as its search completes.
+    
+    Searches run in the adapter's thread pool, at most max_concurrency at a
+    time, each within the query timeout or the time left until the deadline,
+    whichever is shorter; adapters that accept a timeout get it too.
+    Queries that time out yield no documents and are appended to
+    timed_out_queries. A search keeps its concurrency slot until its thread
+    returns, even after its timeout, so abandoned calls still count against
+    the limit. Searches still running when the caller stops iterating are
+    abandoned the same way.
+    """
+    loop = asyncio.get_running_loop()
+    limiter = adapter.limiter()
+    query_timeout = adapter.query_timeout(configurable)
+    
+    async def run_query(index: int, query: str):
+        await limiter.acquire()
+        timeouts = [timeout for timeout in (query_timeout, seconds_left(deadline)) if timeout is not None]
+        timeout = min(timeouts) if timeouts else None
+        kwargs = {"timeout": timeout} if adapter.accepts_timeout and timeout is not None else {}
+        future = loop.run_in_executor(
+            adapter.executor(),
+            functools.partial(adapter.search, query, configurable, state.get("current_date"), **kwargs)
+        )
+        future.add_done_callback(lambda _: limiter.release())
+        try:
+            # Shielded, so giving up on the search doesn't mark it done while its thread still runs
+            return index, await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            timed_out_queries.append(query)
+            return index, []
+    
+    tasks = [asyncio.create_task(run_query(i, query)) for i, query in enumerate(queries_list)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
-async def search_youtube(state: EntityTrackerState, config: RunnableConfig):
-    """Search YouTube for entity-related content."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_youtube_enabled:
-        return {"youtube_sources": []}
-    
-    queries_list = state.get("queries", [state.get("entity_name")])
-    sources = []
-    
-    for query in queries_list:
-        results = mock_youtube_search(
-            query=query,
-            max_results=configurable.search_youtube_max_results,
-            last_days=configurable.search_youtube_last_days,
-        )
-        sources.extend(results)
-    
-    for i, source in enumerate(sources):
-        if source.metadata is None:
-            source.metadata = {}
-        source.metadata["source_number"] = i + 1
-    
-    capped_sources = parse_and_cap_sources(sources, max_length=configurable.source_content_max_length)
-    return {"youtube_sources": capped_sources}
+review_cascade_metrics = stage_metrics("review_cascade", rates={
+    "triage_keep_rate": ("triage_kept", "triaged"),
+    "triage_drop_rate": ("triage_dropped", "triaged"),
+    "escalation_rate": ("escalated", "triaged"),
+    "reviewer_keep_rate": ("reviewer_kept", "reviewer_reviewed"),
+})
 
 
-async def review_youtube_sources(state: EntityTrackerState, config: RunnableConfig):
-    """Review YouTube sources for relevance."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_youtube_enabled or not state.get("youtube_sources"):
-        return {"youtube_sources": []}
-    
+async def create_source_reviewers(configurable: Configuration):
+    """
+    Create the LLMs that review sources.
+    
+    Returns:
+        Tuple of the reviewer and, with review_cascade_enabled, the cheaper
+        triage model (otherwise None)
+    """
     llm_configs = create_llm_configs(configurable)
     llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], SourcesReview)
-    
+    llm_triage = None
+    if configurable.review_cascade_enabled:
+        llm_triage = await create_llm_from_config(llm_configs[configurable.review_cascade_tier], SourcesTriage)
+    return llm_reviewer, llm_triage
+
+
+async def review_sources(
+    llm_reviewer,
+    sources: list,
+    state: EntityTrackerState,
+    configurable: Configuration,
+    last_hours: int,
+    llm_triage=None
+) -> list:
+    """
+    Ask the reviewer which of a batch of sources to keep, numbering the batch from 1.
+    
+    Batches over review_chunk_max_tokens are split into chunks that are
+    reviewed concurrently, at most review_max_concurrency at a time. Sources
+    keep their batch numbers in every chunk, so the kept numbers of all
+    chunks are merged directly.
+    
+    With a triage model, it first sorts the sources into keep, drop and
+    unsure; decisions below review_cascade_min_confidence count as unsure,
+    and only the unsure sources go to the reviewer.
+    """
     entity_history = (state["entity_history"] if configurable.review_sources_pass_previous_entries_sources
                      else state["entity_history_without_sources"])
     
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.sources_review_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            sources=state["youtube_sources"],
-            last_hours=configurable.search_youtube_last_hours,
-            entity_history=entity_history
-        )),
-        HumanMessage(content="Please review the sources.")
-    ])
-    
-    sources_to_keep = review_result.sources_to_keep
-    sources = [source for i, source in enumerate(state["youtube_sources"]) if i + 1 in sources_to_keep]
-    
-    return {"youtube_sources": sources}
+    sources = number_sources(list(sources))
+    limiter = asyncio.Semaphore(configurable.review_max_concurrency)
+    
+    async def review_chunk(llm, chunk: list, system_instructions: str, instruction: str):
+        async with limiter:
+            return await llm.ainvoke([
+                SystemMessage(content=system_instructions.format(
+                    entity=state.get("entity_name"),
+                    current_date=state.get("current_date"),
+                    sources=chunk,
+                    last_hours=last_hours,
+                    entity_history=entity_history
+                )),
+                HumanMessage(content=instruction)
+            ])
+    
+    async def review_in_chunks(llm, batch: list, system_instructions: str, instruction: str) -> list:
+        chunks = chunk_sources(batch, configurable.review_chunk_max_tokens)
+        if configurable.debug and len(chunks) > 1:
+            print(f"Reviewing {len(batch)} sources in {len(chunks)} chunks")
+        return await asyncio.gather(*(
+            review_chunk(llm, chunk, system_instructions, instruction) for chunk in chunks
+        ))
+    
+    sources_to_keep = set()
+    escalated = sources
+    if llm_triage is not None:
+        numbers = {source.metadata["source_number"] for source in sources}
+        decisions = {}
+        for triage_result in await review_in_chunks(
+            llm_triage, sources, configurable.sources_triage_system_instructions,
+            "Please sort the sources into keep, drop and unsure. Only decide keep or drop "
+            "when you are confident; otherwise answer unsure."
+        ):
+            for triage in triage_result.sources:
+                if triage.source_number in numbers and triage.confidence >= configurable.review_cascade_min_confidence:
+                    decisions[triage.source_number] = triage.decision
+        
+        sources_to_keep = {number for number, decision in decisions.items() if decision == "keep"}
+        escalated = [
+            source for source in sources
+            if decisions.get(source.metadata["source_number"], "unsure") == "unsure"
+        ]
+        review_cascade_metrics.record(
+            triaged=len(sources),
+            triage_kept=len(sources_to_keep),
+            triage_dropped=len(sources) - len(sources_to_keep) - len(escalated),
+            escalated=len(escalated),
+        )
+        if configurable.debug:
+            print(f"Triage kept {len(sources_to_keep)} of {len(sources)} sources "
+                  f"and escalated {len(escalated)}")
+    
+    if escalated:
+        reviewer_kept = set()
+        for review_result in await review_in_chunks(
+            llm_reviewer, escalated, configurable.sources_review_system_instructions,
+            "Please review the sources and return numbers to keep."
+        ):
+            reviewer_kept.update(review_result.sources_to_keep)
+        reviewer_kept &= {source.metadata["source_number"] for source in escalated}
+        review_cascade_metrics.record(reviewer_reviewed=len(escalated), reviewer_kept=len(reviewer_kept))
+        sources_to_keep |= reviewer_kept
+    
+    return [source for source in sources if source.metadata["source_number"] in sources_to_keep]
 
 
-async def search_speeches(state: EntityTrackerState, config: RunnableConfig):
-    """Search speeches database for entity-related content."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_speeches_enabled:
-        return {"speeches_sources": []}
-    
-    queries_list = state.get("queries", [state.get("entity_name")])
-    sources = []
-    
-    for query in queries_list:
-        results = mock_speeches_search(
-            query=query,
-            max_results=configurable.search_speeches_max_results,
-        )
-        sources.extend(results)
-    
-    for i, source in enumerate(sources):
-        if source.metadata is None:
-            source.metadata = {}
-        source.metadata["source_number"] = i + 1
-    
-    capped_sources = parse_and_cap_sources(sources, max_length=configurable.source_content_max_length)
-    return {"speeches_sources": capped_sources}
+prefilter_metrics = stage_metrics("prefilter", rates={"drop_rate": ("dropped", "checked")})
 
 
-async def review_speeches_sources(state: EntityTrackerState, config: RunnableConfig):
-    """Review speeches sources for relevance."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_speeches_enabled or not state.get("speeches_sources"):
-        return {"speeches_sources": []}
-    
-    llm_configs = create_llm_configs(configurable)
-    llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], SourcesReview)
-    
-    entity_history = (state["entity_history"] if configurable.review_sources_pass_previous_entries_sources
-                     else state["entity_history_without_sources"])
-    
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.sources_review_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            sources=state["speeches_sources"],
-            last_hours=configurable.search_speeches_last_hours,
-            entity_history=entity_history
-        )),
-        HumanMessage(content="Please review the sources.")
-    ])
-    
-    sources_to_keep = review_result.sources_to_keep
-    sources = [source for i, source in enumerate(state["speeches_sources"]) if i + 1 in sources_to_keep]
-    
-    return {"speeches_sources": sources}
+def prefilter(adapter: SourceAdapter, sources: list, state: EntityTrackerState, configurable: Configuration) -> list:
+    """Drop the sources the rule-based pre-filter rejects, if it is enabled."""
+    if not configurable.source_prefilter_enabled or not sources:
+        return sources
+    
+    entity_names = []
+    if configurable.source_prefilter_require_entity_mention:
+        entity_names = [state.get("main_entity_name") or state.get("entity_name")]
+        entity_names += (state.get("graph_settings") or {}).get("entity_aliases", [])
+    
+    kept, reasons = prefilter_sources(
+        sources,
+        entity_names=entity_names,
+        window_start=window_start_for(state.get("current_date"), adapter.window_hours(configurable)),
+        domain_denylist=configurable.source_prefilter_domain_denylist.split(","),
+        min_content_length=configurable.source_prefilter_min_content_length,
+    )
+    prefilter_metrics.record(checked=len(sources), dropped=len(sources) - len(kept), **reasons)
+    if configurable.debug and reasons:
+        print(f"Pre-filter dropped {len(sources) - len(kept)} of {len(sources)} {adapter.name} sources: "
+              + ", ".join(f"{reason}={count}" for reason, count in reasons.most_common()))
+    return kept
 
 
-async def search_scraper(state: EntityTrackerState, config: RunnableConfig):
-    """Search scraper database for entity-related content."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_scraper_enabled:
-        return {"scraper_sources": []}
-    
-    queries_list = state.get("queries", [state.get("entity_name")])
-    sources = []
-    
-    for query in queries_list:
-        results = mock_scraper_search(
-            query=query,
-            max_results=configurable.search_scraper_max_results,
-            last_hours=configurable.search_scraper_last_hours,
-        )
-        sources.extend(results)
-    
-    for i, source in enumerate(sources):
-        if source.metadata is None:
-            source.metadata = {}
-        source.metadata["source_number"] = i + 1
-    
-    capped_sources = parse_and_cap_sources(sources, max_length=configurable.source_content_max_length)
-    return {"scraper_sources": capped_sources}
+relevance_metrics = stage_metrics("relevance", rates={"drop_rate": ("dropped", "scored")})
 
+# Recent history entries included in the relevance profile
+RELEVANCE_PROFILE_HISTORY_ENTRIES = 10
 
-async def review_scraper_sources(state: EntityTrackerState, config: RunnableConfig):
-    """Review scraper sources for relevance."""
-    configurable = Configuration.from_runnable_config(config)
-    
-    if not configurable.search_scraper_enabled or not configurable.review_scraper_sources_enabled:
-        return {"scraper_sources": state.get("scraper_sources", [])}
-    
-    if not state.get("scraper_sources"):
-        return {"scraper_sources": []}
-    
-    llm_configs = create_llm_configs(configurable)
-    llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], SourcesReview)
-    
-    entity_history = (state["entity_history"] if configurable.review_sources_pass_previous_entries_sources
-                     else state["entity_history_without_sources"])
-    
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.sources_review_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            sources=state["scraper_sources"],
-            last_hours=configurable.search_scraper_last_hours,
-            entity_history=entity_history
-        )),
-        HumanMessage(content="Please review the sources.")
-    ])
-    
-    sources_to_keep = review_result.sources_to_keep
-    sources = [source for i, source in enumerate(state["scraper_sources"]) if i + 1 in sources_to_keep]
+
+def rank_by_relevance(
+    adapter: SourceAdapter,
+    sources: list,
+    state: EntityTrackerState,
+    configurable: Configuration,
+    running: Optional[RunningTopK] = None
+) -> list:
+    """
+    Keep the sources most similar to the entity profile, if relevance scoring is enabled.
+    
+    Sources screened in batches pass a RunningTopK shared across the batches.
+    That is an approximate running cut: a source only passes if it beats
+    the relevance_top_k best of the earlier batches, but when later batches
+    keep scoring higher, more than relevance_top_k sources pass in total.
+    """
+    if not configurable.relevance_scoring_enabled or not sources:
+        return sources
+    
+    entity_names = [state.get("main_entity_name") or state.get("entity_name"), state.get("related_entity_name")]
+    entity_names += (state.get("graph_settings") or {}).get("entity_aliases", [])
+    history = state.get("entity_history_without_sources")
+    history_entries = [entry.content for entry in history.entries[:RELEVANCE_PROFILE_HISTORY_ENTRIES]] if history else []
+    
+    kept, scores = select_relevant(
+        sources,
+        profile_vector(entity_names, history_entries),
+        top_k=configurable.relevance_top_k,
+        min_score=configurable.relevance_min_score,
+        running=running,
+    )
+    relevance_metrics.record(scored=len(sources), dropped=len(sources) - len(kept))
+    if configurable.debug:
+        print(f"Relevance scoring kept {len(kept)} of {len(sources)} {adapter.name} sources "
+              f"(scores {scores.min():.2f}-{scores.max():.2f})")
+    return kept
+
+
+def screen_sources(
+    adapter: SourceAdapter,
+    sources: list,
+    state: EntityTrackerState,
+    configurable: Configuration,
+    running: Optional[RunningTopK] = None
+) -> list:
+    """Apply the enabled local filters, the rule-based pre-filter and relevance scoring, before review."""
+    return rank_by_relevance(adapter, prefilter(adapter, sources, state, configurable), state, configurable, running)
+
+
+def make_search_node(source_type: str, generated: bool = False):
+    """
+    Create a search node of a source type.
+    
+    The base search node runs as soon as the run is initialized and searches
+    the base queries, while query generation runs; the generated search node
+    follows query generation and searches the queries it added. Both run the
+    source adapter's search for each query and cap the documents in query
+    order. The base node also sets the branch deadline: the source's timeout
+    from now, or the run deadline less its reserve if that is sooner.
+    Queries still running at the deadline are dropped and the source is
+    listed in timed_out_sources.
+    
+    With stream_review_enabled, results are reviewed in micro-batches of
+    stream_review_batch_size documents as the searches return them, so the
+    first reviews overlap the remaining searches; the node then returns only
+    the kept documents, still in query order. The batches share one
+    approximate running relevance cut: a document must beat the
+    relevance_top_k best already seen, rather than only those of its own
+    batch, but the node can send more than relevance_top_k to review when
+    later batches score higher.
+    
+    Args:
+        source_type: The registered source type
+        generated: Create the node for generated queries instead of base queries
+    """
+    async def search(state: EntityTrackerState, config: RunnableConfig):
+        adapter = get_source_adapter(source_type)
+        configurable = Configuration.from_runnable_config(config)
+        
+        if not adapter.enabled(configurable):
+            return {"generated_sources": {adapter.name: []}} if generated else {adapter.state_key: []}
+        
+        branch_deadline = (state.get("branch_deadlines") or {}).get(adapter.name)
+        if branch_deadline is None:
+            deadlines = [deadline for deadline in (
+                time.time() + adapter.branch_timeout(configurable) if adapter.branch_timeout(configurable) else None,
+                sources_deadline(state, configurable),
+            ) if deadline is not None]
+            branch_deadline = min(deadlines) if deadlines else None
+        
+        if generated:
+            known = set(base_queries(state))
+            queries_list = [query for query in state.get("queries") or [] if query not in known]
+        else:
+            queries_list = base_queries(state)
+        
+        streaming = configurable.stream_review_enabled and adapter.should_review(configurable)
+        llm_reviewer = llm_triage = None
+        if streaming and queries_list:
+            llm_reviewer, llm_triage = await create_source_reviewers(configurable)
+        
+        # Documents keyed by (query index, position in the query's results)
+        results = {}
+        searched = set()
+        timed_out_queries = []
+        
+        async def collect():
+            reviews = []
+            batch = []
+            # One top-k cut across all micro-batches of the node
+            running = RunningTopK(configurable.relevance_top_k)
+            
+            def review_batch():
+                kept_ids = {id(document) for document in screen_sources(
+                    adapter, [document for _, document in batch], state, configurable, running
+                )}
+                positions = [position for position, document in batch if id(document) in kept_ids]
+                documents = parse_and_cap_sources(
+                    [document for _, document in batch if id(document) in kept_ids],
+                    max_length=configurable.source_content_max_length
+                )
+                
+                async def review():
+                    kept = await review_sources(
+                        llm_reviewer, documents, state, configurable, adapter.window_hours(configurable),
+                        llm_triage=llm_triage
+                    )
+                    kept_ids = {id(document) for document in kept}
+                    for position, document in zip(positions, documents):
+                        if id(document) in kept_ids:
+                            results[position] = document
+                
+                reviews.append(asyncio.create_task(review()))
+                batch.clear()
+            
+            try:
+                async for index, documents in iter_search_results(
+                    adapter, queries_list, state, configurable, timed_out_queries, branch_deadline
+                ):
+                    searched.add(index)
+                    for position, document in enumerate(documents):
+                        if llm_reviewer is None:
+                            results[(index, position)] = document
+                        else:
+                            batch.append(((index, position), document))
+                            if len(batch) >= configurable.stream_review_batch_size:
+                                review_batch()
+                if batch:
+                    review_batch()
+                await asyncio.gather(*reviews)
+            finally:
+                for task in reviews:
+                    task.cancel()
+        
+        cut_off = False
+        try:
+            await asyncio.wait_for(collect(), seconds_left(branch_deadline))
+        except asyncio.TimeoutError:
+            cut_off = True
+        
+        # Add source numbers (renumbered once generated results are merged in)
+        sources = number_sources([results[position] for position in sorted(results)])
+        
+        # Cap source content length (reviewed documents already are)
+        if llm_reviewer is None:
+            sources = parse_and_cap_sources(sources, max_length=configurable.source_content_max_length)
+        
+        if generated:
+            update = {"generated_sources": {adapter.name: sources}}
+        else:
+            update = {adapter.state_key: sources, "branch_deadlines": {adapter.name: branch_deadline}}
+        if cut_off or timed_out_queries:
+            if configurable.debug:
+                print(f"{search.__name__}: {len(timed_out_queries)} queries timed out, "
+                      f"{len(queries_list) - len(searched)} cut off by the branch deadline")
+            if adapter.name not in (state.get("timed_out_sources") or []):
+                update["timed_out_sources"] = [adapter.name]
+        return update
+    
+    if generated:
+        search.__name__ = search.__qualname__ = f"search_{source_type}_generated"
+        search.__doc__ = f"Search {source_type} sources for the generated queries."
+    else:
+        search.__name__ = search.__qualname__ = f"search_{source_type}"
+        search.__doc__ = f"Search {source_type} sources for entity-related content."
+    return search
+
+
+def make_review_node(source_type: str):
+    """
+    Create the node that reviews a source type's documents for relevance.
+    
+    With stream_review_enabled the search nodes have reviewed the documents
+    already, and this node only merges their results.
+    """
+    async def review(state: EntityTrackerState, config: RunnableConfig):
+        adapter = get_source_adapter(source_type)
+        configurable = Configuration.from_runnable_config(config)
+        
+        # Merge the results of the generated queries after the base ones
+        generated_sources = (state.get("generated_sources") or {}).get(adapter.name)
+        sources = state.get(adapter.state_key) or []
+        if generated_sources:
+            sources = number_sources(sources + generated_sources)
+        
+        # Streamed results were reviewed, and screened, by the search nodes
+        if configurable.stream_review_enabled and adapter.should_review(configurable):
+            return {adapter.state_key: sources if adapter.enabled(configurable) else []}
+        
+        sources = number_sources(screen_sources(adapter, sources, state, configurable))
+        
+        if not adapter.enabled(configurable) or not sources:
+            return {adapter.state_key: []}
+        
+        if not adapter.should_review(configurable):
+            return {adapter.state_key: sources}
+        
+        # Unreviewed sources are dropped if the review can't finish by the branch deadline
+        def cut_off():
+            if configurable.debug:
+                print(f"{adapter.review_node}: review cut off by the branch deadline")
+            update = {adapter.state_key: []}
+            if adapter.name not in (state.get("timed_out_sources") or []):
+                update["timed_out_sources"] = [adapter.name]
+            return update
+        
+        branch_deadline = (state.get("branch_deadlines") or {}).get(adapter.name)
+        if seconds_left(branch_deadline) == 0:
+            return cut_off()
+        
+        llm_reviewer, llm_triage = await create_source_reviewers(configurable)
+        
+        try:
+            sources = await asyncio.wait_for(
+                review_sources(
+                    llm_reviewer, sources, state, configurable, adapter.window_hours(configurable),
+                    llm_triage=llm_triage
+                ),
+                seconds_left(branch_deadline)
+            )
+        except asyncio.TimeoutError:
+            return cut_off()
+        
+        return {adapter.state_key: sources}
     
-    return {"scraper_sources": sources}
+    review.__name__ = review.__qualname__ = f"review_{source_type}_sources"
+    review.__doc__ = f"Review {source_type} sources and filter for relevance."
+    return review
+
+
+search_web = make_search_node("web")
+review_web_sources = make_review_node("web")
+search_email = make_search_node("email")
+review_email_sources = make_review_node("email")
+search_youtube = make_search_node("youtube")
+review_youtube_sources = make_review_node("youtube")
+search_speeches = make_search_node("speeches")
+review_speeches_sources = make_review_node("speeches")
+search_scraper = make_search_node("scraper")
+review_scraper_sources = make_review_node("scraper")
 
 
 async def gather_sources(state: EntityTrackerState, config: RunnableConfig):
     """Consolidate and deduplicate sources from all search types."""
-    # Combine all sources
-    sources = (state.get("web_sources", []) + 
-               state.get("email_sources", []) + 
-               state.get("youtube_sources", []) + 
-               state.get("speeches_sources", []) + 
-               state.get("scraper_sources", []))
+    # Combine all sources, in registry order
+    source_keys = [adapter.state_key for adapter in source_adapters() if adapter.state_key in state]
+    sources = []
+    for key in source_keys:
+        sources.extend(state.get(key) or [])
+    
+    configurable = Configuration.from_runnable_config(config)
+    if configurable.debug and state.get("timed_out_sources"):
+        print(f"Gathering sources without the cut-off parts of: {', '.join(state['timed_out_sources'])}")
     
     if not sources:
-        return {"sources": []}
+        return {"sources": [], "source_clusters": []}
     
     # Convert Document objects to SourceModel
     source_models = []
@@ -495,16 +712,61 @@ async def gather_sources(state: EntityTrackerState, config: RunnableConfig):
         source.metadata["source_number"] = i + 1
         source.id = i + 1
     
+    # Group sources reporting the same event, as source numbers led by a representative
+    source_clusters = []
+    if configurable.source_clustering_enabled:
+        source_clusters = [
+            [unique_sources[i].id for i in cluster]
+            for cluster in cluster_sources(
+                unique_sources,
+                threshold=configurable.source_clustering_threshold,
+                max_days_apart=configurable.source_clustering_max_days_apart,
+            )
+        ]
+        if configurable.debug:
+            print(f"Clustered {len(unique_sources)} sources into {len(source_clusters)} events")
+    
     return {
         "sources": unique_sources,
-        "web_sources": [],
-        "email_sources": [],
-        "youtube_sources": [],
-        "speeches_sources": [],
-        "scraper_sources": []
+        "source_clusters": source_clusters,
+        **{key: [] for key in source_keys},
+        "generated_sources": {name: [] for name in state.get("generated_sources") or {}}
     }
 
 
+def cluster_representatives(sources: list, source_clusters: List[List[int]]) -> list:
+    """
+    Return one source per cluster for the planner.
+    
+    Each representative keeps its source number, with the URLs and count of
+    the sources it stands for added to its metadata.
+    """
+    by_number = {source.metadata.get("source_number"): source for source in sources}
+    representatives = []
+    for cluster in source_clusters:
+        representative = by_number[cluster[0]]
+        others = [by_number[number] for number in cluster[1:]]
+        metadata = dict(representative.metadata)
+        if others:
+            metadata["cluster_size"] = len(cluster)
+            metadata["related_urls"] = [
+                url for url in (other.metadata.get("url") or other.metadata.get("link") for other in others) if url
+            ]
+        representatives.append(representative.model_copy(update={"metadata": metadata}))
+    return representatives
+
+
+def expand_source_numbers(source_numbers: List[int], source_clusters: List[List[int]]) -> List[int]:
+    """Expand the representative source numbers of a plan to all sources of their clusters."""
+    clusters = {cluster[0]: cluster for cluster in source_clusters}
+    expanded = []
+    for number in source_numbers:
+        for member in clusters.get(number, [number]):
+            if member not in expanded:
+                expanded.append(member)
+    return expanded
+
+
 async def should_write_history_entry(state: EntityTrackerState, config: RunnableConfig):
     """Determine if new history entries should be written."""
     if not state.get("sources"):
@@ -535,19 +797,62 @@ async def should_write_history_entry(state: EntityTrackerState, config: Runnable
             except:
                 relationship_specific_prompt = raw_prompt
     
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.should_write_history_entry_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            entity_history=entity_history,
-            sources=state.get("sources"),
-            last_hours=configurable.last_hours,
-            relationship_specific_prompt=relationship_specific_prompt
-        )),
-        HumanMessage(content="Please review if we should write history entries.")
-    ])
-    
-    if not review_result.entity_history_plans:
+    def ask_planner(sources: list, instruction: str):
+        return llm_reviewer.ainvoke([
+            SystemMessage(content=configurable.should_write_history_entry_system_instructions.format(
+                entity=state.get("entity_name"),
+                current_date=state.get("current_date"),
+                entity_history=entity_history,
+                sources=sources,
+                last_hours=configurable.last_hours,
+                relationship_specific_prompt=relationship_specific_prompt
+            )),
+            HumanMessage(content=instruction)
+        ])
+    
+    source_clusters = state.get("source_clusters") or []
+    if source_clusters and configurable.parallel_planning_enabled:
+        # One call per multi-source event, planning at most one entry for it;
+        # single-source events share one call, as without clustering
+        by_number = {source.metadata.get("source_number"): source for source in state.get("sources")}
+        limiter = asyncio.Semaphore(configurable.planning_max_concurrency)
+        
+        async def plan_cluster(cluster: List[int]) -> list:
+            async with limiter:
+                result = await ask_planner(
+                    [by_number[number] for number in cluster],
+                    "These sources report a single event. Please review if we should write a history entry for it."
+                )
+            if not result.entity_history_plans:
+                return []
+            cluster_plan = result.entity_history_plans[0]
+            cluster_plan.source_numbers = list(cluster)
+            return [cluster_plan]
+        
+        async def plan_singletons(numbers: List[int]) -> list:
+            async with limiter:
+                result = await ask_planner(
+                    [by_number[number] for number in numbers],
+                    "Please review if we should write history entries."
+                )
+            return result.entity_history_plans
+        
+        singletons = [cluster[0] for cluster in source_clusters if len(cluster) == 1]
+        calls = [plan_cluster(cluster) for cluster in source_clusters if len(cluster) > 1]
+        if singletons:
+            calls.append(plan_singletons(singletons))
+        entity_history_plans = [plan for plans in await asyncio.gather(*calls) for plan in plans]
+    else:
+        # With clustering, the planner sees one representative per event
+        sources = cluster_representatives(state.get("sources"), source_clusters) if source_clusters else state.get("sources")
+        review_result = await ask_planner(sources, "Please review if we should write history entries.")
+        entity_history_plans = review_result.entity_history_plans
+        
+        # A plan citing a representative covers its whole cluster
+        for entity_history_plan in entity_history_plans:
+            entity_history_plan.source_numbers = expand_source_numbers(entity_history_plan.source_numbers, source_clusters)
+    
+    if not entity_history_plans:
         return [
             Send("update_entity_history", {
                 "entity_history_entries": [],
@@ -563,7 +868,7 @@ async def should_write_history_entry(state: EntityTrackerState, config: Runnable
             "entity_name": state.get("entity_name"),
             "entity_history_without_sources": state.get("entity_history_without_sources")
         })
-        for plan in review_result.entity_history_plans
+        for plan in entity_history_plans
     ]
 
 
@@ -594,6 +899,13 @@ async def assemble_history_entry(state: EntityTrackerState, config: RunnableConf
     return {"entity_history_entries": [entity_history_entry]}
 
 
+duplicate_check_metrics = stage_metrics("duplicate_check", rates={
+    "accept_rate": ("accepted", "checked"),
+    "reject_rate": ("rejected", "checked"),
+    "escalation_rate": ("escalated", "checked"),
+})
+
+
 async def should_update_entity_history(state: EntityTrackerState, config: RunnableConfig) -> Command[Literal["update_entity_history"]]:
     """Determine which entries should be added to entity history."""
     if state.get("no_new_information"):
@@ -603,46 +915,81 @@ async def should_update_entity_history(state: EntityTrackerState, config: Runnab
         )
     
     configurable = Configuration.from_runnable_config(config)
+    proposed_entries = state.get("entity_history_entries", [])
+    
+    # Settle clearly new and clearly duplicate entries locally; only the rest go to the LLM
+    accepted = []
+    candidates = list(range(len(proposed_entries)))
+    if configurable.duplicate_check_enabled:
+        history = state.get("entity_history_without_sources")
+        entity_names = [state.get("main_entity_name") or state.get("entity_name")]
+        entity_names += (state.get("graph_settings") or {}).get("entity_aliases", [])
+        decisions = classify_entries(
+            [entry.content for entry in proposed_entries],
+            [entry.content for entry in history.entries] if history else [],
+            accept_below=configurable.duplicate_check_accept_below,
+            reject_above=configurable.duplicate_check_reject_above,
+            entity_names=entity_names,
+        )
+        accepted = [i for i, decision in enumerate(decisions) if decision == ACCEPT]
+        candidates = [i for i, decision in enumerate(decisions) if decision == ESCALATE]
+        duplicate_check_metrics.record(
+            checked=len(decisions),
+            accepted=len(accepted),
+            rejected=len(decisions) - len(accepted) - len(candidates),
+            escalated=len(candidates),
+        )
+        if configurable.debug:
+            print(f"Duplicate check accepted {len(accepted)}, rejected "
+                  f"{len(decisions) - len(accepted) - len(candidates)} and escalated {len(candidates)} entries")
+    
+    selected = []
+    if candidates:
+        llm_configs = create_llm_configs(configurable)
+        llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], ShouldUpdateEntityHistory)
+        
+        # Format entries with numbers
+        entity_history_entries = [
+            f"Entry #{number}: {proposed_entries[i].content}"
+            for number, i in enumerate(candidates, start=1)
+        ]
+        
+        entity_history_entry_numbers = [
+            f"{number}"
+            for number in range(1, len(candidates) + 1)
+        ]
+        
+        entity_history = (state["entity_history"] if configurable.should_update_entity_history_pass_previous_entries_sources
+                         else state["entity_history_without_sources"])
+        
+        review_result = await llm_reviewer.ainvoke([
+            SystemMessage(content=configurable.should_update_entity_history_system_instructions.format(
+                entity=state.get("entity_name"),
+                current_date=state.get("current_date"),
+                entity_history=entity_history,
+                entity_history_entries=entity_history_entries,
+                entity_history_entry_numbers=entity_history_entry_numbers,
+                last_hours=configurable.last_hours
+            )),
+            HumanMessage(content="Please review which entries to update.")
+        ])
+        
+        selected = [
+            candidates[number - 1]
+            for number in review_result.entity_history_entries
+            if 1 <= number <= len(candidates)
+        ]
     
-    llm_configs = create_llm_configs(configurable)
-    llm_reviewer = await create_llm_from_config(llm_configs["llm_reviewer"], ShouldUpdateEntityHistory)
-    
-    # Format entries with numbers
-    entity_history_entries = [
-        f"Entry #{i+1}: {entry.content}"
-        for i, entry in enumerate(state.get("entity_history_entries", []))
-    ]
-    
-    entity_history_entry_numbers = [
-        f"{i+1}"
-        for i in range(len(state.get("entity_history_entries", [])))
-    ]
-    
-    entity_history = (state["entity_history"] if configurable.should_update_entity_history_pass_previous_entries_sources
-                     else state["entity_history_without_sources"])
-    
-    review_result = await llm_reviewer.ainvoke([
-        SystemMessage(content=configurable.should_update_entity_history_system_instructions.format(
-            entity=state.get("entity_name"),
-            current_date=state.get("current_date"),
-            entity_history=entity_history,
-            entity_history_entries=entity_history_entries,
-            entity_history_entry_numbers=entity_history_entry_numbers,
-            last_hours=configurable.last_hours
-        )),
-        HumanMessage(content="Please review which entries to update.")
-    ])
-    
-    if not review_result.entity_history_entries:
+    if not accepted and not selected:
         return Command(
             update={},
             goto="update_entity_history"
         )
     
-    # Filter entries based on review
+    # Filter entries based on review, in their proposed order
     entity_history_entries_filtered = [
-        state.get("entity_history_entries", [])[i-1]
-        for i in review_result.entity_history_entries
+        proposed_entries[i]
+        for i in sorted(set(accepted) | set(selected))
     ]
     
     return Command(
@@ -654,6 +1001,18 @@ async def should_update_entity_history(state: EntityTrackerState, config: Runnab
     )
 
 
+def history_run_id(config: RunnableConfig, state: EntityTrackerState) -> str:
+    """
+    Identify the run writing history entries, for their idempotency keys.
+    
+    Uses the caller's run_id when given, otherwise the LangGraph task of the
+    node, which stays the same when the node is retried.
+    """
+    metadata = (config or {}).get("metadata") or {}
+    run_id = (config or {}).get("run_id") or metadata.get("run_id") or metadata.get("langgraph_checkpoint_ns")
+    return str(run_id or state.get("current_date") or "")
+
+
 async def update_entity_history(state: EntityTrackerState, config: RunnableConfig):
     """Update the entity history in the database."""
     if state.get("no_new_information") or not state.get("entity_history_entries_filtered"):
@@ -662,16 +1021,26 @@ async def update_entity_history(state: EntityTrackerState, config: RunnableConfi
             "no_new_information": True
         }
     
-    # Save each entry to database
+    configurable = Configuration.from_runnable_config(config)
+    run_id = history_run_id(config, state)
+    
+    # Save each entry to database, or queue it for the write-behind flusher
     history_entries = []
     for entry in state.get("entity_history_entries_filtered", []):
-        save_entity_history_entry(
+        entry_args = dict(
             entity_id=state.get("entity_id"),
             content=entry.content,
             sources=entry.sources,
             timestamp=state.get("current_date"),
-            relationship_id=state.get("entity_relationship_id")
+            relationship_id=state.get("entity_relationship_id"),
+            # A retried node derives the same keys, so entries it already saved aren't duplicated
+            idempotency_key=make_idempotency_key(state.get("entity_id"), run_id, entry.content)
         )
+        if configurable.write_behind_enabled:
+            if not enqueue_entity_history_entry(**entry_args) and configurable.debug:
+                print(f"Entry already queued or saved: {entry.content[:80]}")
+        else:
+            await asave_entity_history_entry(**entry_args)
         history_entries.append(entry)
     
     entity_history_output = EntityHistory(entries=history_entries)
@@ -685,12 +1054,6 @@ async def update_entity_history(state: EntityTrackerState, config: RunnableConfi
 
 
 # Build the graph
-entity_builder = StateGraph(
-    EntityTrackerState,
-    input_schema=EntityTrackerInput,
-    output_schema=EntityTrackerOutput,
-    context_schema=Configuration
-)
 
 # Create retry policy for resilience
 retry_policy = RetryPolicy(
@@ -701,64 +1064,132 @@ retry_policy = RetryPolicy(
     jitter=True
 )
 
-# Add nodes with retry policies
-entity_builder.add_node("initialize_search", initialize_search)
-entity_builder.add_node("create_universal_queries", create_universal_queries, retry_policy=retry_policy)
-
-entity_builder.add_node("search_web", search_web, retry_policy=retry_policy)
-entity_builder.add_node("review_web_sources", review_web_sources, retry_policy=retry_policy)
+_compiled_graphs: dict = {}
+_compiled_graphs_lock = threading.Lock()
 
-entity_builder.add_node("search_email", search_email, retry_policy=retry_policy)
-entity_builder.add_node("review_email_sources", review_email_sources, retry_policy=retry_policy)
 
-entity_builder.add_node("search_youtube", search_youtube, retry_policy=retry_policy)
-entity_builder.add_node("review_youtube_sources", review_youtube_sources, retry_policy=retry_policy)
-
-entity_builder.add_node("search_speeches", search_speeches, retry_policy=retry_policy)
-entity_builder.add_node("review_speeches_sources", review_speeches_sources, retry_policy=retry_policy)
-
-entity_builder.add_node("search_scraper", search_scraper, retry_policy=retry_policy)
-entity_builder.add_node("review_scraper_sources", review_scraper_sources, retry_policy=retry_policy)
-
-entity_builder.add_node("gather_sources", gather_sources, retry_policy=retry_policy)
-entity_builder.add_node("assemble_history_entry", assemble_history_entry, retry_policy=retry_policy)
-entity_builder.add_node("should_update_entity_history", should_update_entity_history, retry_policy=retry_policy)
-entity_builder.add_node("update_entity_history", update_entity_history, retry_policy=retry_policy)
-
-# Add edges
-entity_builder.add_edge(START, "initialize_search")
-entity_builder.add_edge("initialize_search", "create_universal_queries")
+def enabled_sources(configurable: Configuration) -> frozenset:
+    """Return the registered source types whose search is enabled in a configuration."""
+    return frozenset(
+        adapter.name for adapter in source_adapters()
+        if adapter.enabled(configurable)
+    )
 
-# Parallel search branches
-entity_builder.add_edge("create_universal_queries", "search_web")
-entity_builder.add_edge("search_web", "review_web_sources")
-entity_builder.add_edge("review_web_sources", "gather_sources")
 
-entity_builder.add_edge("create_universal_queries", "search_email")
-entity_builder.add_edge("search_email", "review_email_sources")
-entity_builder.add_edge("review_email_sources", "gather_sources")
+def build_graph(
+    config: Optional[RunnableConfig] = None,
+    sources: Optional[Iterable[str]] = None,
+    generate_queries: Optional[bool] = None
+):
+    """
+    Return the entity tracker graph with only the needed search branches.
+    
+    Disabled sources get no nodes at all, so runs don't schedule (and
+    checkpoint) branches that would only return empty lists. Without query
+    generation, the query writer and the searches of generated queries are
+    left out too, and each source's search goes straight to its review.
+    Compiled graphs are cached per set of sources and query generation.
+    
+    Args:
+        config: RunnableConfig whose configuration decides the enabled sources
+            and query generation
+        sources: Source types to include; overrides config
+        generate_queries: Whether to include query generation; overrides
+            config's create_universal_queries_enabled
+        
+    Returns:
+        The compiled graph
+    """
+    configurable = Configuration.from_runnable_config(config)
+    if sources is None:
+        sources = enabled_sources(configurable)
+    if generate_queries is None:
+        generate_queries = configurable.create_universal_queries_enabled
+    sources = frozenset(sources)
+    unknown = sources - {adapter.name for adapter in source_adapters()}
+    if unknown:
+        raise ValueError(f"Unknown source types: {sorted(unknown)}")
+    
+    key = (sources, bool(generate_queries))
+    with _compiled_graphs_lock:
+        compiled = _compiled_graphs.get(key)
+        if compiled is None:
+            compiled = _compiled_graphs[key] = _compile_graph(*key)
+    return compiled
 
-entity_builder.add_edge("create_universal_queries", "search_youtube")
-entity_builder.add_edge("search_youtube", "review_youtube_sources")
-entity_builder.add_edge("review_youtube_sources", "gather_sources")
 
-entity_builder.add_edge("create_universal_queries", "search_speeches")
-entity_builder.add_edge("search_speeches", "review_speeches_sources")
-entity_builder.add_edge("review_speeches_sources", "gather_sources")
+def _state_schema(adapters: List[SourceAdapter]):
+    """Return the graph state, extended with the state keys of sources it doesn't declare."""
+    annotations = get_type_hints(EntityTrackerState, include_extras=True)
+    missing = {adapter.state_key: list[Document] for adapter in adapters if adapter.state_key not in annotations}
+    if not missing:
+        return EntityTrackerState
+    return TypedDict("EntityTrackerState", {**annotations, **missing})
 
-entity_builder.add_edge("create_universal_queries", "search_scraper")
-entity_builder.add_edge("search_scraper", "review_scraper_sources")
-entity_builder.add_edge("review_scraper_sources", "gather_sources")
 
-# History entry pipeline
-entity_builder.add_conditional_edges("gather_sources", should_write_history_entry, {
-    "assemble_history_entry": "assemble_history_entry",
-    "update_entity_history": "update_entity_history"
-})
-entity_builder.add_edge("assemble_history_entry", "should_update_entity_history")
-entity_builder.add_edge("update_entity_history", END)
+def _compile_graph(sources: frozenset, generate_queries: bool):
+    """Compile the graph with search branches for the given source types."""
+    # Slow sources first, so their searches start before the fast ones
+    adapters = sorted(
+        (adapter for adapter in source_adapters() if adapter.name in sources),
+        key=lambda adapter: -adapter.expected_latency_seconds
+    )
+    entity_builder = StateGraph(
+        _state_schema(adapters),
+        input_schema=EntityTrackerInput,
+        output_schema=EntityTrackerOutput,
+        context_schema=Configuration
+    )
+    
+    # Add nodes with retry policies
+    entity_builder.add_node("initialize_search", initialize_search)
+    if generate_queries:
+        entity_builder.add_node("create_universal_queries", create_universal_queries, retry_policy=retry_policy)
+    
+    entity_builder.add_node("gather_sources", gather_sources, retry_policy=retry_policy)
+    entity_builder.add_node("assemble_history_entry", assemble_history_entry, retry_policy=retry_policy)
+    entity_builder.add_node("should_update_entity_history", should_update_entity_history, retry_policy=retry_policy)
+    entity_builder.add_node("update_entity_history", update_entity_history, retry_policy=retry_policy)
+    
+    # Add edges
+    entity_builder.add_edge(START, "initialize_search")
+    if generate_queries:
+        entity_builder.add_edge("initialize_search", "create_universal_queries")
+    
+    # Parallel search branches
+    for adapter in adapters:
+        entity_builder.add_node(adapter.search_node, make_search_node(adapter.name), retry_policy=retry_policy)
+        entity_builder.add_node(adapter.review_node, make_review_node(adapter.name), retry_policy=retry_policy)
+        entity_builder.add_edge("initialize_search", adapter.search_node)
+        if generate_queries:
+            # Base queries are searched while query generation runs; the review
+            # waits for both searches
+            entity_builder.add_node(
+                adapter.generated_search_node, make_search_node(adapter.name, generated=True), retry_policy=retry_policy
+            )
+            entity_builder.add_edge("create_universal_queries", adapter.generated_search_node)
+            entity_builder.add_edge([adapter.search_node, adapter.generated_search_node], adapter.review_node)
+        else:
+            entity_builder.add_edge(adapter.search_node, adapter.review_node)
+        entity_builder.add_edge(adapter.review_node, "gather_sources")
+    
+    if not sources:
+        entity_builder.add_edge("create_universal_queries" if generate_queries else "initialize_search", "gather_sources")
+    
+    # History entry pipeline
+    entity_builder.add_conditional_edges("gather_sources", should_write_history_entry, {
+        "assemble_history_entry": "assemble_history_entry",
+        "update_entity_history": "update_entity_history"
+    })
+    entity_builder.add_edge("assemble_history_entry", "should_update_entity_history")
+    entity_builder.add_edge("update_entity_history", END)
+    
+    # Compile the graph
+    compiled = entity_builder.compile()
+    compiled.name = "Entity Tracker"
+    return compiled
 
-# Compile the graph
-graph = entity_builder.compile()
-graph.name = "Entity Tracker"
 
+# The default graph has every branch and query generation, so both can be
+# switched on per run; use build_graph to drop the disabled ones
+graph = build_graph(sources=SOURCE_TYPES, generate_queries=True)
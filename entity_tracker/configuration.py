@@ -17,10 +17,14 @@ from entity_tracker.prompts import (
     speeches_query_writer_system_instructions,
     scraper_query_writer_system_instructions,
     sources_review_system_instructions,
+    sources_triage_system_instructions,
     should_write_history_entry_system_instructions,
     should_update_entity_history_system_instructions,
 )
 
+# The model tiers of create_llm_configs
+LLM_TIERS = ("llm_query_creator", "llm_reviewer_fallback", "llm_reviewer", "llm_writer")
+
 
 @dataclass(kw_only=True)
 class Configuration:
@@ -50,6 +54,21 @@ class Configuration:
     update_entity_metadata: bool = False
     debug: bool = False
     
+    # Deadlines
+    # Seconds a run may take; source branches still running when the deadline
+    # nears are cut off and listed in timed_out_sources (0 disables)
+    run_deadline_seconds: int = 0
+    # Seconds of the deadline kept for planning and writing entries
+    run_deadline_reserve_seconds: int = 60
+    # Seconds each search call may take; search_<source>_timeout, when set, bounds
+    # a source's whole branch, search and review (0, the default, disables)
+    search_query_timeout: int = 60
+    
+    # Storage configuration
+    # Queue new entries for a background writer instead of waiting for the store;
+    # needs a queue from database.configure_write_behind
+    write_behind_enabled: bool = False
+    
     # Source content configuration
     source_content_max_length: int = 8000  # Maximum length for source content before truncation
     
@@ -58,13 +77,57 @@ class Configuration:
     create_queries_pass_sources: bool = False
     universal_queries_number_of_queries: int = 2
     
+    # Source review
+    # Review search results in micro-batches as the searches return them
+    stream_review_enabled: bool = False
+    stream_review_batch_size: int = 10
+    # Larger reviews are split into chunks of this many (estimated) tokens
+    review_chunk_max_tokens: int = 16000
+    review_max_concurrency: int = 4
+    # Let a cheaper model triage sources first; only unsure ones reach llm_reviewer.
+    # The tier is one of LLM_TIERS
+    review_cascade_enabled: bool = False
+    review_cascade_tier: str = "llm_query_creator"
+    review_cascade_min_confidence: float = 0.8
+    # Drop sources by local rules before review: too short or boilerplate,
+    # a denylisted domain (comma-separated), published before the source's
+    # last_hours window, or not mentioning the entity (or graph_settings entity_aliases)
+    source_prefilter_enabled: bool = False
+    source_prefilter_require_entity_mention: bool = True
+    source_prefilter_min_content_length: int = 80
+    source_prefilter_domain_denylist: str = ""
+    # Score sources against the entity profile with local hashed embeddings
+    # and review only the relevance_top_k best scoring at least relevance_min_score;
+    # with stream_review_enabled, top-k is an approximate running cut over the
+    # micro-batches and can let more through when later batches score higher
+    relevance_scoring_enabled: bool = False
+    relevance_top_k: int = 20
+    relevance_min_score: float = 0.05
+    
+    # History planning
+    # Group gathered sources into events; the planner sees one representative per event
+    source_clustering_enabled: bool = False
+    source_clustering_threshold: float = 0.45
+    source_clustering_max_days_apart: float = 2.0
+    # Plan each multi-source event cluster in its own call and all single-source
+    # ones in one shared call, at most planning_max_concurrency at a time
+    parallel_planning_enabled: bool = False
+    planning_max_concurrency: int = 4
+    # Compare new entries with the history before the LLM does: accept entries whose
+    # content-word overlap is below duplicate_check_accept_below and that share no
+    # numbers or names besides the entity's; reject from a word-shingle overlap of
+    # duplicate_check_reject_above
+    duplicate_check_enabled: bool = False
+    duplicate_check_accept_below: float = 0.05
+    duplicate_check_reject_above: float = 0.8
+    
     # Search configuration - Web
     search_web_enabled: bool = True
     search_web_create_queries_enabled: bool = False
     search_web_last_days: int = 1
     search_web_max_results: int = 5
     search_web_number_of_queries: int = 2
-    search_web_timeout: int = 300
+    search_web_timeout: int = 0
     search_web_last_hours: int = 24
     search_web_country_rank_enabled: bool = False
     search_web_country_rank: int = 100
@@ -76,7 +139,7 @@ class Configuration:
     search_email_max_results: int = 10
     search_email_number_of_queries: int = 2
     search_email_last_hours: int = 24
-    search_email_timeout: int = 300
+    search_email_timeout: int = 0
     
     # Search configuration - YouTube
     search_youtube_enabled: bool = False
@@ -85,7 +148,7 @@ class Configuration:
     search_youtube_max_results: int = 5
     search_youtube_number_of_queries: int = 2
     search_youtube_last_hours: int = 24
-    search_youtube_timeout: int = 300
+    search_youtube_timeout: int = 0
     
     # Search configuration - Speeches
     search_speeches_enabled: bool = False
@@ -94,7 +157,7 @@ class Configuration:
     search_speeches_max_results: int = 5
     search_speeches_number_of_queries: int = 2
     search_speeches_last_hours: int = 24
-    search_speeches_timeout: int = 300
+    search_speeches_timeout: int = 0
     
     # Search configuration - Scraper
     search_scraper_enabled: bool = False
@@ -102,7 +165,7 @@ class Configuration:
     search_scraper_last_hours: int = 72  # 3 days
     search_scraper_max_results: int = 10
     search_scraper_number_of_queries: int = 2
-    search_scraper_timeout: int = 300
+    search_scraper_timeout: int = 0
     review_scraper_sources_enabled: bool = True
     
     # Prompt configuration - Should Pass Sources
@@ -120,9 +183,16 @@ class Configuration:
     speeches_query_writer_system_instructions: str = speeches_query_writer_system_instructions
     scraper_query_writer_system_instructions: str = scraper_query_writer_system_instructions
     sources_review_system_instructions: str = sources_review_system_instructions
+    sources_triage_system_instructions: str = sources_triage_system_instructions
     should_write_history_entry_system_instructions: str = should_write_history_entry_system_instructions
     should_update_entity_history_system_instructions: str = should_update_entity_history_system_instructions
     
+    def __post_init__(self):
+        if self.review_cascade_tier not in LLM_TIERS:
+            raise ValueError(
+                f"Unknown review_cascade_tier: {self.review_cascade_tier!r} (expected one of {', '.join(LLM_TIERS)})"
+            )
+    
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -2,11 +2,79 @@
 
 from entity_tracker.database.operations import (
     get_entity_history,
+    get_entity_history_projections,
+    get_entity_histories,
+    query_entity_timeline,
+    prefetch_entity_histories,
     save_entity_history_entry,
+    asave_entity_history_entry,
+    enqueue_entity_history_entry,
+    configure_write_behind,
+    flush_write_behind,
+    configure_change_feed,
+    subscribe_changes,
+    configure_store,
+    get_store,
+    configure_history_cache,
+    get_history_cache_stats,
+    configure_retention,
+    enforce_retention,
+    start_retention_worker,
+    stop_retention_worker,
+    get_store_metrics,
+    snapshot_database,
+    restore_database,
+    import_entity_history,
+    export_entity_history,
+)
+from entity_tracker.database.retention import RetentionPolicy
+from entity_tracker.database.changes import ChangeEvent, ChangeFeed, follow_outbox, iter_outbox
+from entity_tracker.database.store import HistoryStore, InMemoryHistoryStore, make_idempotency_key
+from entity_tracker.database.log_store import LogHistoryStore
+from entity_tracker.database.compression import (
+    configure_compression,
+    evaluate_compression_levels,
+    get_compression_stats,
+    train_compression_dictionary,
 )
 
 __all__ = [
     "get_entity_history",
+    "get_entity_history_projections",
+    "get_entity_histories",
+    "query_entity_timeline",
+    "prefetch_entity_histories",
     "save_entity_history_entry",
+    "asave_entity_history_entry",
+    "enqueue_entity_history_entry",
+    "configure_write_behind",
+    "flush_write_behind",
+    "configure_change_feed",
+    "subscribe_changes",
+    "configure_store",
+    "get_store",
+    "HistoryStore",
+    "InMemoryHistoryStore",
+    "make_idempotency_key",
+    "LogHistoryStore",
+    "configure_history_cache",
+    "get_history_cache_stats",
+    "configure_retention",
+    "enforce_retention",
+    "start_retention_worker",
+    "stop_retention_worker",
+    "get_store_metrics",
+    "snapshot_database",
+    "restore_database",
+    "import_entity_history",
+    "export_entity_history",
+    "RetentionPolicy",
+    "ChangeEvent",
+    "ChangeFeed",
+    "follow_outbox",
+    "iter_outbox",
+    "configure_compression",
+    "evaluate_compression_levels",
+    "get_compression_stats",
+    "train_compression_dictionary",
 ]
-
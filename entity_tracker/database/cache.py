@@ -0,0 +1,159 @@
+"""
+Read-through cache for entity history reads.
+
+Entities are usually polled every few minutes and their history rarely changes
+between runs, so the materialised histories are cached per
+(entity_id, last_hours, current_date, limit) and dropped as soon as a new
+entry is saved for that entity. Their sources hold content as stored, so the
+cache is bounded by the compressed size of the bodies, not the decoded one.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+from entity_tracker.database.compression import StoredSourceModel
+from entity_tracker.schemas import EntityHistory
+
+# Rough per-entry overhead of the pydantic objects on top of their text
+ENTRY_OVERHEAD_BYTES = 200
+
+CacheKey = Tuple[str, Optional[int], Optional[str], int]
+CacheValue = Tuple[EntityHistory, EntityHistory]
+# (cache epoch, entity generation); the epoch changes when the whole cache is cleared
+Generation = Tuple[int, int]
+
+
+def estimate_history_size(history: EntityHistory) -> int:
+    """Estimate the memory held by an EntityHistory in bytes, without decoding stored sources."""
+    size = 0
+    for entry in history.entries:
+        size += ENTRY_OVERHEAD_BYTES + len(entry.content)
+        for source in entry.sources:
+            content_size = source.stored_size if isinstance(source, StoredSourceModel) else len(source.page_content)
+            size += ENTRY_OVERHEAD_BYTES + content_size
+    return size
+
+
+class HistoryCache:
+    """
+    LRU cache of (full, source-stripped) entity histories.
+
+    Bounded both by the number of cached histories and by their estimated size.
+    Cached histories are shared between callers and must be treated as read-only.
+    Safe to fill from a prefetch thread while the graph is reading.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._items: "OrderedDict[CacheKey, Tuple[CacheValue, int]]" = OrderedDict()
+        self._keys_by_entity: Dict[str, Set[CacheKey]] = {}
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Generations of recently invalidated entities, oldest first; at most
+        # max_entries are kept, and the others share the last one pruned
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._generation_floor = 0
+        self._last_generation = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[CacheValue]:
+        """Return the cached histories for a key, or None on a miss."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def generation(self, entity_id: str) -> Generation:
+        """Return a value that changes whenever the entity is invalidated or the cache cleared."""
+        with self._lock:
+            return self._epoch, self._generations.get(entity_id, self._generation_floor)
+
+    def put(self, key: CacheKey, value: CacheValue, generation: Optional[Generation] = None) -> None:
+        """
+        Cache the histories for a key, evicting least recently used ones.
+
+        If generation is given and the entity was invalidated, or the cache
+        cleared, since it was read, the value is stale and is not cached.
+        """
+        if not self.enabled:
+            return
+
+        size = estimate_history_size(value[0]) + estimate_history_size(value[1])
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != (
+                self._epoch, self._generations.get(key[0], self._generation_floor)
+            ):
+                return
+            self._discard(key)
+            self._items[key] = (value, size)
+            self._keys_by_entity.setdefault(key[0], set()).add(key)
+            self.resident_bytes += size
+
+            while self._items and (len(self._items) > self.max_entries or self.resident_bytes > self.max_bytes):
+                oldest = next(iter(self._items))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate(self, entity_id: Hashable) -> None:
+        """Drop every cached history of an entity."""
+        with self._lock:
+            self._last_generation += 1
+            self._generations[entity_id] = self._last_generation
+            self._generations.move_to_end(entity_id)
+            while len(self._generations) > self.max_entries:
+                # Generations only grow, so reads of a pruned entity that
+                # started before its last invalidation still don't match
+                _, self._generation_floor = self._generations.popitem(last=False)
+            keys = self._keys_by_entity.pop(entity_id, set())
+            for key in keys:
+                _, size = self._items.pop(key)
+                self.resident_bytes -= size
+            if keys:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop all cached histories, including any read before but cached after the clear."""
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._items.clear()
+            self._keys_by_entity.clear()
+            self.resident_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current footprint."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "resident_bytes": self.resident_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _discard(self, key: CacheKey) -> None:
+        item = self._items.pop(key, None)
+        if item is None:
+            return
+        self.resident_bytes -= item[1]
+        keys = self._keys_by_entity.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_entity[key[0]]
@@ -0,0 +1,215 @@
+"""
+Change feed of newly saved history entries.
+
+Every entry saved through the operations module is published to a ChangeFeed.
+In-process consumers iterate subscribe() to have new entries pushed to them
+instead of polling get_entity_history, and resume after a restart or a
+dropped connection by passing the offset of the last event they handled.
+
+With an outbox file, every event is also appended to a JSONL file shared by
+all processes, and an event's offset is its byte position in that file.
+Other processes follow it with follow_outbox, and in-process subscribers fall
+back to it when they resume from an offset no longer held in memory. Without
+an outbox, offsets are a per-process counter. Either way, subscribe() only
+sees the events published by its own process.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the outbox is only safe within one process
+    fcntl = None
+
+
+@dataclass
+class ChangeEvent:
+    """A saved history entry, as published on the change feed."""
+
+    # Position in the feed; pass it back to resume after this event
+    offset: int
+    entity_id: str
+    entry_id: int
+    content: str
+    timestamp: str
+    relationship_id: Optional[str] = None
+    source_count: int = 0
+
+
+class ChangeFeed:
+    """
+    Publishes change events to async subscribers and an optional outbox file.
+
+    Args:
+        outbox_path: Optional JSONL file to append every event to
+        max_buffered: Events kept in memory for subscribers that fall behind
+    """
+
+    def __init__(self, outbox_path: Optional[str] = None, max_buffered: int = 10_000):
+        self.outbox_path = outbox_path
+        self._lock = threading.Lock()
+        self._events: Deque[ChangeEvent] = deque(maxlen=max_buffered)
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._outbox = None
+        self._last_offset = -1
+        # Offset of the newest event that fell out of the buffer
+        self._evicted_offset = -1
+        self.published = 0
+        if outbox_path:
+            self._outbox = open(outbox_path, "ab")
+            self._last_offset = os.fstat(self._outbox.fileno()).st_size - 1
+
+    def publish(self, entity_id: str, entry_id: int, record: Dict[str, Any]) -> ChangeEvent:
+        """Publish a saved entry and wake every subscriber."""
+        with self._lock:
+            event = ChangeEvent(
+                offset=self._last_offset + 1,
+                entity_id=entity_id,
+                entry_id=entry_id,
+                content=record["content"],
+                timestamp=record["timestamp"],
+                relationship_id=record.get("relationship_id"),
+                source_count=len(record.get("sources", [])),
+            )
+            if self._outbox is not None:
+                event.offset = self._append_to_outbox(event)
+            if len(self._events) == self._events.maxlen:
+                self._evicted_offset = self._events[0].offset
+            self._events.append(event)
+            self._last_offset = event.offset
+            self.published += 1
+            waiters = list(self._waiters)
+
+        for loop, wake in waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # The subscriber's loop has closed
+        return event
+
+    def _append_to_outbox(self, event: ChangeEvent) -> int:
+        """Append an event to the outbox and return the byte offset it was written at."""
+        fd = self._outbox.fileno()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            offset = os.fstat(fd).st_size
+            self._outbox.write(json.dumps({**asdict(event), "offset": offset}).encode("utf-8") + b"\n")
+            self._outbox.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return offset
+
+    def events_after(self, after: int) -> List[ChangeEvent]:
+        """
+        Return published events with an offset greater than after, oldest first.
+
+        Raises:
+            ValueError: If some of those events are no longer buffered and there
+                is no outbox to read them from
+        """
+        with self._lock:
+            newer = []
+            for event in reversed(self._events):
+                if event.offset <= after:
+                    break
+                newer.append(event)
+            missed = after < self._evicted_offset
+            newer.reverse()
+
+        if not missed:
+            return newer
+        if self.outbox_path is None:
+            raise ValueError(f"Change feed offset {after} is no longer buffered")
+        return list(iter_outbox(self.outbox_path, after))
+
+    async def subscribe(self, after: Optional[int] = None) -> AsyncIterator[ChangeEvent]:
+        """
+        Yield events as they are published.
+
+        Args:
+            after: Offset of the last event already handled; only newer events
+                are yielded. Defaults to events published from now on.
+        """
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        with self._lock:
+            self._waiters.add(waiter)
+            position = self._last_offset if after is None else after
+        try:
+            while True:
+                wake.clear()
+                for event in self.events_after(position):
+                    position = event.offset
+                    yield event
+                await wake.wait()
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return publish counts and subscriber numbers."""
+        with self._lock:
+            return {
+                "published": self.published,
+                "buffered": len(self._events),
+                "subscribers": len(self._waiters),
+                "last_offset": self._last_offset,
+                "outbox": self.outbox_path,
+            }
+
+    def close(self) -> None:
+        """Close the outbox file."""
+        if self._outbox is not None:
+            self._outbox.close()
+            self._outbox = None
+
+
+def iter_outbox(path: str, after: int = -1) -> Iterator[ChangeEvent]:
+    """
+    Read the events of an outbox file with an offset greater than after.
+
+    Offsets are byte positions, so reading resumes with a seek rather than a scan.
+    """
+    with open(path, "rb") as f:
+        if after >= 0:
+            f.seek(after)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # Still being written
+            event = ChangeEvent(**json.loads(line))
+            if event.offset > after:
+                yield event
+
+
+async def follow_outbox(
+    path: str,
+    after: int = -1,
+    poll_interval: float = 0.5
+) -> AsyncIterator[ChangeEvent]:
+    """
+    Yield the events of an outbox file, then wait for new ones, forever.
+
+    For consumers in other processes than the writers.
+
+    Args:
+        path: The outbox file
+        after: Offset of the last event already handled
+        poll_interval: Seconds between checks for new events
+    """
+    def read_new(position: int) -> List[ChangeEvent]:
+        return list(iter_outbox(path, position)) if os.path.exists(path) else []
+
+    position = after
+    while True:
+        for event in await asyncio.to_thread(read_new, position):
+            position = event.offset
+            yield event
+        await asyncio.sleep(poll_interval)
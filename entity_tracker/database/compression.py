@@ -0,0 +1,338 @@
+"""
+Compression of stored source content.
+
+Source bodies are mostly news prose of a few thousand characters, which
+compresses well with zlib and noticeably better when the compressor is
+primed with a shared dictionary of common phrases. Content is compressed
+when it is written to the store and only decompressed when it is read:
+histories built from the store are StoredEntityHistories, whose
+StoredSourceModels keep the stored bytes and decode page_content on each
+access.
+"""
+
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, model_validator
+
+from entity_tracker.schemas import EntityHistory, EntityHistoryEntry
+
+# zlib only looks back 32KB, so a larger dictionary is never used
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+class CompressedText:
+    """A compressed string, decoded on demand by the codec that produced it."""
+
+    __slots__ = ("data", "dictionary_id", "raw_length")
+
+    def __init__(self, data: bytes, dictionary_id: int, raw_length: int):
+        self.data = data
+        self.dictionary_id = dictionary_id
+        self.raw_length = raw_length
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"CompressedText({self.raw_length} -> {len(self.data)} bytes)"
+
+
+class SourceContentCodec:
+    """
+    Compresses source content with raw deflate and an optional shared dictionary.
+
+    Every dictionary ever activated is kept by id, so content compressed before a
+    dictionary was retrained can still be decoded.
+    """
+
+    def __init__(self, level: int = 6, enabled: bool = True):
+        self.level = level
+        self.enabled = enabled
+        self.dictionaries: Dict[int, bytes] = {0: b""}
+        self.dictionary_id = 0
+        # Content is compressed and decoded from many threads at once
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the compression and decode counters."""
+        with self._stats_lock:
+            self.raw_bytes = 0
+            self.compressed_bytes = 0
+            self.compress_count = 0
+            self.compress_seconds = 0.0
+            self.decode_count = 0
+            self.decode_seconds = 0.0
+
+    def set_dictionary(self, dictionary: bytes) -> int:
+        """Activate a shared dictionary for new content and return its id."""
+        self.dictionary_id = self.register_dictionary(dictionary)
+        return self.dictionary_id
+
+    def register_dictionary(self, dictionary: bytes) -> int:
+        """Make a dictionary available for decoding without activating it."""
+        dictionary = dictionary[-MAX_DICTIONARY_SIZE:]
+        for dictionary_id, existing in self.dictionaries.items():
+            if existing == dictionary:
+                return dictionary_id
+        dictionary_id = max(self.dictionaries) + 1
+        self.dictionaries[dictionary_id] = dictionary
+        return dictionary_id
+
+    def compress(self, text: str) -> Union[str, CompressedText]:
+        """Compress text, returning it unchanged if compression is disabled."""
+        if not self.enabled or not text:
+            return text
+
+        start = time.perf_counter()
+        raw = text.encode("utf-8")
+        dictionary_id = self.dictionary_id
+        data = _deflate(raw, self.level, self.dictionaries[dictionary_id])
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.compress_seconds += elapsed
+            self.compress_count += 1
+            self.raw_bytes += len(raw)
+            self.compressed_bytes += len(data)
+
+        return CompressedText(data, dictionary_id, len(raw))
+
+    def decompress(self, value: Union[str, CompressedText, None]) -> str:
+        """Decode a value produced by compress; plain strings pass through."""
+        if not isinstance(value, CompressedText):
+            return value or ""
+
+        start = time.perf_counter()
+        text = _inflate(value.data, self.dictionaries[value.dictionary_id]).decode("utf-8")
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.decode_seconds += elapsed
+            self.decode_count += 1
+
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        """Return compression ratio and decode timings."""
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                "dictionary_id": self.dictionary_id,
+                "dictionary_size": len(self.dictionaries[self.dictionary_id]),
+                "compressed_count": self.compress_count,
+                "raw_bytes": self.raw_bytes,
+                "compressed_bytes": self.compressed_bytes,
+                "ratio": (self.raw_bytes / self.compressed_bytes) if self.compressed_bytes else 1.0,
+                "compress_seconds": self.compress_seconds,
+                "decode_count": self.decode_count,
+                "decode_seconds": self.decode_seconds,
+                "mean_decode_us": (self.decode_seconds / self.decode_count * 1e6) if self.decode_count else 0.0,
+            }
+
+
+def _deflate(raw: bytes, level: int, dictionary: bytes) -> bytes:
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def _inflate(data: bytes, dictionary: bytes) -> bytes:
+    if dictionary:
+        decompressor = zlib.decompressobj(-15, dictionary)
+    else:
+        decompressor = zlib.decompressobj(-15)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def train_compression_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    Build a shared compression dictionary from sample texts.
+
+    Counts word n-grams across the samples and packs the ones that would save the
+    most bytes into the dictionary. The most valuable phrases go last, since
+    deflate encodes matches closer to the end of the dictionary more cheaply.
+
+    Args:
+        samples: Representative source contents
+        size: Maximum dictionary size in bytes
+
+    Returns:
+        The dictionary, to be passed to configure_compression
+    """
+    size = min(size, MAX_DICTIONARY_SIZE)
+    counts: Counter = Counter()
+    for sample in samples:
+        words = sample.split()
+        for n in (1, 2, 3, 4):
+            for i in range(len(words) - n + 1):
+                counts[" ".join(words[i:i + n])] += 1
+
+    # A phrase only helps if it shows up in more than one sample or more than once
+    scored = sorted(
+        ((count * len(phrase), phrase) for phrase, count in counts.items() if count > 1 and len(phrase) > 3),
+        reverse=True,
+    )
+
+    selected: List[bytes] = []
+    total = 0
+    for _, phrase in scored:
+        encoded = phrase.encode("utf-8") + b" "
+        if total + len(encoded) > size:
+            continue
+        selected.append(encoded)
+        total += len(encoded)
+
+    return b"".join(reversed(selected))
+
+
+def evaluate_compression_levels(
+    samples: List[str],
+    levels: Iterable[int] = range(1, 10),
+    dictionary: Optional[bytes] = None
+) -> List[Dict[str, Any]]:
+    """
+    Measure compression ratio and decode time for each level on sample texts.
+
+    Args:
+        samples: Representative source contents
+        levels: zlib levels to try
+        dictionary: Optional shared dictionary to prime the compressor with
+
+    Returns:
+        One dict per level with 'level', 'ratio' and 'mean_decode_us'
+    """
+    results = []
+    for level in levels:
+        codec = SourceContentCodec(level=level)
+        if dictionary:
+            codec.set_dictionary(dictionary)
+        compressed = [codec.compress(sample) for sample in samples]
+        for value in compressed:
+            codec.decompress(value)
+        stats = codec.stats()
+        results.append({
+            "level": level,
+            "ratio": stats["ratio"],
+            "mean_decode_us": stats["mean_decode_us"],
+        })
+    return results
+
+
+_codec = SourceContentCodec()
+
+
+def compress_text(text: str) -> Union[str, CompressedText]:
+    """Compress source content for storage."""
+    return _codec.compress(text)
+
+
+def decompress_text(value: Union[str, CompressedText, None]) -> str:
+    """Decode stored source content."""
+    return _codec.decompress(value)
+
+
+class StoredSourceModel(BaseModel):
+    """
+    A source read back from the store, holding its content as stored.
+
+    Has the fields of SourceModel, but page_content is decoded on every
+    access and never kept decoded, so histories built from the store, and
+    the history cache holding them, only carry the compressed bodies. Read
+    it once into a local when it is needed more than once.
+    """
+
+    id: Optional[int] = None
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    created_at: Optional[str] = None
+
+    _stored_content: Union[str, CompressedText, None] = PrivateAttr(default=None)
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _keep_page_content(cls, data: Any, handler) -> "StoredSourceModel":
+        # Content given as a field, e.g. by a serialized history being loaded, is kept as is
+        content = data.get("page_content") if isinstance(data, dict) else None
+        model = handler(data)
+        if content is not None:
+            model._stored_content = content
+        return model
+
+    @classmethod
+    def from_record(cls, source: Dict[str, Any]) -> "StoredSourceModel":
+        """Wrap a stored source dict without decoding its content."""
+        model = cls.model_construct(
+            id=source.get("id"),
+            metadata=source.get("metadata", {}),
+            created_at=source.get("created_at"),
+        )
+        model._stored_content = source.get("page_content")
+        return model
+
+    @computed_field
+    @property
+    def page_content(self) -> str:
+        """The source content, decoded from its stored form."""
+        return decompress_text(self._stored_content)
+
+    @property
+    def stored_size(self) -> int:
+        """Bytes the content takes as stored."""
+        return len(self._stored_content or "")
+
+
+class StoredEntityHistoryEntry(EntityHistoryEntry):
+    """A history entry read back from the store."""
+    sources: List[StoredSourceModel] = Field(
+        description="The sources of the entry.",
+        default_factory=list
+    )
+
+
+class StoredEntityHistory(EntityHistory):
+    """An entity history read back from the store, serialized with its decoded source content."""
+    entries: List[StoredEntityHistoryEntry] = Field(
+        description="Entries in the history of the entity.",
+        default_factory=list
+    )
+
+
+def configure_compression(
+    level: Optional[int] = None,
+    dictionary: Optional[bytes] = None,
+    enabled: Optional[bool] = None
+) -> None:
+    """
+    Configure how new source content is compressed.
+
+    Args:
+        level: zlib compression level (1-9)
+        dictionary: Shared dictionary, e.g. from train_compression_dictionary
+        enabled: Whether to compress new content at all
+    """
+    if level is not None:
+        _codec.level = level
+    if dictionary is not None:
+        _codec.set_dictionary(dictionary)
+    if enabled is not None:
+        _codec.enabled = enabled
+
+
+def get_codec() -> SourceContentCodec:
+    """Return the codec used for stored source content."""
+    return _codec
+
+
+def get_compression_stats() -> Dict[str, Any]:
+    """Return compression ratio and decode timings for the store."""
+    return _codec.stats()
+
+
+def reset_compression_stats() -> None:
+    """Reset the compression counters."""
+    _codec.reset_stats()
@@ -0,0 +1,217 @@
+"""
+Streaming export of stored histories for analytics.
+
+Entries and their sources are written as two flat tables, one row per entry
+and one row per source, to CSV, JSONL or Parquet. Records are read from the
+store one at a time and written in chunks, so memory stays constant however
+large the store is. Each entity's entries are written newest first, the
+order the store yields them in.
+
+From the command line:
+
+    python -m entity_tracker.database.exporter entries.parquet --store-path ./history \\
+        --sources sources.parquet --start 2024-01-01 --end 2024-02-01
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from entity_tracker.database.compression import decompress_text
+from entity_tracker.database.store import HistoryStore, timestamp_to_epoch
+
+ENTRY_COLUMNS = ["entity_id", "entry_id", "timestamp", "relationship_id", "content", "source_count"]
+SOURCE_COLUMNS = ["entity_id", "entry_id", "source_id", "created_at", "metadata", "page_content"]
+
+
+def iter_export_rows(
+    store: HistoryStore,
+    entity_ids: Optional[Iterable[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_sources: bool = True
+) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Yield (entry row, source rows) for every stored entry matching the filters.
+
+    Args:
+        store: The store to read
+        entity_ids: Entities to export (defaults to all)
+        start: Optional ISO timestamp; older entries are skipped
+        end: Optional ISO timestamp; newer entries are skipped
+        include_sources: Whether to build source rows (and decompress content)
+    """
+    since = timestamp_to_epoch(start) if start else None
+    until = timestamp_to_epoch(end) if end else None
+
+    for entity_id in (entity_ids if entity_ids is not None else store.entity_ids()):
+        for record in store.iter_entries(entity_id, since, until):
+            sources = record.get("sources", [])
+            entry_row = {
+                "entity_id": entity_id,
+                "entry_id": record["id"],
+                "timestamp": record["timestamp"],
+                "relationship_id": record.get("relationship_id"),
+                "content": record["content"],
+                "source_count": len(sources),
+            }
+            source_rows = []
+            if include_sources:
+                source_rows = [
+                    {
+                        "entity_id": entity_id,
+                        "entry_id": record["id"],
+                        "source_id": source.get("id"),
+                        "created_at": source.get("created_at"),
+                        "metadata": json.dumps(source.get("metadata") or {}),
+                        "page_content": decompress_text(source.get("page_content")),
+                    }
+                    for source in sources
+                ]
+            yield entry_row, source_rows
+
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: List[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=columns)
+        self._writer.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path: str, columns: List[str]):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str, columns: List[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet exports requires pyarrow: pip install pyarrow")
+
+        types = {"entry_id": pa.int64(), "source_id": pa.int64(), "source_count": pa.int64()}
+        self._pa = pa
+        self._schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def _open_writer(path: str, columns: List[str], format: Optional[str]):
+    if format is None:
+        format = "parquet" if path.endswith((".parquet", ".pq")) else "jsonl" if path.endswith(".jsonl") else "csv"
+    if format not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {format}")
+    return _WRITERS[format](path, columns)
+
+
+def export_histories(
+    store: HistoryStore,
+    entries_path: str,
+    sources_path: Optional[str] = None,
+    entity_ids: Optional[Iterable[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: Optional[str] = None,
+    chunk_size: int = 10_000
+) -> Dict[str, Any]:
+    """
+    Write stored entries, and optionally their sources, to columnar files.
+
+    Args:
+        store: The store to export
+        entries_path: File for the entry rows
+        sources_path: Optional file for the source rows
+        entity_ids: Entities to export (defaults to all)
+        start: Optional ISO timestamp; older entries are skipped
+        end: Optional ISO timestamp; newer entries are skipped
+        format: "csv", "jsonl" or "parquet"; inferred from the extension if omitted
+        chunk_size: Rows buffered before each write
+
+    Returns:
+        Dict with the number of entries and sources written and seconds taken
+    """
+    start_time = time.perf_counter()
+    entry_writer = _open_writer(entries_path, ENTRY_COLUMNS, format)
+    source_writer = _open_writer(sources_path, SOURCE_COLUMNS, format) if sources_path else None
+    entry_rows: List[Dict[str, Any]] = []
+    source_rows: List[Dict[str, Any]] = []
+    counts = {"entries": 0, "sources": 0}
+
+    try:
+        for entry_row, rows in iter_export_rows(store, entity_ids, start, end, source_writer is not None):
+            entry_rows.append(entry_row)
+            source_rows.extend(rows)
+            counts["entries"] += 1
+            counts["sources"] += len(rows)
+            if len(entry_rows) >= chunk_size:
+                entry_writer.write(entry_rows)
+                entry_rows = []
+            if source_writer is not None and len(source_rows) >= chunk_size:
+                source_writer.write(source_rows)
+                source_rows = []
+
+        if entry_rows:
+            entry_writer.write(entry_rows)
+        if source_writer is not None and source_rows:
+            source_writer.write(source_rows)
+    finally:
+        entry_writer.close()
+        if source_writer is not None:
+            source_writer.close()
+
+    counts["seconds"] = time.perf_counter() - start_time
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: export a log store to CSV, JSONL or Parquet."""
+    parser = argparse.ArgumentParser(description="Export entity histories for analytics.")
+    parser.add_argument("entries", help="Output file for entry rows")
+    parser.add_argument("--store-path", required=True, help="LogHistoryStore directory to export")
+    parser.add_argument("--sources", help="Output file for source rows")
+    parser.add_argument("--entity", action="append", dest="entity_ids", help="Entity to export (repeatable)")
+    parser.add_argument("--start", help="Only entries at or after this ISO timestamp")
+    parser.add_argument("--end", help="Only entries at or before this ISO timestamp")
+    parser.add_argument("--format", choices=sorted(_WRITERS), help="Output format (default: from extension)")
+    args = parser.parse_args(argv)
+
+    from entity_tracker.database.log_store import LogHistoryStore
+    store = LogHistoryStore(args.store_path)
+    try:
+        result = export_histories(
+            store, args.entries, args.sources, args.entity_ids, args.start, args.end, args.format
+        )
+    finally:
+        store.close()
+
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
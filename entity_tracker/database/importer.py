@@ -0,0 +1,261 @@
+"""
+Bulk import of archived history entries.
+
+Reads a JSONL or Parquet dump with one entry per line or row:
+
+    {
+        "entity_id": str,
+        "content": str,
+        "timestamp": str,           # ISO format
+        "relationship_id": Optional[str],
+        "sources": [{"page_content", "metadata", "created_at"}, ...],
+        "idempotency_key": Optional[str],
+    }
+
+Entries are sorted by timestamp once with an external merge sort, so memory
+stays bounded by buffer_entries however large the dump is, and are then
+written to the store in a single pass through HistoryStore.insert_many,
+without building any pydantic models. Imported entries go after an entity's
+existing entries, so backfill before live writes start for those entities.
+Rows without an idempotency_key get one derived from their entity, timestamp
+and content, so importing the same dump twice doesn't duplicate entries.
+
+From the command line:
+
+    python -m entity_tracker.database.importer dump.jsonl --store-path ./history
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from entity_tracker.database.store import HistoryStore, make_idempotency_key, timestamp_to_epoch
+
+# Entries pickled together when spilling a sorted run to disk
+SPILL_BLOCK_ENTRIES = 1024
+# Entries handed to the store per insert_many call
+WRITE_BATCH_ENTRIES = 10_000
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def iter_jsonl_entries(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of a JSONL dump, one per non-empty line."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_parquet_entries(path: str, batch_size: int = 10_000) -> Iterator[Dict[str, Any]]:
+    """Yield the rows of a Parquet dump, reading one record batch at a time."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet dumps requires pyarrow: pip install pyarrow")
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def iter_dump_entries(path: str, format: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the entries of a dump file.
+
+    Args:
+        path: JSONL or Parquet file
+        format: "jsonl" or "parquet"; inferred from the extension if omitted
+    """
+    if format is None:
+        format = "parquet" if path.endswith((".parquet", ".pq")) else "jsonl"
+    if format == "parquet":
+        return iter_parquet_entries(path)
+    if format == "jsonl":
+        return iter_jsonl_entries(path)
+    raise ValueError(f"Unsupported dump format: {format}")
+
+
+def _to_record(raw: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Convert a dump row to (entity_id, store record), or None if it is unusable."""
+    entity_id = raw.get("entity_id")
+    timestamp = raw.get("timestamp")
+    if not entity_id or not timestamp:
+        return None
+
+    content = raw.get("content") or ""
+    return entity_id, {
+        "content": content,
+        "sources": [
+            {
+                "page_content": source.get("page_content") or "",
+                "metadata": source.get("metadata") or {},
+                "created_at": source.get("created_at") or timestamp,
+            }
+            for source in raw.get("sources") or []
+        ],
+        "timestamp": timestamp,
+        "relationship_id": raw.get("relationship_id"),
+        "idempotency_key": raw.get("idempotency_key") or make_idempotency_key(entity_id, timestamp, content),
+    }
+
+
+def _spill(run: List[tuple], directory: str) -> str:
+    """Write a sorted run to a temporary file and return its path."""
+    fd, path = tempfile.mkstemp(prefix="import-run-", suffix=".pkl", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for i in range(0, len(run), SPILL_BLOCK_ENTRIES):
+            pickle.dump(run[i:i + SPILL_BLOCK_ENTRIES], f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[tuple]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def import_entries(
+    entries: Iterable[Dict[str, Any]],
+    store: HistoryStore,
+    buffer_entries: int = 100_000,
+    progress: Optional[ProgressCallback] = None,
+    progress_every: int = 100_000,
+    tmp_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Sort entries by timestamp and write them to a store in one pass.
+
+    Args:
+        entries: Dump rows, e.g. from iter_dump_entries
+        store: The store to import into
+        buffer_entries: Entries held in memory before a sorted run is spilled to disk
+        progress: Called with the running counts every progress_every entries
+            and once at the end of each phase
+        progress_every: Entries between progress reports
+        tmp_dir: Directory for spilled runs (defaults to the system temp dir)
+
+    Returns:
+        Dict with 'read', 'imported' (entries actually stored), 'skipped'
+        (malformed rows), 'skipped_duplicates' (entries whose idempotency key
+        was already stored), 'runs' and 'seconds'
+    """
+    start = time.perf_counter()
+    counts = {"phase": "sort", "read": 0, "imported": 0, "skipped": 0, "skipped_duplicates": 0, "runs": 0}
+
+    def report(phase: str) -> None:
+        if progress is not None:
+            progress({**counts, "phase": phase, "seconds": time.perf_counter() - start})
+
+    with tempfile.TemporaryDirectory(prefix="entity-import-", dir=tmp_dir) as directory:
+        run_paths: List[str] = []
+        buffer: List[tuple] = []
+        # The sequence number keeps dump order for equal timestamps
+        sequence = itertools.count()
+
+        for raw in entries:
+            counts["read"] += 1
+            converted = _to_record(raw)
+            if converted is None:
+                counts["skipped"] += 1
+            else:
+                entity_id, record = converted
+                buffer.append((timestamp_to_epoch(record["timestamp"]), next(sequence), entity_id, record))
+                if len(buffer) >= buffer_entries:
+                    buffer.sort(key=_sort_key)
+                    run_paths.append(_spill(buffer, directory))
+                    buffer = []
+            if counts["read"] % progress_every == 0:
+                report("sort")
+
+        buffer.sort(key=_sort_key)
+        counts["runs"] = len(run_paths) + (1 if buffer else 0)
+        report("sort")
+
+        runs = [_read_run(path) for path in run_paths] + [iter(buffer)]
+        merged = heapq.merge(*runs, key=_sort_key) if len(runs) > 1 else runs[0]
+
+        def write(batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+            for _, inserted in store.insert_many(batch):
+                counts["imported" if inserted else "skipped_duplicates"] += 1
+
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        for loaded, (_, _, entity_id, record) in enumerate(merged, 1):
+            batch.append((entity_id, record))
+            if len(batch) >= WRITE_BATCH_ENTRIES:
+                write(batch)
+                batch = []
+            if loaded % progress_every == 0:
+                report("load")
+        if batch:
+            write(batch)
+        report("load")
+
+    counts.pop("phase")
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+def _sort_key(item: tuple) -> Tuple[float, int]:
+    return item[0], item[1]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: import a dump into a log store or a snapshot file."""
+    parser = argparse.ArgumentParser(description="Bulk import archived entity history entries.")
+    parser.add_argument("dump", help="JSONL or Parquet file with one entry per line or row")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="Dump format (default: from extension)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--store-path", help="LogHistoryStore directory to import into")
+    target.add_argument("--snapshot", help="Snapshot file to write from an in-memory store")
+    parser.add_argument("--buffer-entries", type=int, default=100_000, help="Entries sorted in memory per run")
+    parser.add_argument("--tmp-dir", help="Directory for spilled sort runs")
+    args = parser.parse_args(argv)
+
+    def print_progress(counts: Dict[str, Any]) -> None:
+        rate = counts["read"] / counts["seconds"] if counts["seconds"] else 0.0
+        print(
+            f"[{counts['phase']}] read={counts['read']} imported={counts['imported']} "
+            f"skipped={counts['skipped']} duplicates={counts['skipped_duplicates']} runs={counts['runs']} "
+            f"({rate:,.0f} entries/s)",
+            file=sys.stderr,
+        )
+
+    if args.store_path:
+        from entity_tracker.database.log_store import LogHistoryStore
+        store: HistoryStore = LogHistoryStore(args.store_path)
+    else:
+        from entity_tracker.database.store import InMemoryHistoryStore
+        store = InMemoryHistoryStore()
+
+    try:
+        result = import_entries(
+            iter_dump_entries(args.dump, args.format),
+            store,
+            buffer_entries=args.buffer_entries,
+            progress=print_progress,
+            tmp_dir=args.tmp_dir,
+        )
+        if args.snapshot:
+            from entity_tracker.database.snapshot import write_snapshot
+            write_snapshot(store, args.snapshot)
+    finally:
+        store.close()
+
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,820 @@
+"""
+Append-only, log-structured history store.
+
+Entries are appended as CRC-checked frames to segment files, so writes are
+sequential. A fixed-width slot per entry is kept in a memory-mapped index
+file, and each slot links to the previous slot of the same entity. With the
+newest slot of every entity held in memory, reading an entity's latest
+entries follows those links backwards and reads only the frames it returns;
+time windows are checked against the slot before any frame is read.
+
+Compaction copies the live entries of sealed segments into fresh segments,
+dropping entries older than the retention window, and swaps them in with an
+atomic manifest update.
+
+Several threads and processes can share a store directory. Every operation
+holds an exclusive lock on the LOCK file (where fcntl is available; elsewhere
+the store is only thread-safe) and first catches up with slots, segments and
+compactions written by other processes.
+
+Directory layout:
+
+    MANIFEST            json: live segments, active segment, index file, and
+                        the entry and source ids reached before the last compaction
+    segment-000001.log  frames: <length u32><crc32 u32><zlib(json record)>
+    index-000001.bin    slots, see SLOT_FORMAT
+
+An entry saved with an idempotency key is only written once per entity: the
+key's hash is kept in the slot, and a per-process map from key hash to slot
+finds an earlier write without scanning the entity's history.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from entity_tracker.database.retention import RetentionPolicy
+from entity_tracker.database.store import HistoryStore, timestamp_to_epoch
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+FRAME_HEADER = struct.Struct("<II")
+# entity hash, previous slot of the entity, entry id, last source id,
+# frame offset, entry timestamp, segment number, frame length,
+# hash of entity and idempotency key (0 if none)
+SLOT_FORMAT = struct.Struct("<QqQQQdIIQ")
+INDEX_GROWTH_SLOTS = 4096
+
+logger = logging.getLogger(__name__)
+
+
+def entity_hash(entity_id: str) -> int:
+    """Return the 64-bit hash an entity is indexed under."""
+    return int.from_bytes(hashlib.blake2b(entity_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _key_hash(entity_id: str, key: str) -> int:
+    """Return the 64-bit hash an entity's idempotency key is indexed under."""
+    return entity_hash(f"{entity_id}\0{key}")
+
+
+class LogHistoryStore(HistoryStore):
+    """
+    History store backed by append-only segment files in a directory.
+
+    Args:
+        path: Directory holding the store; created if missing
+        max_segment_bytes: Size at which the active segment is sealed
+        retention_hours: Age after which compaction drops entries
+        fsync: Whether to fsync every append before returning
+        compression_level: zlib level used for frames
+        retention_segments_per_step: Sealed segments an incremental
+            apply_retention step compacts
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        retention_hours: Optional[int] = None,
+        fsync: bool = False,
+        compression_level: int = 6,
+        retention_segments_per_step: int = 2
+    ):
+        self.path = path
+        self.max_segment_bytes = max_segment_bytes
+        self.retention_hours = retention_hours
+        self.fsync = fsync
+        self.compression_level = compression_level
+        self.retention_segments_per_step = retention_segments_per_step
+        # Highest segment number the last partial compaction took, to continue after it
+        self._compaction_cursor = 0
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._stop_compaction = threading.Event()
+        self.compaction_count = 0
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, "LOCK"), "a+")
+        self._compaction_lock_file = open(os.path.join(path, "COMPACT.lock"), "a+")
+        with self._locked(sync=False):
+            self._open()
+
+    @contextmanager
+    def _locked(self, sync: bool = True):
+        """Hold the store lock across threads and processes, catching up on entry."""
+        with self._lock:
+            outermost = self._lock_depth == 0
+            self._lock_depth += 1
+            try:
+                if outermost and fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+                    if sync:
+                        self._sync()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if outermost and fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def _compacting(self, blocking: bool = True):
+        """Hold the compaction lock; yields False if it is busy and blocking is off."""
+        if not self._compaction_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._compaction_lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._compaction_lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._compaction_lock.release()
+
+    # Opening and recovery
+
+    def _open(self) -> None:
+        manifest_path = os.path.join(self.path, "MANIFEST")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._manifest = json.load(f)
+        else:
+            self._manifest = {
+                "segments": [1], "active": 1, "index": "index-000001.bin",
+                "next_number": 2, "generation": time.time_ns(),
+                "slot_size": SLOT_FORMAT.size
+            }
+            self._write_manifest()
+        self._manifest_stat = self._stat_manifest()
+        if self._manifest.get("slot_size") != SLOT_FORMAT.size:
+            raise ValueError(f"{self.path} was written with an incompatible index format")
+
+        self._remove_unreferenced_files()
+        self._readers: Dict[int, Any] = {}
+        self._segment_sizes = {n: self._file_size(self._segment_path(n)) for n in self._manifest["segments"]}
+        self._writer = open(self._segment_path(self._manifest["active"]), "ab")
+        self._map_index(os.path.join(self.path, self._manifest["index"]))
+        self._load_slots()
+        self._recover_active_segment()
+        self._epoch = getattr(self, "_epoch", 0) + 1
+
+    def _sync(self) -> None:
+        """Pick up changes made by other processes since we last held the lock."""
+        if self._stat_manifest() != self._manifest_stat:
+            with open(os.path.join(self.path, "MANIFEST")) as f:
+                manifest = json.load(f)
+            if manifest.get("generation") != self._manifest.get("generation"):
+                # Compacted or cleared elsewhere: every slot may have moved
+                self._close_files()
+                self._open()
+                return
+            self._manifest = manifest
+            self._manifest_stat = self._stat_manifest()
+            for number in manifest["segments"]:
+                self._segment_sizes.setdefault(number, self._file_size(self._segment_path(number)))
+            if os.path.basename(self._writer.name) != os.path.basename(self._segment_path(manifest["active"])):
+                self._writer.close()
+                self._writer = open(self._segment_path(manifest["active"]), "ab")
+
+        self._segment_sizes[self._manifest["active"]] = os.fstat(self._writer.fileno()).st_size
+        if os.fstat(self._index_file.fileno()).st_size > len(self._index):
+            self._index.close()
+            self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+        capacity = len(self._index) // SLOT_FORMAT.size
+        while self._slot_count < capacity:
+            h, _, entry_id, source_end, _, _, _, length, key_hash = self._read_slot(self._slot_count)
+            if length == 0:
+                break
+            self._heads[h] = self._slot_count
+            if key_hash:
+                self._key_slots[key_hash] = self._slot_count
+            self._entry_counter = max(self._entry_counter, entry_id)
+            self._source_counter = max(self._source_counter, source_end)
+            self._slot_count += 1
+
+    def _map_index(self, index_path: str) -> None:
+        if not os.path.exists(index_path) or self._file_size(index_path) == 0:
+            with open(index_path, "wb") as f:
+                f.truncate(INDEX_GROWTH_SLOTS * SLOT_FORMAT.size)
+        self._index_file = open(index_path, "r+b")
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+    def _load_slots(self) -> None:
+        """Count valid slots and rebuild the per-entity heads and id counters."""
+        capacity = len(self._index) // SLOT_FORMAT.size
+        self._slot_count = 0
+        self._heads: Dict[int, int] = {}
+        # Ids of entries compacted away are only recorded in the manifest
+        self._entry_counter = self._manifest.get("entry_counter", 0)
+        self._source_counter = self._manifest.get("source_counter", 0)
+        self._indexed_end: Dict[int, int] = {}
+        self._key_slots: Dict[int, int] = {}
+
+        for slot in range(capacity):
+            h, prev, entry_id, source_end, offset, _, segment, length, key_hash = SLOT_FORMAT.unpack_from(self._index, slot * SLOT_FORMAT.size)
+            if length == 0:
+                break
+            # A slot written before its frame reached disk is dropped, along with anything after it
+            if segment not in self._segment_sizes or offset + length > self._segment_sizes[segment]:
+                break
+            self._slot_count = slot + 1
+            self._heads[h] = slot
+            if key_hash:
+                self._key_slots[key_hash] = slot
+            self._entry_counter = max(self._entry_counter, entry_id)
+            self._source_counter = max(self._source_counter, source_end)
+            self._indexed_end[segment] = max(self._indexed_end.get(segment, 0), offset + length)
+
+        # Zero out anything past the last valid slot
+        start = self._slot_count * SLOT_FORMAT.size
+        self._index[start:] = b"\0" * (len(self._index) - start)
+
+    def _recover_active_segment(self) -> None:
+        """Index frames written after the last slot, and cut off a torn tail."""
+        active = self._manifest["active"]
+        path = self._segment_path(active)
+        offset = self._indexed_end.get(active, 0)
+        size = self._segment_sizes[active]
+        if offset >= size:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while offset < size:
+                header = f.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    break
+                length, crc = FRAME_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                record = _decode_payload(payload)
+                self._add_slot(record, active, offset, FRAME_HEADER.size + length)
+                offset += FRAME_HEADER.size + length
+
+        if offset < size:
+            self._writer.truncate(offset)
+            self._segment_sizes[active] = offset
+
+    # Writes
+
+    def insert(self, entity_id: str, record: Dict[str, Any]) -> Tuple[int, bool]:
+        with self._locked():
+            result = self._write_record(entity_id, record)
+            self._flush()
+            return result
+
+    def insert_many(
+        self,
+        items: Iterable[Tuple[str, Dict[str, Any]]],
+        batch_size: int = 4096
+    ) -> List[Tuple[int, bool]]:
+        """Insert in batches, taking the lock and flushing once per batch."""
+        results: List[Tuple[int, bool]] = []
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                results.extend(self._insert_batch(batch))
+                batch = []
+        if batch:
+            results.extend(self._insert_batch(batch))
+        return results
+
+    def _insert_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[int, bool]]:
+        with self._locked():
+            results = [self._write_record(entity_id, record) for entity_id, record in batch]
+            self._flush()
+        return results
+
+    def _write_record(self, entity_id: str, record: Dict[str, Any]) -> Tuple[int, bool]:
+        """Write one frame and index it; the caller holds the lock and flushes."""
+        key = record.get("idempotency_key")
+        if key:
+            existing = self._find_key(entity_id, key)
+            if existing is not None:
+                return existing, False
+
+        self._entry_counter += 1
+        sources = []
+        for source in record.get("sources", []):
+            self._source_counter += 1
+            sources.append({**source, "id": self._source_counter})
+        stored = {**record, "id": self._entry_counter, "sources": sources, "entity_id": entity_id}
+
+        payload = zlib.compress(json.dumps(stored).encode("utf-8"), self.compression_level)
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        active = self._manifest["active"]
+        if self._segment_sizes[active] and self._segment_sizes[active] + len(frame) > self.max_segment_bytes:
+            self._flush()
+            active = self._roll_segment()
+
+        offset = self._segment_sizes[active]
+        self._writer.write(frame)
+        self._segment_sizes[active] = offset + len(frame)
+
+        self._add_slot(stored, active, offset, len(frame))
+        return self._entry_counter, True
+
+    def find_idempotency_key(self, entity_id: str, key: str) -> Optional[int]:
+        with self._locked():
+            return self._find_key(entity_id, key)
+
+    def _find_key(self, entity_id: str, key: str) -> Optional[int]:
+        """Return the id of an entry written with this key; the caller holds the lock."""
+        slot = self._key_slots.get(_key_hash(entity_id, key))
+        if slot is None:
+            return None
+        # The frame may still be in the writer's buffer
+        self._writer.flush()
+        _, _, entry_id, _, offset, _, segment, length, _ = self._read_slot(slot)
+        record = self._read_frame(segment, offset, length)
+        if record["entity_id"] == entity_id and record.get("idempotency_key") == key:
+            return entry_id
+        return None
+
+    def _flush(self) -> None:
+        """Make written frames visible to readers, and durable with fsync on."""
+        self._writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+            self._index.flush()
+
+    def _add_slot(self, record: Dict[str, Any], segment: int, offset: int, length: int) -> None:
+        if (self._slot_count + 1) * SLOT_FORMAT.size > len(self._index):
+            self._grow_index()
+
+        h = entity_hash(record["entity_id"])
+        source_end = max([s["id"] for s in record.get("sources", [])], default=0)
+        key_hash = _key_hash(record["entity_id"], record["idempotency_key"]) if record.get("idempotency_key") else 0
+        SLOT_FORMAT.pack_into(
+            self._index, self._slot_count * SLOT_FORMAT.size,
+            h, self._heads.get(h, -1), record["id"], source_end,
+            offset, timestamp_to_epoch(record.get("timestamp")), segment, length, key_hash
+        )
+        self._heads[h] = self._slot_count
+        if key_hash:
+            self._key_slots[key_hash] = self._slot_count
+        self._slot_count += 1
+        self._entry_counter = max(self._entry_counter, record["id"])
+        self._source_counter = max(self._source_counter, source_end)
+
+    def _grow_index(self) -> None:
+        size = len(self._index) + INDEX_GROWTH_SLOTS * SLOT_FORMAT.size
+        self._index.flush()
+        self._index.close()
+        self._index_file.truncate(size)
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+    def _roll_segment(self) -> int:
+        """Seal the active segment and start a new one."""
+        self._writer.close()
+        number = self._manifest["next_number"]
+        self._manifest["next_number"] = number + 1
+        self._manifest["segments"].append(number)
+        self._manifest["active"] = number
+        self._segment_sizes[number] = 0
+        self._writer = open(self._segment_path(number), "ab")
+        self._write_manifest()
+        return number
+
+    # Reads
+
+    def iter_entries(
+        self,
+        entity_id: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_id: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        h = entity_hash(entity_id)
+        with self._locked():
+            slot = self._seek(h, before_id) if before_id is not None else self._heads.get(h, -1)
+            epoch = self._epoch
+        last_id = before_id
+        while True:
+            with self._locked():
+                if epoch != self._epoch:
+                    # Compaction renumbered the slots; find our place again by entry id
+                    epoch = self._epoch
+                    slot = self._seek(h, last_id) if last_id is not None else self._heads.get(h, -1)
+                if slot < 0:
+                    return
+                _, prev, last_id, _, offset, timestamp, segment, length, _ = self._read_slot(slot)
+                record = None
+                if (since is None or timestamp >= since) and (until is None or timestamp <= until):
+                    record = self._read_frame(segment, offset, length)
+            if record is not None and record["entity_id"] == entity_id:
+                yield record
+            slot = prev
+
+    def _seek(self, h: int, before_id: int) -> int:
+        """Return the entity's newest slot with an entry id below before_id."""
+        # Slots are written in entry id order, so the slot holding before_id
+        # can be found by bisection and its link followed from there
+        lo, hi = 0, self._slot_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_slot(mid)[2] < before_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._slot_count:
+            slot_hash, prev, entry_id = self._read_slot(lo)[:3]
+            if entry_id == before_id and slot_hash == h:
+                return prev
+
+        # The entry is gone (evicted, or never ours): walk the entity's links
+        slot = self._heads.get(h, -1)
+        while slot >= 0 and self._read_slot(slot)[2] >= before_id:
+            slot = self._read_slot(slot)[1]
+        return slot
+
+    def read_many(
+        self,
+        entity_ids: Iterable[str],
+        since: Optional[float] = None,
+        limit: int = 100
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        entity_ids = list(entity_ids)
+        with self._locked():
+            wanted: List[Tuple[int, int, int, str, int]] = []
+            for entity_id in entity_ids:
+                slot = self._heads.get(entity_hash(entity_id), -1)
+                rank = 0
+                while slot >= 0 and rank < limit:
+                    _, prev, _, _, offset, timestamp, segment, length, _ = self._read_slot(slot)
+                    if since is None or timestamp >= since:
+                        wanted.append((segment, offset, length, entity_id, rank))
+                        rank += 1
+                    slot = prev
+
+            # Read frames in file order, then put each entity's entries back newest first
+            results: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {entity_id: [] for entity_id in entity_ids}
+            for segment, offset, length, entity_id, rank in sorted(wanted):
+                record = self._read_frame(segment, offset, length)
+                if record["entity_id"] == entity_id:
+                    results[entity_id].append((rank, record))
+
+        return {
+            entity_id: [record for _, record in sorted(ranked, key=lambda item: item[0])]
+            for entity_id, ranked in results.items()
+        }
+
+    def entity_ids(self) -> List[str]:
+        with self._locked():
+            ids = []
+            for slot in self._heads.values():
+                _, _, _, _, offset, _, segment, length, _ = self._read_slot(slot)
+                ids.append(self._read_frame(segment, offset, length)["entity_id"])
+            return ids
+
+    def _read_slot(self, slot: int) -> tuple:
+        return SLOT_FORMAT.unpack_from(self._index, slot * SLOT_FORMAT.size)
+
+    def _read_frame(self, segment: int, offset: int, length: int) -> Dict[str, Any]:
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = self._readers[segment] = open(self._segment_path(segment), "rb")
+        reader.seek(offset + FRAME_HEADER.size)
+        return _decode_payload(reader.read(length - FRAME_HEADER.size))
+
+    # Compaction
+
+    def compact(
+        self,
+        max_age_hours: Optional[int] = None,
+        now: Optional[float] = None,
+        max_entries_per_entity: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_segments: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Rewrite sealed segments, dropping entries outside the retention limits.
+
+        Writers are only blocked while the new index and manifest are swapped in.
+        With max_segments, only that many sealed segments are rewritten, taken
+        in segment number order after the ones the previous partial compaction
+        took; entries in the other segments keep their frames and can only be
+        dropped by a later step.
+
+        Args:
+            max_age_hours: Retention window; defaults to the store's retention_hours
+            now: Reference time in epoch seconds (defaults to now)
+            max_entries_per_entity: Keep only this many newest entries per entity
+            max_bytes: Drop the earliest written entries until segments fit in this size
+            max_segments: Most sealed segments to rewrite (None rewrites all)
+
+        Returns:
+            Dict with the number of entries kept and dropped, and drops per entity
+        """
+        max_age_hours = max_age_hours if max_age_hours is not None else self.retention_hours
+        cutoff = ((now or time.time()) - max_age_hours * 3600) if max_age_hours else None
+
+        with self._compacting():
+            # Seal the active segment so every slot taken here points into a sealed one
+            with self._locked():
+                if self._segment_sizes[self._manifest["active"]]:
+                    self._roll_segment()
+                sealed = [n for n in self._manifest["segments"] if n != self._manifest["active"]]
+                if max_segments is not None and len(sealed) > max_segments:
+                    ordered = sorted(sealed)
+                    after_cursor = [n for n in ordered if n > self._compaction_cursor]
+                    sealed = (after_cursor + [n for n in ordered if n <= self._compaction_cursor])[:max_segments]
+                    self._compaction_cursor = sealed[-1]
+                compacted_count = self._slot_count
+                old_slots = bytes(self._index[:compacted_count * SLOT_FORMAT.size])
+                # Reserve numbers for the new index and segments so rolls during the copy can't collide
+                first_number = self._manifest["next_number"]
+                self._manifest["next_number"] += 2 * len(sealed) + 2
+                self._write_manifest()
+
+            drop = self._slots_to_drop(old_slots, compacted_count, cutoff, max_entries_per_entity, max_bytes)
+
+            new_slots = []
+            new_segments = []
+            kept = dropped = 0
+            dropped_entities: Dict[str, int] = {}
+            dropped_names: Dict[int, str] = {}
+            writer = None
+            number = first_number
+            size = 0
+            readers = {n: open(self._segment_path(n), "rb") for n in sealed}
+            try:
+                for slot in range(compacted_count):
+                    h, _, entry_id, source_end, offset, timestamp, segment, length, key_hash = SLOT_FORMAT.unpack_from(old_slots, slot * SLOT_FORMAT.size)
+                    if segment not in readers:
+                        # Not rewritten in this step: the entry keeps its frame
+                        new_slots.append([h, -1, entry_id, source_end, offset, timestamp, segment, length, key_hash])
+                        kept += 1
+                        continue
+                    readers[segment].seek(offset)
+                    if slot in drop:
+                        # Read one frame per entity to learn the name behind the hash
+                        if h not in dropped_names:
+                            dropped_names[h] = _decode_payload(readers[segment].read(length)[FRAME_HEADER.size:])["entity_id"]
+                        dropped_entities[dropped_names[h]] = dropped_entities.get(dropped_names[h], 0) + 1
+                        dropped += 1
+                        continue
+                    frame = readers[segment].read(length)
+                    if writer is None or (size and size + length > self.max_segment_bytes):
+                        if writer is not None:
+                            writer.close()
+                        number += 1
+                        new_segments.append(number)
+                        writer = open(self._segment_path(number), "wb")
+                        size = 0
+                    writer.write(frame)
+                    new_slots.append([h, -1, entry_id, source_end, size, timestamp, number, length, key_hash])
+                    size += length
+                    kept += 1
+            finally:
+                for reader in readers.values():
+                    reader.close()
+                if writer is not None:
+                    writer.flush()
+                    os.fsync(writer.fileno())
+                    writer.close()
+
+            with self._locked():
+                # Entries appended during the copy live in unsealed segments and keep their frames
+                for slot in range(compacted_count, self._slot_count):
+                    new_slots.append([*self._read_slot(slot)])
+                    new_slots[-1][1] = -1
+
+                heads: Dict[int, int] = {}
+                key_slots: Dict[int, int] = {}
+                for i, slot_values in enumerate(new_slots):
+                    slot_values[1] = heads.get(slot_values[0], -1)
+                    heads[slot_values[0]] = i
+                    if slot_values[8]:
+                        key_slots[slot_values[8]] = i
+
+                index_name = f"index-{first_number:06d}.bin"
+                capacity = (len(new_slots) // INDEX_GROWTH_SLOTS + 1) * INDEX_GROWTH_SLOTS
+                with open(os.path.join(self.path, index_name), "wb") as f:
+                    for slot_values in new_slots:
+                        f.write(SLOT_FORMAT.pack(*slot_values))
+                    f.truncate(capacity * SLOT_FORMAT.size)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                old_index = self._manifest["index"]
+                self._manifest["segments"] = new_segments + [n for n in self._manifest["segments"] if n not in sealed]
+                self._manifest["index"] = index_name
+                self._manifest["generation"] = time.time_ns()
+                # Dropped entries take their ids out of the index; keep new ids above them
+                self._manifest["entry_counter"] = self._entry_counter
+                self._manifest["source_counter"] = self._source_counter
+                self._write_manifest()
+
+                self._close_readers()
+                self._index.close()
+                self._index_file.close()
+                for n in sealed:
+                    os.remove(self._segment_path(n))
+                    del self._segment_sizes[n]
+                os.remove(os.path.join(self.path, old_index))
+                for n in new_segments:
+                    self._segment_sizes[n] = self._file_size(self._segment_path(n))
+
+                self._map_index(os.path.join(self.path, index_name))
+                self._slot_count = len(new_slots)
+                self._heads = heads
+                self._key_slots = key_slots
+                self._epoch += 1
+                self.compaction_count += 1
+
+        return {"kept": kept, "dropped": dropped, "dropped_entities": dropped_entities}
+
+    @staticmethod
+    def _slots_to_drop(
+        slots: bytes,
+        count: int,
+        cutoff: Optional[float],
+        max_entries_per_entity: Optional[int],
+        max_bytes: Optional[int]
+    ) -> set:
+        """Return the slot numbers compaction should drop."""
+        unpacked = [SLOT_FORMAT.unpack_from(slots, slot * SLOT_FORMAT.size) for slot in range(count)]
+        drop = set()
+        if cutoff is not None:
+            drop.update(slot for slot, values in enumerate(unpacked) if values[5] < cutoff)
+
+        if max_entries_per_entity is not None:
+            remaining: Dict[int, int] = {}
+            for slot, values in enumerate(unpacked):
+                if slot not in drop:
+                    remaining[values[0]] = remaining.get(values[0], 0) + 1
+            for slot, values in enumerate(unpacked):
+                if slot not in drop and remaining[values[0]] > max_entries_per_entity:
+                    drop.add(slot)
+                    remaining[values[0]] -= 1
+
+        if max_bytes is not None:
+            live_bytes = sum(values[7] for slot, values in enumerate(unpacked) if slot not in drop)
+            for slot, values in enumerate(unpacked):
+                if live_bytes <= max_bytes:
+                    break
+                if slot not in drop:
+                    drop.add(slot)
+                    live_bytes -= values[7]
+
+        return drop
+
+    def apply_retention(
+        self,
+        policy: RetentionPolicy,
+        max_entities: Optional[int] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, int]:
+        # Entries can only leave the log through compaction; an incremental
+        # step rewrites retention_segments_per_step sealed segments, a full
+        # one (max_entities=None) all of them. max_bytes bounds the segment files
+        if policy.is_empty():
+            return {}
+        return self.compact(
+            max_age_hours=policy.max_age_hours,
+            now=now,
+            max_entries_per_entity=policy.max_entries_per_entity,
+            max_bytes=policy.max_bytes,
+            max_segments=None if max_entities is None else self.retention_segments_per_step,
+        )["dropped_entities"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._locked():
+            return {
+                "backend": "log",
+                "entities": len(self._heads),
+                "entries": self._slot_count,
+                "segments": len(self._manifest["segments"]),
+                "disk_bytes": sum(self._segment_sizes.values()) + len(self._index),
+                # The mapped index plus the in-memory entity heads
+                "resident_bytes": len(self._index) + len(self._heads) * 100,
+            }
+
+    def start_compaction(self, interval_seconds: float = 300.0, min_sealed_segments: int = 2) -> None:
+        """
+        Compact in a background thread whenever enough segments have been sealed.
+
+        Args:
+            interval_seconds: How often to check
+            min_sealed_segments: Sealed segments needed before compacting
+        """
+        if self._compaction_thread is not None:
+            return
+
+        def run():
+            while not self._stop_compaction.wait(interval_seconds):
+                try:
+                    if len(self._manifest["segments"]) - 1 >= min_sealed_segments:
+                        self.compact()
+                except Exception:
+                    # Keep compacting on the next tick; the failed pass swapped nothing in
+                    logger.exception("Background compaction of %s failed", self.path)
+
+        self._stop_compaction.clear()
+        self._compaction_thread = threading.Thread(target=run, name="history-log-compaction", daemon=True)
+        self._compaction_thread.start()
+
+    def stop_compaction(self) -> None:
+        """Stop the background compaction thread."""
+        if self._compaction_thread is None:
+            return
+        self._stop_compaction.set()
+        self._compaction_thread.join()
+        self._compaction_thread = None
+
+    # Housekeeping
+
+    def segment_numbers(self) -> List[int]:
+        """Return the live segment numbers, oldest first."""
+        return list(self._manifest["segments"])
+
+    def clear(self) -> None:
+        with self._locked():
+            self._close_files()
+            for name in os.listdir(self.path):
+                if _is_store_file(name):
+                    os.remove(os.path.join(self.path, name))
+            self._open()
+
+    def close(self) -> None:
+        self.stop_compaction()
+        with self._locked(sync=False):
+            self._close_files()
+        self._lock_file.close()
+        self._compaction_lock_file.close()
+
+    def _close_files(self) -> None:
+        self._close_readers()
+        self._writer.close()
+        self._index.flush()
+        self._index.close()
+        self._index_file.close()
+
+    def _close_readers(self) -> None:
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+
+    def _write_manifest(self) -> None:
+        tmp_path = os.path.join(self.path, "MANIFEST.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, "MANIFEST"))
+        self._manifest_stat = self._stat_manifest()
+
+    def _stat_manifest(self) -> tuple:
+        stat = os.stat(os.path.join(self.path, "MANIFEST"))
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _remove_unreferenced_files(self) -> None:
+        """Delete segments and indexes left behind by an interrupted compaction."""
+        with self._compacting(blocking=False) as acquired:
+            # A compaction in progress elsewhere owns its unreferenced files
+            if not acquired:
+                return
+            live = {os.path.basename(self._segment_path(n)) for n in self._manifest["segments"]}
+            live.update({self._manifest["index"], "MANIFEST"})
+            for name in os.listdir(self.path):
+                if _is_store_file(name) and name not in live:
+                    os.remove(os.path.join(self.path, name))
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.path, f"segment-{number:06d}.log")
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _is_store_file(name: str) -> bool:
+    return name.startswith(("segment-", "index-", "MANIFEST"))
+
+
+def _decode_payload(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload))
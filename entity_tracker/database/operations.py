@@ -1,18 +1,44 @@
 """
 Simplified database operations for entity tracking.
 
-This is a mock implementation that stores data in memory.
-In a production environment, replace this with actual database operations.
+Entries are kept in a HistoryStore, in memory by default. Use configure_store
+to switch to a persistent backend such as LogHistoryStore, or plug in your
+own production database by implementing the HistoryStore interface.
 """
 
-from typing import Optional, Dict, Any, List
+import asyncio
+import base64
+import json
+from typing import Optional, Dict, Any, List, Tuple, Iterable, AsyncIterator
 from datetime import datetime, timedelta
-from entity_tracker.schemas import EntityHistory, EntityHistoryEntry, SourceModel
+from concurrent.futures import Future, ThreadPoolExecutor
+from entity_tracker.schemas import EntityHistory, EntityHistoryEntry, SourceModel, TimelineEntry, TimelinePage
+from entity_tracker.database.compression import (
+    StoredEntityHistory,
+    StoredEntityHistoryEntry,
+    StoredSourceModel,
+    decompress_text,
+    get_compression_stats,
+)
+from entity_tracker.database.cache import HistoryCache
+from entity_tracker.database.store import HistoryStore, InMemoryHistoryStore, timestamp_to_epoch, make_idempotency_key
+from entity_tracker.database.retention import RetentionPolicy, RetentionWorker
+from entity_tracker.database.snapshot import read_snapshot, write_snapshot
+from entity_tracker.database.importer import ProgressCallback, import_entries, iter_dump_entries
+from entity_tracker.database.exporter import export_histories
+from entity_tracker.database.changes import ChangeEvent, ChangeFeed
+from entity_tracker.database.write_behind import WriteBehindQueue
 
 # In-memory storage for demonstration
-_entity_histories: Dict[str, List[Dict[str, Any]]] = {}
-_entity_sources: Dict[int, SourceModel] = {}
-_source_counter = 0
+_store: HistoryStore = InMemoryHistoryStore()
+_history_cache = HistoryCache()
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-prefetch")
+_retention_policy = RetentionPolicy()
+_retention_worker: Optional[RetentionWorker] = None
+_change_feed = ChangeFeed()
+_write_behind: Optional[WriteBehindQueue] = None
+# Default seconds flush_write_behind waits for the queue to drain
+FLUSH_TIMEOUT_SECONDS = 30.0
 
 
 def get_entity_history(
@@ -24,6 +50,9 @@ def get_entity_history(
     """
     Retrieve entity history from the database.
     
+    Reads go through the history cache, so the returned object may be shared
+    with other callers and must not be mutated.
+    
     Args:
         entity_id: The entity identifier
         last_hours: Optional time window in hours
@@ -33,50 +62,233 @@ def get_entity_history(
     Returns:
         EntityHistory object with historical entries
     """
-    if entity_id not in _entity_histories:
-        return EntityHistory(entries=[])
-    
-    entries = _entity_histories[entity_id]
-    
-    # Apply time filtering if specified
-    if last_hours and current_date:
-        try:
-            ref_date = datetime.fromisoformat(current_date)
-            cutoff_date = ref_date - timedelta(hours=last_hours)
-            
-            filtered_entries = []
-            for entry in entries:
-                entry_date = datetime.fromisoformat(entry["timestamp"])
-                if entry_date >= cutoff_date:
-                    filtered_entries.append(entry)
-            entries = filtered_entries
-        except:
-            pass  # If date parsing fails, return all entries
-    
-    # Apply limit
-    entries = entries[:limit]
-    
-    # Convert to EntityHistory format
+    return get_entity_history_projections(entity_id, last_hours, current_date, limit)[0]
+
+
+def get_entity_history_projections(
+    entity_id: str,
+    last_hours: Optional[int] = None,
+    current_date: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[EntityHistory, EntityHistory]:
+    """
+    Retrieve entity history both with and without sources.
+    
+    Both projections are served from the read-through cache, which is
+    invalidated whenever an entry is saved for the entity.
+    
+    Args:
+        entity_id: The entity identifier
+        last_hours: Optional time window in hours
+        current_date: Optional reference date
+        limit: Maximum number of entries to return
+        
+    Returns:
+        Tuple of (full history, history with empty source lists)
+    """
+    return _get_projections_many([entity_id], last_hours, current_date, limit)[entity_id]
+
+
+def get_entity_histories(
+    entity_ids: Iterable[str],
+    last_hours: Optional[int] = None,
+    current_date: Optional[str] = None,
+    limit: int = 100
+) -> Dict[str, EntityHistory]:
+    """
+    Retrieve the histories of many entities in a single pass.
+    
+    Cached histories are served from the cache; the rest are read from the
+    store in one scan and cached for the initialize_search calls that follow.
+    
+    Args:
+        entity_ids: The entity identifiers
+        last_hours: Optional time window in hours
+        current_date: Optional reference date
+        limit: Maximum number of entries to return per entity
+        
+    Returns:
+        Dict mapping each entity id to its EntityHistory
+    """
+    projections = _get_projections_many(entity_ids, last_hours, current_date, limit)
+    return {entity_id: full for entity_id, (full, _) in projections.items()}
+
+
+def prefetch_entity_histories(
+    entity_ids: Iterable[str],
+    last_hours: Optional[int] = None,
+    current_date: Optional[str] = None,
+    limit: int = 100
+) -> Future:
+    """
+    Warm the history cache for upcoming entities in a background thread.
+    
+    Use the same window and limit that initialize_search will use, so its
+    reads hit the cache. Await the result with asyncio.wrap_future if needed.
+    
+    Args:
+        entity_ids: The entity identifiers
+        last_hours: Optional time window in hours
+        current_date: Optional reference date
+        limit: Maximum number of entries to return per entity
+        
+    Returns:
+        Future resolving to the same dict as get_entity_histories
+    """
+    return _prefetch_executor.submit(get_entity_histories, list(entity_ids), last_hours, current_date, limit)
+
+
+def _get_projections_many(
+    entity_ids: Iterable[str],
+    last_hours: Optional[int],
+    current_date: Optional[str],
+    limit: int
+) -> Dict[str, Tuple[EntityHistory, EntityHistory]]:
+    """Read both projections for many entities, going to the store only for misses."""
+    results = {}
+    missing = []
+    for entity_id in entity_ids:
+        cached = _history_cache.get((entity_id, last_hours, current_date, limit))
+        if cached is not None:
+            results[entity_id] = cached
+        else:
+            missing.append(entity_id)
+    
+    if not missing:
+        return results
+    
+    # Capture generations before reading so a concurrent save can't leave
+    # a stale history in the cache
+    generations = {entity_id: _history_cache.generation(entity_id) for entity_id in missing}
+    since = _window_start(last_hours, current_date)
+    queue = _write_behind
+    if queue is not None and queue.has_pending(missing):
+        # Read your writes: merge entries still waiting in the write-behind queue
+        with queue.commit_lock:
+            stored = _store.read_many(missing, since=since, limit=limit)
+            for entity_id in missing:
+                pending = [
+                    record for record in queue.pending_records(entity_id)
+                    if since is None or timestamp_to_epoch(record["timestamp"]) >= since
+                ]
+                if pending:
+                    stored[entity_id] = (pending + stored.get(entity_id, []))[:limit]
+    else:
+        stored = _store.read_many(missing, since=since, limit=limit)
+    for entity_id in missing:
+        entries = stored.get(entity_id, [])
+        projections = (_to_entity_history(entries), _to_entity_history(entries, include_sources=False))
+        _history_cache.put((entity_id, last_hours, current_date, limit), projections, generations[entity_id])
+        results[entity_id] = projections
+    
+    return results
+
+
+def _window_start(last_hours: Optional[int], current_date: Optional[str]) -> Optional[float]:
+    """Return the start of the time window in epoch seconds, if there is one."""
+    if not (last_hours and current_date):
+        return None
+    try:
+        ref_date = datetime.fromisoformat(current_date)
+    except ValueError:
+        return None  # If date parsing fails, return all entries
+    return (ref_date - timedelta(hours=last_hours)).timestamp()
+
+
+def _to_entity_history(entries: List[Dict[str, Any]], include_sources: bool = True) -> EntityHistory:
+    """Convert stored entries to EntityHistory format, leaving source content encoded until it is read."""
+    if not include_sources:
+        return EntityHistory(entries=[EntityHistoryEntry(content=entry["content"]) for entry in entries])
+    
     history_entries = []
     for entry in entries:
-        sources = [
-            SourceModel(
-                id=src.get("id"),
-                page_content=src.get("page_content", ""),
-                metadata=src.get("metadata", {}),
-                created_at=src.get("created_at")
-            )
-            for src in entry.get("sources", [])
-        ]
-        
+        sources = [StoredSourceModel.from_record(src) for src in entry.get("sources", [])]
         history_entries.append(
-            EntityHistoryEntry(
+            StoredEntityHistoryEntry(
                 content=entry["content"],
                 sources=sources
             )
         )
     
-    return EntityHistory(entries=history_entries)
+    return StoredEntityHistory(entries=history_entries)
+
+
+def query_entity_timeline(
+    entity_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    relationship_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: int = 50,
+    include_source_content: bool = True
+) -> TimelinePage:
+    """
+    Read one page of an entity's timeline, newest first.
+    
+    The cursor records the last entry returned, so the next page starts
+    right after it without re-reading earlier pages, and entries saved in
+    the meantime don't shift the pages. Entries outside the filters are
+    still walked past, so a page costs more when most entries don't match.
+    
+    Args:
+        entity_id: The entity identifier
+        start: Optional ISO timestamp; older entries are skipped
+        end: Optional ISO timestamp; newer entries are skipped
+        relationship_id: Only return entries recorded for this relationship
+        cursor: next_cursor from the previous page
+        page_size: Maximum number of entries on the page
+        include_source_content: Whether to decode and return source bodies;
+            if False, sources keep their metadata with empty page_content
+        
+    Returns:
+        TimelinePage with the entries and the cursor for the next page
+    """
+    before_id = _decode_cursor(cursor, entity_id) if cursor else None
+    since = timestamp_to_epoch(start) if start else None
+    until = timestamp_to_epoch(end) if end else None
+    
+    entries = []
+    has_more = False
+    for record in _store.iter_entries(entity_id, since, until, before_id):
+        if relationship_id is not None and record.get("relationship_id") != relationship_id:
+            continue
+        if len(entries) == page_size:
+            has_more = True
+            break
+        entries.append(TimelineEntry(
+            id=record["id"],
+            content=record["content"],
+            timestamp=record["timestamp"],
+            relationship_id=record.get("relationship_id"),
+            sources=[
+                SourceModel(
+                    id=src.get("id"),
+                    page_content=decompress_text(src.get("page_content")) if include_source_content else "",
+                    metadata=src.get("metadata", {}),
+                    created_at=src.get("created_at")
+                )
+                for src in record.get("sources", [])
+            ]
+        ))
+    
+    next_cursor = _encode_cursor(entity_id, entries[-1].id) if has_more else None
+    return TimelinePage(entries=entries, next_cursor=next_cursor)
+
+
+def _encode_cursor(entity_id: str, entry_id: int) -> str:
+    payload = json.dumps({"entity_id": entity_id, "before_id": entry_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def _decode_cursor(cursor: str, entity_id: str) -> int:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        before_id = int(payload["before_id"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid timeline cursor: {cursor!r}")
+    if payload.get("entity_id") != entity_id:
+        raise ValueError("Timeline cursor belongs to a different entity")
+    return before_id
 
 
 def save_entity_history_entry(
@@ -84,7 +296,8 @@ def save_entity_history_entry(
     content: str,
     sources: List[SourceModel],
     timestamp: Optional[str] = None,
-    relationship_id: Optional[str] = None
+    relationship_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None
 ) -> int:
     """
     Save a new entity history entry to the database.
@@ -95,44 +308,425 @@ def save_entity_history_entry(
         sources: List of source documents supporting this entry
         timestamp: Optional timestamp for the entry
         relationship_id: Optional relationship context
+        idempotency_key: Optional key, e.g. from make_idempotency_key; saving
+            the same key for the entity again stores nothing
         
     Returns:
-        The ID of the saved entry
+        The ID of the saved entry, or of the entry already saved with the key
     """
-    global _source_counter
-    
-    if entity_id not in _entity_histories:
-        _entity_histories[entity_id] = []
-    
-    # Convert sources to dict format for storage
-    source_dicts = []
-    for source in sources:
-        _source_counter += 1
-        source_dict = {
-            "id": _source_counter,
-            "page_content": source.page_content,
-            "metadata": source.metadata,
-            "created_at": source.created_at or datetime.now().isoformat()
-        }
-        source_dicts.append(source_dict)
-        _entity_sources[_source_counter] = source
+    entry = _build_record(content, sources, timestamp, relationship_id, idempotency_key)
+    # Only the caller that actually stored the entry invalidates and publishes it
+    entry_id, inserted = _store.insert(entity_id, entry)
+    if inserted:
+        _history_cache.invalidate(entity_id)
+        _change_feed.publish(entity_id, entry_id, entry)
     
-    entry = {
+    return entry_id
+
+
+def _build_record(
+    content: str,
+    sources: List[SourceModel],
+    timestamp: Optional[str],
+    relationship_id: Optional[str],
+    idempotency_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the record a store keeps for a new entry."""
+    record = {
         "content": content,
-        "sources": source_dicts,
+        "sources": [
+            {
+                "page_content": source.page_content,
+                "metadata": source.metadata,
+                "created_at": source.created_at or datetime.now().isoformat()
+            }
+            for source in sources
+        ],
         "timestamp": timestamp or datetime.now().isoformat(),
         "relationship_id": relationship_id
     }
+    if idempotency_key:
+        record["idempotency_key"] = idempotency_key
+    return record
+
+
+def enqueue_entity_history_entry(
+    entity_id: str,
+    content: str,
+    sources: List[SourceModel],
+    timestamp: Optional[str] = None,
+    relationship_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None
+) -> bool:
+    """
+    Queue a history entry to be written by the write-behind flusher.
+    
+    Returns as soon as the entry is journaled. Reads of the entity include it
+    right away; it gets an id, and is published to the change feed, once the
+    flusher has written it.
+    
+    Args:
+        entity_id: The entity identifier
+        content: The history entry content
+        sources: List of source documents supporting this entry
+        timestamp: Optional timestamp for the entry
+        relationship_id: Optional relationship context
+        idempotency_key: Optional key; an entry already queued or saved with
+            it for the entity is not queued again
+        
+    Returns:
+        True if the entry was queued, False if the key was already queued or saved
+        
+    Raises:
+        RuntimeError: If no write-behind queue is configured
+    """
+    queue = _write_behind
+    if queue is None:
+        raise RuntimeError("Write-behind is not configured; call configure_write_behind first")
+    record = _build_record(content, sources, timestamp, relationship_id, idempotency_key)
+    is_written = None
+    if idempotency_key:
+        def is_written() -> bool:
+            return _store.find_idempotency_key(entity_id, idempotency_key) is not None
+    if not queue.enqueue(entity_id, record, is_written):
+        return False
+    _history_cache.invalidate(entity_id)
+    return True
+
+
+def _write_queued_entries(items: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Write a batch from the write-behind queue to the store."""
+    # Entries replayed from the journal after a crash may already be stored
+    for (entity_id, record), (entry_id, inserted) in zip(items, _store.insert_many(items)):
+        if inserted:
+            _history_cache.invalidate(entity_id)
+            _change_feed.publish(entity_id, entry_id, record)
+
+
+def configure_write_behind(
+    enabled: bool = True,
+    journal_path: Optional[str] = None,
+    batch_size: int = 256,
+    flush_interval: float = 0.05,
+    fsync: bool = True
+) -> Optional[WriteBehindQueue]:
+    """
+    Start, or stop, the write-behind queue used by enqueue_entity_history_entry.
     
-    _entity_histories[entity_id].insert(0, entry)  # Add to front (most recent)
+    A running queue is drained before it is replaced. Queued entries are
+    acknowledged before they reach the store, so the queue needs a journal
+    for them to survive a crash.
     
-    return len(_entity_histories[entity_id])
+    Args:
+        enabled: Whether to run a queue at all
+        journal_path: Journal file queued entries survive a restart in;
+            required when enabled
+        batch_size: Maximum entries written to the store per batch
+        flush_interval: Seconds the flusher waits for more entries before
+            writing them, unless a full batch is queued sooner
+        fsync: Whether to fsync the journal on every enqueue; without it,
+            entries acknowledged just before a power loss can be lost
+        
+    Returns:
+        The new queue, or None if disabled
+    """
+    global _write_behind
+    if enabled and not journal_path:
+        raise ValueError("Write-behind needs a journal_path, or queued entries are lost on a crash")
+    if _write_behind is not None:
+        _write_behind.close()
+    _write_behind = (
+        WriteBehindQueue(_write_queued_entries, journal_path, batch_size, flush_interval, fsync)
+        if enabled else None
+    )
+    return _write_behind
+
+
+def flush_write_behind(timeout: Optional[float] = FLUSH_TIMEOUT_SECONDS) -> bool:
+    """
+    Wait until every queued entry has been written to the store.
+    
+    Args:
+        timeout: Seconds to wait, or None to wait until the queue drains
+        
+    Returns:
+        False if the timeout expired first while writes were succeeding
+        
+    Raises:
+        RuntimeError: If the timeout expired while writes to the store kept failing
+    """
+    queue = _write_behind
+    if queue is None or queue.flush(timeout):
+        return True
+    if queue.consecutive_errors:
+        raise RuntimeError(
+            f"Write-behind flush timed out after {queue.consecutive_errors} failed writes: {queue.last_error}"
+        ) from queue.last_exception
+    return False
+
+
+async def asave_entity_history_entry(
+    entity_id: str,
+    content: str,
+    sources: List[SourceModel],
+    timestamp: Optional[str] = None,
+    relationship_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None
+) -> int:
+    """
+    Save a history entry from a coroutine without blocking the event loop.
+    
+    The write runs in a worker thread, so waiting on a store lock held by
+    another thread or process doesn't stall the other runs on the loop.
+    """
+    return await asyncio.to_thread(
+        save_entity_history_entry, entity_id, content, sources, timestamp, relationship_id, idempotency_key
+    )
+
+
+def configure_change_feed(outbox_path: Optional[str] = None, max_buffered: int = 10_000) -> ChangeFeed:
+    """
+    Replace the change feed new entries are published to.
+    
+    Existing subscribers stay attached to the previous feed.
+    
+    Args:
+        outbox_path: Optional JSONL file shared with other processes
+        max_buffered: Events kept in memory for subscribers that fall behind
+        
+    Returns:
+        The new change feed
+    """
+    global _change_feed
+    _change_feed.close()
+    _change_feed = ChangeFeed(outbox_path, max_buffered)
+    return _change_feed
+
+
+def subscribe_changes(after: Optional[int] = None) -> AsyncIterator[ChangeEvent]:
+    """
+    Iterate over history entries as they are saved.
+    
+    Args:
+        after: Offset of the last event already handled, to resume from it;
+            defaults to entries saved from now on
+        
+    Returns:
+        Async iterator of ChangeEvent
+    """
+    return _change_feed.subscribe(after)
+
+
+def configure_store(store: HistoryStore) -> HistoryStore:
+    """
+    Replace the storage backend, returning the previous one.
+    
+    The previous store is not closed, and the history cache is cleared.
+    
+    Args:
+        store: The new storage backend
+        
+    Returns:
+        The storage backend that was in use
+    """
+    global _store
+    previous, _store = _store, store
+    _history_cache.clear()
+    return previous
+
+
+def get_store() -> HistoryStore:
+    """Return the storage backend in use."""
+    return _store
+
+
+def import_entity_history(
+    path: str,
+    format: Optional[str] = None,
+    buffer_entries: int = 100_000,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Backfill the store from a JSONL or Parquet dump of history entries.
+    
+    Args:
+        path: The dump file
+        format: "jsonl" or "parquet"; inferred from the extension if omitted
+        buffer_entries: Entries sorted in memory before spilling to disk
+        progress: Optional callback receiving running counts
+        
+    Returns:
+        Dict with the number of entries read, imported, skipped and skipped as duplicates
+    """
+    try:
+        return import_entries(iter_dump_entries(path, format), _store, buffer_entries, progress)
+    finally:
+        _history_cache.clear()
+
+
+def export_entity_history(
+    entries_path: str,
+    sources_path: Optional[str] = None,
+    entity_ids: Optional[Iterable[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Stream stored entries and sources to CSV, JSONL or Parquet files.
+    
+    Args:
+        entries_path: File for one row per entry
+        sources_path: Optional file for one row per source
+        entity_ids: Entities to export (defaults to all)
+        start: Optional ISO timestamp; older entries are skipped
+        end: Optional ISO timestamp; newer entries are skipped
+        format: "csv", "jsonl" or "parquet"; inferred from the extension if omitted
+        
+    Returns:
+        Dict with the number of entries and sources written
+    """
+    return export_histories(_store, entries_path, sources_path, entity_ids, start, end, format)
+
+
+def snapshot_database(path: str) -> Dict[str, Any]:
+    """
+    Dump the whole store to a snapshot file for a warm restart.
+    
+    Args:
+        path: Destination file
+        
+    Returns:
+        Dict with the number of entities, entries, bytes and seconds taken
+    """
+    return write_snapshot(_store, path)
+
+
+def restore_database(path: str, lazy: bool = False) -> None:
+    """
+    Replace the store's contents with a snapshot.
+    
+    Args:
+        path: Snapshot file written by snapshot_database
+        lazy: Map the file and load each entity on first access
+    """
+    read_snapshot(path, _store, lazy=lazy)
+    _history_cache.clear()
 
 
 def reset_database():
-    """Reset the in-memory database. Useful for testing."""
-    global _entity_histories, _entity_sources, _source_counter
-    _entity_histories = {}
-    _entity_sources = {}
-    _source_counter = 0
+    """Reset the database. Useful for testing."""
+    _store.clear()
+    _history_cache.clear()
+
+
+def configure_history_cache(
+    max_entries: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    enabled: Optional[bool] = None
+) -> None:
+    """
+    Configure the read-through history cache.
+    
+    Args:
+        max_entries: Maximum number of cached (entity, window, limit) histories
+        max_bytes: Approximate memory cap for cached histories
+        enabled: Whether new reads are cached
+    """
+    if max_entries is not None:
+        _history_cache.max_entries = max_entries
+    if max_bytes is not None:
+        _history_cache.max_bytes = max_bytes
+    if enabled is not None:
+        _history_cache.enabled = enabled
+        if not enabled:
+            _history_cache.clear()
+
 
+def get_history_cache_stats() -> Dict[str, Any]:
+    """Return hit rate, evictions and footprint of the history cache."""
+    return _history_cache.stats()
+
+
+def configure_retention(
+    max_age_hours: Optional[int] = None,
+    max_entries_per_entity: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> RetentionPolicy:
+    """
+    Set the retention policy enforced by enforce_retention.
+    
+    Keep max_age_hours and max_entries_per_entity at or above the
+    entity_history_last_hours and entity_history_entry_limit the graph runs
+    with, or initialize_search will see shortened histories.
+    
+    Args:
+        max_age_hours: Evict entries older than this
+        max_entries_per_entity: Keep only this many newest entries per entity
+        max_bytes: Evict the oldest entries once the store is larger than this
+        
+    Returns:
+        The new policy
+    """
+    global _retention_policy
+    _retention_policy = RetentionPolicy(
+        max_age_hours=max_age_hours,
+        max_entries_per_entity=max_entries_per_entity,
+        max_bytes=max_bytes
+    )
+    return _retention_policy
+
+
+def enforce_retention(max_entities: Optional[int] = 100, now: Optional[float] = None) -> Dict[str, int]:
+    """
+    Run one incremental eviction step of the retention policy.
+    
+    Args:
+        max_entities: Entities visited per step; later steps continue where this one stopped
+        now: Reference time in epoch seconds (defaults to now)
+        
+    Returns:
+        Number of entries evicted per entity
+    """
+    if _retention_policy.is_empty():
+        return {}
+    
+    removed = _store.apply_retention(_retention_policy, max_entities=max_entities, now=now)
+    for entity_id in removed:
+        _history_cache.invalidate(entity_id)
+    
+    return removed
+
+
+def start_retention_worker(interval_seconds: float = 60.0, max_entities: Optional[int] = 100) -> None:
+    """
+    Enforce the retention policy in a background thread.
+    
+    Args:
+        interval_seconds: Time between eviction steps
+        max_entities: Entities visited per step
+    """
+    global _retention_worker
+    if _retention_worker is not None:
+        return
+    _retention_worker = RetentionWorker(lambda: enforce_retention(max_entities), interval_seconds)
+    _retention_worker.start()
+
+
+def stop_retention_worker() -> None:
+    """Stop the background retention thread."""
+    global _retention_worker
+    if _retention_worker is not None:
+        _retention_worker.stop()
+        _retention_worker = None
+
+
+def get_store_metrics() -> Dict[str, Any]:
+    """Return entry counts and resident bytes of the store, cache and codec."""
+    return {
+        "store": _store.stats(),
+        "history_cache": _history_cache.stats(),
+        "compression": get_compression_stats(),
+        "change_feed": _change_feed.stats(),
+        "write_behind": _write_behind.stats() if _write_behind is not None else None,
+    }
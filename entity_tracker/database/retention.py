@@ -0,0 +1,73 @@
+"""
+Retention for the history store.
+
+initialize_search only reads the last entity_history_last_hours hours and at
+most entity_history_entry_limit entries, so anything older or beyond that can
+be evicted from a long-lived worker. Eviction runs in small steps, either
+called directly or from a background thread.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits applied to the history store; None disables a limit."""
+
+    # Entries older than this are evicted
+    max_age_hours: Optional[int] = None
+    # Only the newest entries of each entity are kept
+    max_entries_per_entity: Optional[int] = None
+    # Oldest entries across all entities are evicted above this footprint
+    max_bytes: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        """Whether the policy sets no limits at all."""
+        return self.max_age_hours is None and self.max_entries_per_entity is None and self.max_bytes is None
+
+
+class RetentionWorker:
+    """
+    Calls an eviction step on a fixed interval in a daemon thread.
+
+    A step that raises is logged and counted, and the next step runs on
+    schedule.
+    """
+
+    def __init__(self, step: Callable[[], object], interval_seconds: float = 60.0):
+        self.step = step
+        self.interval_seconds = interval_seconds
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the worker thread and wait for it to exit."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.step()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = repr(e)
+                logger.exception("Retention step failed")
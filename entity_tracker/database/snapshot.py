@@ -0,0 +1,156 @@
+"""
+Snapshot and restore of the history store for warm restarts.
+
+A snapshot is one binary file: a magic header, one pickled block per entity
+holding its stored records as-is (source content stays compressed), then a
+trailing index with each block's offset, the codec dictionaries and the id
+counters. Restoring unpickles the blocks straight into the store without
+re-validating anything, or, with lazy=True, maps the file and only unpickles
+an entity's block the first time it is read.
+
+Snapshots are pickle files: only restore snapshots you wrote yourself.
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import time
+from typing import Any, Dict, Optional
+
+from entity_tracker.database.compression import CompressedText, get_codec
+from entity_tracker.database.store import HistoryStore, InMemoryHistoryStore, estimate_record_size
+
+MAGIC = b"ETSNAP01"
+FOOTER = struct.Struct("<Q8s")
+
+
+def write_snapshot(store: HistoryStore, path: str) -> Dict[str, Any]:
+    """
+    Write every entity of a store to a snapshot file.
+
+    The file is written next to path and renamed into place, so a crash never
+    leaves a partial snapshot behind.
+
+    Args:
+        store: The store to snapshot
+        path: Destination file
+
+    Returns:
+        Dict with the number of entities, entries, bytes and seconds taken
+    """
+    start = time.perf_counter()
+    tmp_path = f"{path}.tmp"
+    entities: Dict[str, tuple] = {}
+    entry_count = 0
+    max_entry_id = max_source_id = 0
+
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        for entity_id, records, size in store.dump_entities():
+            block = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+            if size is None:
+                size = sum(estimate_record_size(record) for record in records)
+            entities[entity_id] = (f.tell(), len(block), size)
+            f.write(block)
+            entry_count += len(records)
+            for record in records:
+                max_entry_id = max(max_entry_id, record["id"])
+                for source in record.get("sources", []):
+                    max_source_id = max(max_source_id, source["id"])
+
+        counters = store.counters() if isinstance(store, InMemoryHistoryStore) else (max_entry_id, max_source_id)
+        index = pickle.dumps({
+            "entities": entities,
+            "dictionaries": dict(get_codec().dictionaries),
+            "entry_counter": counters[0],
+            "source_counter": counters[1],
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        index_offset = f.tell()
+        f.write(index)
+        f.write(FOOTER.pack(index_offset, MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return {
+        "entities": len(entities),
+        "entries": entry_count,
+        "bytes": os.path.getsize(path),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def read_snapshot(
+    path: str,
+    store: Optional[HistoryStore] = None,
+    lazy: bool = False
+) -> HistoryStore:
+    """
+    Load a snapshot file into a store, replacing its contents.
+
+    Args:
+        path: Snapshot file written by write_snapshot
+        store: Store to load into (defaults to a new InMemoryHistoryStore)
+        lazy: Keep the file mapped and load each entity on first access;
+            only supported by InMemoryHistoryStore, which unmaps the file
+            once every entity has loaded or when it is cleared or closed
+
+    Returns:
+        The loaded store
+    """
+    store = store if store is not None else InMemoryHistoryStore()
+
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    index_offset, magic = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+    if data[:len(MAGIC)] != MAGIC or magic != MAGIC:
+        data.close()
+        raise ValueError(f"{path} is not an entity history snapshot")
+    index = pickle.loads(data[index_offset:len(data) - FOOTER.size])
+
+    # Dictionary ids in this process may differ from the ones in the snapshot
+    codec = get_codec()
+    dictionary_ids = {
+        snapshot_id: codec.register_dictionary(dictionary)
+        for snapshot_id, dictionary in index["dictionaries"].items()
+    }
+    remap = {old: new for old, new in dictionary_ids.items() if old != new}
+
+    def load_block(offset: int, length: int) -> list:
+        records = pickle.loads(data[offset:offset + length])
+        if remap:
+            for record in records:
+                for source in record.get("sources", []):
+                    content = source.get("page_content")
+                    if isinstance(content, CompressedText):
+                        content.dictionary_id = remap.get(content.dictionary_id, content.dictionary_id)
+        return records
+
+    store.clear()
+    entities = index["entities"].items()
+    if lazy:
+        if not isinstance(store, InMemoryHistoryStore):
+            raise ValueError("Lazy restore is only supported by InMemoryHistoryStore")
+        # The store closes the mapping once every entity has loaded, or when it is cleared
+        store.load_entities(
+            ((entity_id, _block_loader(load_block, offset, length), size)
+             for entity_id, (offset, length, size) in entities),
+            lazy=True,
+            release=data.close,
+        )
+    else:
+        store.load_entities(
+            (entity_id, load_block(offset, length), size)
+            for entity_id, (offset, length, size) in entities
+        )
+        data.close()
+
+    if isinstance(store, InMemoryHistoryStore):
+        store.set_counters(index["entry_counter"], index["source_counter"])
+    return store
+
+
+def _block_loader(load_block, offset: int, length: int):
+    return lambda: load_block(offset, length)
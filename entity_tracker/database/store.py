@@ -0,0 +1,524 @@
+"""
+Storage backends for entity history.
+
+The operations module talks to a HistoryStore, so the in-memory store used by
+default can be swapped for a persistent one with configure_store.
+
+Records passed to and returned by a store are plain dicts:
+
+    {
+        "id": int,                  # assigned by the store
+        "content": str,
+        "sources": [{"id", "page_content", "metadata", "created_at"}, ...],
+        "timestamp": str,           # ISO format
+        "relationship_id": Optional[str],
+        "idempotency_key": Optional[str],
+    }
+
+A record with an idempotency_key is stored at most once per entity: appending
+it again returns the id of the entry already stored.
+
+A source's page_content may come back as CompressedText; callers decode it
+with decompress_text.
+"""
+
+import bisect
+import hashlib
+import heapq
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from entity_tracker.database.compression import compress_text, decompress_text
+from entity_tracker.database.retention import RetentionPolicy
+
+# Rough per-entry and per-source overhead of the stored dicts
+RECORD_OVERHEAD_BYTES = 200
+
+
+def estimate_record_size(record: Dict[str, Any]) -> int:
+    """Estimate the memory held by a stored record in bytes."""
+    size = RECORD_OVERHEAD_BYTES + len(record.get("content", ""))
+    for source in record.get("sources", []):
+        size += RECORD_OVERHEAD_BYTES + len(source.get("page_content") or "") + len(str(source.get("metadata", "")))
+    return size
+
+
+def make_idempotency_key(entity_id: str, run_id: str, content: str) -> str:
+    """Derive the idempotency key of an entry from its entity, run and content."""
+    return hashlib.sha256("\0".join((entity_id, run_id, content)).encode("utf-8")).hexdigest()[:32]
+
+
+def timestamp_to_epoch(timestamp: Optional[str]) -> float:
+    """
+    Convert an ISO timestamp to seconds since the epoch.
+
+    Unparseable timestamps map to +inf, so time-window filters keep them.
+    """
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+def _record_id(record: Dict[str, Any]) -> int:
+    return record["id"]
+
+
+class HistoryStore:
+    """Interface implemented by every history storage backend."""
+
+    def append(self, entity_id: str, record: Dict[str, Any]) -> int:
+        """
+        Store a new entry for an entity and return its id.
+
+        If the entity already has an entry with the record's idempotency_key,
+        nothing is stored and that entry's id is returned.
+        """
+        return self.insert(entity_id, record)[0]
+
+    def append_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """Store many new entries, in order, and return their ids."""
+        return [entry_id for entry_id, _ in self.insert_many(items)]
+
+    def insert(self, entity_id: str, record: Dict[str, Any]) -> Tuple[int, bool]:
+        """
+        Like append, but return (entry id, whether the entry was stored).
+
+        The idempotency check and the write happen under the same lock, so of
+        several callers racing with one key exactly one sees True.
+        """
+        raise NotImplementedError
+
+    def insert_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Tuple[int, bool]]:
+        """
+        Like append_many, but return (entry id, whether it was stored) per entry.
+
+        Backends override this when they can amortize locking or flushing
+        across a batch.
+        """
+        return [self.insert(entity_id, record) for entity_id, record in items]
+
+    def iter_entries(
+        self,
+        entity_id: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_id: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield an entity's entries newest first.
+
+        Entry ids increase along every entity's history, so before_id resumes
+        a previous walk right after the last entry it returned.
+
+        Args:
+            entity_id: The entity identifier
+            since: Optional epoch seconds; older entries are skipped
+            until: Optional epoch seconds; newer entries are skipped
+            before_id: Optional entry id; only entries with smaller ids are yielded
+        """
+        raise NotImplementedError
+
+    def read_many(
+        self,
+        entity_ids: Iterable[str],
+        since: Optional[float] = None,
+        limit: int = 100
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Return up to limit newest entries for each entity."""
+        results = {}
+        for entity_id in entity_ids:
+            entries = []
+            for record in self.iter_entries(entity_id, since):
+                if len(entries) >= limit:
+                    break
+                entries.append(record)
+            results[entity_id] = entries
+        return results
+
+    def find_idempotency_key(self, entity_id: str, key: str) -> Optional[int]:
+        """Return the id of the entity's entry stored with this idempotency key, if any."""
+        for record in self.iter_entries(entity_id):
+            if record.get("idempotency_key") == key:
+                return record["id"]
+        return None
+
+    def entity_ids(self) -> List[str]:
+        """Return the ids of all entities with stored entries."""
+        raise NotImplementedError
+
+    def apply_retention(
+        self,
+        policy: RetentionPolicy,
+        max_entities: Optional[int] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, int]:
+        """
+        Evict entries outside the retention policy, a few entities at a time.
+
+        Args:
+            policy: The limits to enforce
+            max_entities: Entities to visit in this step (None visits all)
+            now: Reference time in epoch seconds (defaults to now)
+
+        Returns:
+            Number of entries removed per entity
+        """
+        return {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry counts and footprint of the store."""
+        return {}
+
+    def dump_entities(self) -> Iterator[Tuple[str, List[Dict[str, Any]], Optional[int]]]:
+        """Yield (entity_id, records oldest first, estimated size or None) per entity."""
+        for entity_id in self.entity_ids():
+            yield entity_id, list(reversed(list(self.iter_entries(entity_id)))), None
+
+    def load_entities(self, items: Iterable[Tuple[str, List[Dict[str, Any]], Optional[int]]]) -> None:
+        """
+        Bulk-load records produced by dump_entities.
+
+        The default appends records one by one, so ids are reassigned.
+        """
+        for entity_id, records, _ in items:
+            for record in records:
+                sources = [
+                    {**source, "page_content": decompress_text(source.get("page_content"))}
+                    for source in record.get("sources", [])
+                ]
+                self.append(entity_id, {**record, "sources": sources})
+
+    def clear(self) -> None:
+        """Delete every stored entry."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any files or threads held by the store."""
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """
+    Keeps histories in process memory, with source content compressed.
+
+    Entries are appended oldest first and read back in reverse, so saving an
+    entry doesn't shift the entity's existing entries. Each entity has its own
+    lock, so concurrent runs for different entities never wait on each other;
+    ids are taken while holding the entity lock, so they increase along every
+    entity's history. Eviction replaces an entity's list rather than editing
+    it, so readers already walking the old list are unaffected.
+
+    Restored entities can be loaded lazily: they stay in the snapshot until
+    first read or written. Retention skips them until then, and applies the
+    latest age and count limits to them as they load.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.clear()
+
+    def _entity_lock(self, entity_id: str) -> threading.Lock:
+        lock = self._locks.get(entity_id)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(entity_id, threading.Lock())
+        return lock
+
+    def _loaded(self, entity_id: str) -> List[Dict[str, Any]]:
+        """Return an entity's entries, loading them first if they are still pending."""
+        entries = self._entries.get(entity_id)
+        if entries is None and entity_id in self._pending:
+            with self._entity_lock(entity_id):
+                # Taken under the guard, so a clear can't release the loader's file mid-load
+                with self._guard:
+                    loader = self._pending.pop(entity_id, None)
+                    if loader is not None:
+                        self._entries[entity_id] = loader()
+                        self._release_if_loaded_locked()
+                if loader is not None and self._deferred_retention is not None:
+                    self._trim_locked(entity_id, *self._deferred_retention)
+                entries = self._entries.get(entity_id)
+        return entries or []
+
+    def _release_if_loaded_locked(self) -> None:
+        """Run the lazy-load release callbacks once nothing is pending; the caller holds the guard."""
+        if self._pending:
+            return
+        releases, self._lazy_releases = self._lazy_releases, []
+        for release in releases:
+            release()
+
+    def insert(self, entity_id: str, record: Dict[str, Any]) -> Tuple[int, bool]:
+        sources = [
+            {**source, "page_content": compress_text(source.get("page_content", ""))}
+            for source in record.get("sources", [])
+        ]
+        self._loaded(entity_id)
+        key = record.get("idempotency_key")
+
+        with self._entity_lock(entity_id):
+            if key:
+                existing = self._key_index(entity_id).get(key)
+                if existing is not None:
+                    return existing, False
+
+            with self._counter_lock:
+                self._entry_counter += 1
+                entry_id = self._entry_counter
+                first_source_id = self._source_counter + 1
+                self._source_counter += len(sources)
+
+            for i, source in enumerate(sources):
+                source["id"] = first_source_id + i
+
+            stored = {**record, "id": entry_id, "sources": sources}
+            entries = self._entries.get(entity_id)
+            if entries is None:
+                with self._guard:
+                    entries = self._entries.setdefault(entity_id, [])
+            entries.append(stored)
+            self._add_bytes(entity_id, estimate_record_size(stored))
+            if key:
+                self._key_index(entity_id)[key] = entry_id
+
+        return entry_id, True
+
+    def find_idempotency_key(self, entity_id: str, key: str) -> Optional[int]:
+        self._loaded(entity_id)
+        with self._entity_lock(entity_id):
+            return self._key_index(entity_id).get(key)
+
+    def _key_index(self, entity_id: str) -> Dict[str, int]:
+        """Return the entity's idempotency keys, built on first use; the entity lock must be held."""
+        keys = self._keys.get(entity_id)
+        if keys is None:
+            keys = self._keys[entity_id] = {
+                record["idempotency_key"]: record["id"]
+                for record in self._entries.get(entity_id, [])
+                if record.get("idempotency_key")
+            }
+        return keys
+
+    def iter_entries(
+        self,
+        entity_id: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_id: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        # Appends only ever extend the list, so walking back from the current
+        # length sees a consistent history without holding the lock
+        entries = self._loaded(entity_id)
+        end = len(entries)
+        if before_id is not None:
+            end = bisect.bisect_left(entries, before_id, hi=end, key=_record_id)
+        for i in range(end - 1, -1, -1):
+            record = entries[i]
+            if since is None and until is None:
+                yield record
+                continue
+            epoch = timestamp_to_epoch(record["timestamp"])
+            if (since is None or epoch >= since) and (until is None or epoch <= until):
+                yield record
+
+    def entity_ids(self) -> List[str]:
+        with self._guard:
+            return list(self._entries) + list(self._pending)
+
+    def apply_retention(
+        self,
+        policy: RetentionPolicy,
+        max_entities: Optional[int] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, int]:
+        removed: Dict[str, int] = {}
+        now = now if now is not None else time.time()
+
+        if policy.max_age_hours is not None or policy.max_entries_per_entity is not None:
+            cutoff = (now - policy.max_age_hours * 3600) if policy.max_age_hours is not None else None
+            # Lazily restored entities are skipped and trimmed to these limits once they load
+            self._deferred_retention = (cutoff, policy.max_entries_per_entity)
+            for entity_id in self._next_entities(max_entities):
+                count = self._trim(entity_id, cutoff, policy.max_entries_per_entity)
+                if count:
+                    removed[entity_id] = count
+        else:
+            self._deferred_retention = None
+
+        if policy.max_bytes is not None:
+            for entity_id, count in self._evict_oldest(policy.max_bytes, max_entities).items():
+                removed[entity_id] = removed.get(entity_id, 0) + count
+
+        return removed
+
+    def _next_entities(self, max_entities: Optional[int]) -> List[str]:
+        """Return the next entities to visit, continuing round-robin from the last step."""
+        entity_ids = self.entity_ids()
+        if max_entities is None or max_entities >= len(entity_ids):
+            return entity_ids
+        start = self._retention_cursor % len(entity_ids)
+        self._retention_cursor = start + max_entities
+        return (entity_ids[start:] + entity_ids[:start])[:max_entities]
+
+    def _trim(self, entity_id: str, cutoff: Optional[float], max_entries: Optional[int]) -> int:
+        """Drop an entity's entries older than cutoff or beyond max_entries; pending entities are left to load."""
+        with self._entity_lock(entity_id):
+            if entity_id in self._pending:
+                return 0
+            return self._trim_locked(entity_id, cutoff, max_entries)
+
+    def _trim_locked(self, entity_id: str, cutoff: Optional[float], max_entries: Optional[int]) -> int:
+        """Trim a loaded entity; the entity lock must be held."""
+        entries = self._entries.get(entity_id, [])
+        kept = entries
+        if cutoff is not None:
+            kept = [record for record in kept if timestamp_to_epoch(record["timestamp"]) >= cutoff]
+        if max_entries is not None and len(kept) > max_entries:
+            kept = kept[len(kept) - max_entries:]
+        if len(kept) == len(entries):
+            return 0
+        kept_ids = {record["id"] for record in kept}
+        self._replace(entity_id, kept, [record for record in entries if record["id"] not in kept_ids])
+        return len(entries) - len(kept)
+
+    def _evict_oldest(self, max_bytes: int, max_entries: Optional[int]) -> Dict[str, int]:
+        """Evict the oldest entries across all entities until under max_bytes."""
+        removed: Dict[str, int] = {}
+        if self._resident_bytes <= max_bytes:
+            return removed
+
+        heap = [
+            (timestamp_to_epoch(entries[0]["timestamp"]), entity_id)
+            for entity_id, entries in list(self._entries.items()) if entries
+        ]
+        heapq.heapify(heap)
+        evicted = 0
+        while heap and self._resident_bytes > max_bytes and (max_entries is None or evicted < max_entries):
+            _, entity_id = heapq.heappop(heap)
+            with self._entity_lock(entity_id):
+                entries = self._entries.get(entity_id, [])
+                if not entries:
+                    continue
+                self._replace(entity_id, entries[1:], entries[:1])
+                if len(entries) > 1:
+                    heapq.heappush(heap, (timestamp_to_epoch(entries[1]["timestamp"]), entity_id))
+            removed[entity_id] = removed.get(entity_id, 0) + 1
+            evicted += 1
+
+        return removed
+
+    def _replace(self, entity_id: str, kept: List[Dict[str, Any]], dropped: List[Dict[str, Any]]) -> None:
+        """Swap in an entity's remaining entries; the entity lock must be held."""
+        if kept:
+            self._entries[entity_id] = kept
+        else:
+            with self._guard:
+                self._entries.pop(entity_id, None)
+        keys = self._keys.get(entity_id)
+        for record in dropped:
+            self._add_bytes(entity_id, -estimate_record_size(record))
+            if keys is not None:
+                keys.pop(record.get("idempotency_key"), None)
+
+    def _add_bytes(self, entity_id: str, size: int) -> None:
+        with self._counter_lock:
+            self._resident_bytes += size
+            remaining = self._entity_bytes.get(entity_id, 0) + size
+            if remaining > 0:
+                self._entity_bytes[entity_id] = remaining
+            else:
+                self._entity_bytes.pop(entity_id, None)
+
+    def dump_entities(self) -> Iterator[Tuple[str, List[Dict[str, Any]], Optional[int]]]:
+        for entity_id in self.entity_ids():
+            entries = self._loaded(entity_id)
+            if entries:
+                yield entity_id, list(entries), self._entity_bytes.get(entity_id)
+
+    def load_entities(
+        self,
+        items: Iterable[Tuple[str, List[Dict[str, Any]], Optional[int]]],
+        lazy: bool = False,
+        release: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Bulk-load records produced by dump_entities, keeping their ids.
+
+        Args:
+            items: (entity_id, records oldest first, estimated size) tuples;
+                with lazy=True the records item is a callable returning the records
+            lazy: Defer loading each entity until it is first accessed
+            release: Called once no entity is pending any more, or when the
+                store is cleared or closed first, e.g. to close the file the
+                loaders read from
+        """
+        if release is not None:
+            with self._guard:
+                self._lazy_releases.append(release)
+        for entity_id, records, size in items:
+            with self._entity_lock(entity_id):
+                if lazy:
+                    with self._guard:
+                        self._entries.pop(entity_id, None)
+                        self._keys.pop(entity_id, None)
+                        self._pending[entity_id] = records
+                    entity_records = None
+                else:
+                    with self._guard:
+                        self._pending.pop(entity_id, None)
+                        self._keys.pop(entity_id, None)
+                        self._entries[entity_id] = records
+                    entity_records = records
+                if size is None:
+                    size = sum(estimate_record_size(record) for record in (entity_records or records()))
+                self._add_bytes(entity_id, size - self._entity_bytes.get(entity_id, 0))
+        with self._guard:
+            self._release_if_loaded_locked()
+
+    def set_counters(self, entry_counter: int, source_counter: int) -> None:
+        """Make sure new ids continue after restored ones."""
+        with self._counter_lock:
+            self._entry_counter = max(self._entry_counter, entry_counter)
+            self._source_counter = max(self._source_counter, source_counter)
+
+    def counters(self) -> Tuple[int, int]:
+        """Return the last assigned entry and source ids."""
+        with self._counter_lock:
+            return self._entry_counter, self._source_counter
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            return {
+                "backend": "memory",
+                "entities": len(self._entries),
+                "entries": sum(len(entries) for entries in list(self._entries.values())),
+                "lazy_entities": len(self._pending),
+                "resident_bytes": self._resident_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._guard, self._counter_lock:
+            for release in getattr(self, "_lazy_releases", []):
+                release()
+            self._lazy_releases: List[Callable[[], None]] = []
+            self._entries: Dict[str, List[Dict[str, Any]]] = {}
+            self._pending: Dict[str, Callable[[], List[Dict[str, Any]]]] = {}
+            self._locks: Dict[str, threading.Lock] = {}
+            self._keys: Dict[str, Dict[str, int]] = {}
+            self._entity_bytes: Dict[str, int] = {}
+            self._entry_counter = 0
+            self._source_counter = 0
+            self._resident_bytes = 0
+            self._retention_cursor = 0
+            # (cutoff, max_entries) of the last retention step, for entities that load later
+            self._deferred_retention: Optional[Tuple[Optional[float], Optional[int]]] = None
+
+    def close(self) -> None:
+        """Release the files still held for lazily restored entities; they can't be loaded after this."""
+        with self._guard:
+            releases, self._lazy_releases = self._lazy_releases, []
+            for release in releases:
+                release()
@@ -0,0 +1,263 @@
+"""
+Write-behind queue for history entries.
+
+With write-behind on, saving an entry only appends it to a local journal and
+an in-memory queue; a background thread writes queued entries to the store
+in batches. Entries still in the queue are merged into reads of their entity,
+so a run always sees its own writes.
+
+The journal makes the queue durable: entries not yet written when the process
+stops are written by the next queue opened on the same journal. A checkpoint
+file records the last written entry, and the journal is truncated whenever
+the queue drains. Delivery is at-least-once: a crash between a batch write
+and its checkpoint replays that batch.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+# (sequence number, entity id, record, enqueue time)
+QueuedEntry = Tuple[int, str, Dict[str, Any], float]
+
+
+class WriteBehindQueue:
+    """
+    Queues entries and writes them to a store from a background thread.
+
+    Args:
+        write: Called with a batch of (entity_id, record) pairs to persist
+        journal_path: Optional file the queue is journaled to
+        batch_size: Maximum entries written per batch
+        flush_interval: Seconds the flusher waits for more entries before
+            writing them, unless a full batch is queued sooner
+        fsync: Whether to fsync the journal on every enqueue; without it,
+            entries acknowledged shortly before a power loss or OS crash can
+            be lost (a process crash loses nothing)
+        start: Whether to start the flusher thread right away
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[Tuple[str, Dict[str, Any]]]], Any],
+        journal_path: Optional[str] = None,
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        fsync: bool = True,
+        start: bool = True
+    ):
+        self.write = write
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        # Held while a batch moves from the queue to the store, so readers
+        # never see an entry in both or in neither
+        self.commit_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._drain_on_stop = True
+        self._thread: Optional[threading.Thread] = None
+        self._queue: Deque[QueuedEntry] = deque()
+        self._by_entity: Dict[str, List[QueuedEntry]] = {}
+        self._sequence = 0
+        self._journal = None
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        # Failed batch writes since the last successful one
+        self.consecutive_errors = 0
+        self.last_error: Optional[str] = None
+        self.last_exception: Optional[BaseException] = None
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+
+        if journal_path:
+            self._recover()
+            self._journal = open(journal_path, "ab")
+        if start:
+            self.start()
+
+    def _recover(self) -> None:
+        """Queue the journaled entries that were never written."""
+        checkpoint = self._read_checkpoint()
+        self._sequence = checkpoint
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write
+                item = json.loads(line)
+                self._sequence = max(self._sequence, item["seq"])
+                if item["seq"] > checkpoint:
+                    self._push((item["seq"], item["entity_id"], item["record"], time.time()))
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(f"{self.journal_path}.checkpoint") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, sequence: int) -> None:
+        tmp_path = f"{self.journal_path}.checkpoint.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(sequence))
+        os.replace(tmp_path, f"{self.journal_path}.checkpoint")
+
+    def _push(self, item: QueuedEntry) -> None:
+        self._queue.append(item)
+        self._by_entity.setdefault(item[1], []).append(item)
+
+    def enqueue(
+        self,
+        entity_id: str,
+        record: Dict[str, Any],
+        is_written: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """
+        Queue an entry for writing.
+
+        Args:
+            entity_id: The entity identifier
+            record: The entry to write
+            is_written: Optional check whether the entry is already in the
+                store; called under the queue lock, where an entry being
+                flushed is still queued, so a racing flush can't slip between
+
+        Returns:
+            False if the entry's idempotency key is already queued or
+            is_written returned True, otherwise True
+        """
+        with self._lock:
+            key = record.get("idempotency_key")
+            if key and any(item[2].get("idempotency_key") == key for item in self._by_entity.get(entity_id, [])):
+                return False
+            if is_written is not None and is_written():
+                return False
+            self._sequence += 1
+            item = (self._sequence, entity_id, record, time.time())
+            if self._journal is not None:
+                line = json.dumps({"seq": item[0], "entity_id": entity_id, "record": record})
+                self._journal.write(line.encode("utf-8") + b"\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            self._push(item)
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def has_pending(self, entity_ids: Iterable[str]) -> bool:
+        """Whether any of the entities has queued entries."""
+        return any(entity_id in self._by_entity for entity_id in entity_ids)
+
+    def pending_records(self, entity_id: str) -> List[Dict[str, Any]]:
+        """Return an entity's queued records, newest first."""
+        with self._lock:
+            return [item[2] for item in reversed(self._by_entity.get(entity_id, []))]
+
+    def start(self) -> None:
+        """Start the flusher thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while not self._stop.is_set() and self._flush_batch():
+                pass
+        while self._drain_on_stop and self._flush_batch():
+            pass
+
+    def _flush_batch(self) -> bool:
+        """Write the oldest queued entries; return whether there may be more."""
+        with self._lock:
+            batch = [self._queue[i] for i in range(min(self.batch_size, len(self._queue)))]
+        if not batch:
+            return False
+
+        with self.commit_lock:
+            try:
+                self.write([(entity_id, record) for _, entity_id, record, _ in batch])
+            except Exception as e:
+                self.errors += 1
+                self.consecutive_errors += 1
+                self.last_error = repr(e)
+                self.last_exception = e
+                return False
+
+            with self._lock:
+                for item in batch:
+                    self._queue.popleft()
+                    entity_items = self._by_entity[item[1]]
+                    entity_items.pop(0)
+                    if not entity_items:
+                        del self._by_entity[item[1]]
+                if self._journal is not None:
+                    self._write_checkpoint(batch[-1][0])
+                    if not self._queue:
+                        self._journal.truncate(0)
+
+                self.flushed += len(batch)
+                self.batches += 1
+                self.consecutive_errors = 0
+                self.last_flush_lag = time.time() - batch[0][3]
+                self.max_flush_lag = max(self.max_flush_lag, self.last_flush_lag)
+                if not self._queue:
+                    self._drained.notify_all()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued entry is written; return False on timeout."""
+        self._wake.set()
+        with self._lock:
+            return self._drained.wait_for(lambda: not self._queue, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and flush lag."""
+        with self._lock:
+            return {
+                "queue_depth": len(self._queue),
+                "oldest_age_seconds": (time.time() - self._queue[0][3]) if self._queue else 0.0,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "last_flush_lag_seconds": self.last_flush_lag,
+                "max_flush_lag_seconds": self.max_flush_lag,
+                "errors": self.errors,
+                "consecutive_errors": self.consecutive_errors,
+                "last_error": self.last_error,
+            }
+
+    def close(self, drain: bool = True) -> None:
+        """
+        Stop the flusher thread.
+
+        Args:
+            drain: Write every queued entry first; otherwise they stay in the
+                journal for the next queue
+        """
+        self._drain_on_stop = drain
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        elif drain:
+            while self._flush_batch():
+                pass
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
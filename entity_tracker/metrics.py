@@ -0,0 +1,72 @@
+"""
+Outcome counters of the graph's local filtering stages.
+
+Stages that decide locally or with a cheaper model what reaches the
+expensive LLM calls record how often each outcome happens, so their
+thresholds can be tuned from real traffic. Counters are per process.
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class StageMetrics:
+    """
+    Thread-safe outcome counters of one stage.
+
+    Args:
+        name: Stage name, as reported by get_pipeline_metrics
+        rates: Rate name -> (count, total count) reported as count / total
+    """
+
+    def __init__(self, name: str, rates: Optional[Dict[str, Tuple[str, str]]] = None):
+        self.name = name
+        self.rates = rates or {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def record(self, **counts: int) -> None:
+        """Add to the named counters."""
+        with self._lock:
+            for key, count in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + count
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters and rates."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counts)
+        for rate, (count, total) in self.rates.items():
+            stats[rate] = stats.get(count, 0) / stats[total] if stats.get(total) else 0.0
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+_stages: Dict[str, StageMetrics] = {}
+_stages_lock = threading.Lock()
+
+
+def stage_metrics(name: str, rates: Optional[Dict[str, Tuple[str, str]]] = None) -> StageMetrics:
+    """Return the counters of a stage, creating them on first use."""
+    with _stages_lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = StageMetrics(name, rates)
+        return stage
+
+
+def get_pipeline_metrics() -> Dict[str, Dict[str, Any]]:
+    """Return the counters and rates of every stage."""
+    with _stages_lock:
+        stages = list(_stages.values())
+    return {stage.name: stage.stats() for stage in stages}
+
+
+def reset_pipeline_metrics() -> None:
+    """Zero the counters of every stage."""
+    with _stages_lock:
+        stages = list(_stages.values())
+    for stage in stages:
+        stage.reset()
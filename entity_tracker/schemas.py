@@ -5,7 +5,7 @@ These schemas define the structured data models used throughout the entity track
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 
 
 class Queries(BaseModel):
@@ -22,6 +22,28 @@ class SourcesReview(BaseModel):
     )
 
 
+class SourceTriage(BaseModel):
+    """A first-pass decision on one source."""
+    source_number: int = Field(
+        description="The source number.",
+    )
+    decision: Literal["keep", "drop", "unsure"] = Field(
+        description="Whether to keep or drop the source, or unsure if it needs a closer review.",
+    )
+    confidence: float = Field(
+        description="Confidence in the decision, from 0 to 1.",
+        default=0.0
+    )
+
+
+class SourcesTriage(BaseModel):
+    """First-pass review results sorting sources into keep, drop and unsure."""
+    sources: List[SourceTriage] = Field(
+        description="A decision for each source.",
+        default_factory=list
+    )
+
+
 class SourceModel(BaseModel):
     """A source document with metadata."""
     id: Optional[int] = None
@@ -49,6 +71,39 @@ class EntityHistory(BaseModel):
     )
 
 
+class TimelineEntry(BaseModel):
+    """An entry returned by a timeline query."""
+    id: int = Field(
+        description="The id of the entry.",
+    )
+    content: str = Field(
+        description="The content of the entry.",
+    )
+    timestamp: str = Field(
+        description="When the entry was recorded, in ISO format.",
+    )
+    relationship_id: Optional[str] = Field(
+        description="The relationship the entry was recorded for.",
+        default=None
+    )
+    sources: List[SourceModel] = Field(
+        description="The sources of the entry.",
+        default_factory=list
+    )
+
+
+class TimelinePage(BaseModel):
+    """One page of an entity's timeline, newest first."""
+    entries: List[TimelineEntry] = Field(
+        description="Entries on this page.",
+        default_factory=list
+    )
+    next_cursor: Optional[str] = Field(
+        description="Cursor for the next page, or None on the last page.",
+        default=None
+    )
+
+
 class EntityHistoryPlan(BaseModel):
     """A plan for creating a history entry."""
     event: str = Field(
@@ -0,0 +1,250 @@
+"""
+Source adapters for the Entity Tracker graph.
+
+Each searchable source type is described by a SourceAdapter: the callable
+that runs one search query, how many queries may run against it at once,
+and how long it usually takes. The graph gets a search and a review node
+for every registered adapter, so adding a source is a register_source_adapter
+call rather than a new pair of nodes.
+
+Adapters read their settings from the `search_<name>_*` configuration fields
+when they exist (enabled, timeout, last_hours); adapters without such fields
+are enabled and use the adapter's own timeouts. A source's timeout bounds its
+whole branch, search and review; each search call is bounded separately by
+search_query_timeout or the adapter's timeout_seconds.
+
+Searches run in a thread pool of the adapter's own, sized to its
+max_concurrency, so searches that hang past their timeout neither starve
+other sources nor the default executor the database writes use, and never
+put more than max_concurrency calls on the backend.
+"""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from entity_tracker.configuration import Configuration
+from entity_tracker.tools import (
+    search_web_tool,
+    mock_email_search,
+    mock_youtube_search,
+    mock_speeches_search,
+    mock_scraper_search,
+)
+
+# Runs one query: (query, configuration, current date) -> documents
+SearchFunction = Callable[[str, Configuration, Optional[str]], List[Document]]
+
+
+@dataclass
+class SourceAdapter:
+    """
+    A source type the graph can search.
+
+    Args:
+        name: Source type, used in node names, state keys and configuration fields
+        search: Runs one query against the source; called in a worker thread
+        max_concurrency: Queries run against the source at once, across all runs
+            in the process
+        expected_latency_seconds: Typical duration of one search call; slower
+            sources are scheduled first
+        timeout_seconds: Timeout of one search call; defaults to the
+            search_query_timeout setting
+        branch_timeout_seconds: Timeout of the source's search and review when
+            the configuration sets no search_<name>_timeout; None for no timeout
+        review_enabled: Decides whether the source's results go through LLM
+            review; defaults to always
+        accepts_timeout: search takes a `timeout` keyword, the seconds left
+            for the call, and passes it on to its client
+    """
+
+    name: str
+    search: SearchFunction
+    max_concurrency: int = 4
+    expected_latency_seconds: float = 1.0
+    timeout_seconds: Optional[float] = None
+    branch_timeout_seconds: Optional[float] = None
+    review_enabled: Optional[Callable[[Configuration], bool]] = None
+    accepts_timeout: bool = False
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False, repr=False, compare=False)
+    _executor_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+    _limiters: "weakref.WeakKeyDictionary" = field(
+        default_factory=weakref.WeakKeyDictionary, init=False, repr=False, compare=False
+    )
+
+    @property
+    def state_key(self) -> str:
+        """State key the source's documents are kept under until they are gathered."""
+        return f"{self.name}_sources"
+
+    @property
+    def search_node(self) -> str:
+        return f"search_{self.name}"
+
+    @property
+    def generated_search_node(self) -> str:
+        return f"search_{self.name}_generated"
+
+    @property
+    def review_node(self) -> str:
+        return f"review_{self.name}_sources"
+
+    def enabled(self, configurable: Configuration) -> bool:
+        """Whether the source is searched under a configuration."""
+        return bool(getattr(configurable, f"search_{self.name}_enabled", True))
+
+    def query_timeout(self, configurable: Configuration) -> Optional[float]:
+        """Timeout of one search call in seconds, or None for no timeout."""
+        return self.timeout_seconds or configurable.search_query_timeout or None
+
+    def branch_timeout(self, configurable: Configuration) -> Optional[float]:
+        """Timeout of the source's search and review in seconds, or None for no timeout."""
+        return getattr(configurable, f"search_{self.name}_timeout", None) or self.branch_timeout_seconds
+
+    def window_hours(self, configurable: Configuration) -> int:
+        """How far back, in hours, the source's results are relevant."""
+        return getattr(configurable, f"search_{self.name}_last_hours", None) or configurable.last_hours
+
+    def should_review(self, configurable: Configuration) -> bool:
+        """Whether the source's results go through LLM review."""
+        return self.review_enabled is None or self.review_enabled(configurable)
+
+    def limiter(self) -> asyncio.Semaphore:
+        """Return the semaphore bounding concurrent searches in the running event loop."""
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = self._limiters[loop] = asyncio.Semaphore(self.max_concurrency)
+        return limiter
+
+    def executor(self) -> ThreadPoolExecutor:
+        """Return the thread pool the source's searches run in, with max_concurrency threads."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix=f"search-{self.name}"
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the source's thread pool once its running searches return."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_adapters: Dict[str, SourceAdapter] = {}
+_adapters_lock = threading.Lock()
+
+
+def register_source_adapter(adapter: SourceAdapter, replace: bool = False) -> SourceAdapter:
+    """
+    Add a source adapter to the registry.
+
+    Graphs built afterwards get a search and review branch for it. A new
+    source's documents need a state key, which build_graph adds to the
+    graph state for adapters the state doesn't declare.
+
+    Args:
+        adapter: The adapter to register
+        replace: Replace an adapter already registered under the same name
+
+    Returns:
+        The registered adapter
+    """
+    with _adapters_lock:
+        if adapter.name in _adapters and not replace:
+            raise ValueError(f"Source adapter already registered: {adapter.name}")
+        _adapters[adapter.name] = adapter
+    return adapter
+
+
+def unregister_source_adapter(name: str) -> None:
+    """Remove a source adapter from the registry and stop its thread pool."""
+    with _adapters_lock:
+        adapter = _adapters.pop(name, None)
+    if adapter is not None:
+        adapter.shutdown()
+
+
+def get_source_adapter(name: str) -> SourceAdapter:
+    """Return the adapter registered under a name."""
+    try:
+        return _adapters[name]
+    except KeyError:
+        raise ValueError(f"Unknown source type: {name}")
+
+
+def source_adapters() -> List[SourceAdapter]:
+    """Return the registered adapters, in registration order."""
+    with _adapters_lock:
+        return list(_adapters.values())
+
+
+# Built-in sources
+
+def _search_web(
+    query: str, configurable: Configuration, current_date: Optional[str], timeout: Optional[float] = None
+) -> List[Document]:
+    return search_web_tool(
+        query=query,
+        max_results=configurable.search_web_max_results,
+        last_days=configurable.search_web_last_days,
+        current_date=current_date,
+        timeout=timeout,
+    )
+
+
+def _search_email(query: str, configurable: Configuration, current_date: Optional[str]) -> List[Document]:
+    return mock_email_search(
+        query=query,
+        max_results=configurable.search_email_max_results,
+        last_hours=configurable.search_email_last_hours,
+    )
+
+
+def _search_youtube(query: str, configurable: Configuration, current_date: Optional[str]) -> List[Document]:
+    return mock_youtube_search(
+        query=query,
+        max_results=configurable.search_youtube_max_results,
+        last_days=configurable.search_youtube_last_days,
+    )
+
+
+def _search_speeches(query: str, configurable: Configuration, current_date: Optional[str]) -> List[Document]:
+    return mock_speeches_search(
+        query=query,
+        max_results=configurable.search_speeches_max_results,
+    )
+
+
+def _search_scraper(query: str, configurable: Configuration, current_date: Optional[str]) -> List[Document]:
+    return mock_scraper_search(
+        query=query,
+        max_results=configurable.search_scraper_max_results,
+        last_hours=configurable.search_scraper_last_hours,
+    )
+
+
+register_source_adapter(SourceAdapter(
+    "web", _search_web, max_concurrency=4, expected_latency_seconds=3.0, accepts_timeout=True
+))
+register_source_adapter(SourceAdapter("email", _search_email, max_concurrency=2, expected_latency_seconds=1.0))
+register_source_adapter(SourceAdapter("youtube", _search_youtube, max_concurrency=2, expected_latency_seconds=2.0))
+register_source_adapter(SourceAdapter("speeches", _search_speeches, max_concurrency=8, expected_latency_seconds=0.5))
+register_source_adapter(SourceAdapter(
+    "scraper",
+    _search_scraper,
+    max_concurrency=4,
+    expected_latency_seconds=1.0,
+    review_enabled=lambda configurable: configurable.review_scraper_sources_enabled,
+))
+
+# The built-in source types, in the order their documents are gathered
+SOURCE_TYPES = tuple(adapter.name for adapter in source_adapters())
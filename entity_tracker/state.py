@@ -17,6 +17,11 @@ def extend_field(existing: list, update: list | str):
     return (existing or []) + update
 
 
+def merge_field(existing: dict, update: dict):
+    """Reducer function for merging dict fields in state."""
+    return {**(existing or {}), **update}
+
+
 class EntityTrackerInput(TypedDict):
     """Input parameters for the entity tracker."""
     entity_name: Optional[str]
@@ -39,6 +44,7 @@ class EntityTrackerState(EntityTrackerInput):
     speeches_sources: list[Document]
     scraper_sources: list[Document]
     sources: list[Document]
+    source_clusters: list[list[int]]
     entity_history: EntityHistory
     entity_history_without_sources: EntityHistory
     entity_history_plans: list[EntityHistoryPlan]
@@ -49,6 +55,10 @@ class EntityTrackerState(EntityTrackerInput):
     relationship_type_id: Optional[int]
     main_entity_name: Optional[str]
     entity_history_output: Optional[EntityHistory]
+    run_deadline: Optional[float]
+    branch_deadlines: Annotated[dict, merge_field]
+    generated_sources: Annotated[dict, merge_field]
+    timed_out_sources: Annotated[list, extend_field]
 
 
 class EntityTrackerOutput(TypedDict):
@@ -59,4 +69,5 @@ class EntityTrackerOutput(TypedDict):
     entity_name: Optional[str]
     main_entity_name: Optional[str]
     related_entity_name: Optional[str]
+    timed_out_sources: list[str]
 
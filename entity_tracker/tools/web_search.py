@@ -16,6 +16,7 @@ def search_web_tool(
     max_results: int = 5,
     last_days: int = 1,
     current_date: Optional[str] = None,
+    timeout: Optional[float] = None,
     **kwargs
 ) -> List[Document]:
     """
@@ -31,6 +32,7 @@ def search_web_tool(
         max_results: Maximum number of results to return
         last_days: How many days back to search
         current_date: Optional reference date
+        timeout: Optional seconds the search request may take
         
     Returns:
         List of Document objects with search results
@@ -40,17 +42,20 @@ def search_web_tool(
         tavily_api_key = os.getenv("TAVILY_API_KEY")
         
         if tavily_api_key:
-            from langchain_community.tools.tavily_search import TavilySearchResults
+            from tavily import TavilyClient
             
-            tavily = TavilySearchResults(
+            tavily = TavilyClient(api_key=tavily_api_key)
+            
+            response = tavily.search(
+                query=query,
                 max_results=max_results,
                 search_depth="advanced",
                 include_answer=False,
                 include_raw_content=True,
                 include_images=False,
+                **({"timeout": timeout} if timeout is not None else {}),
             )
-            
-            results = tavily.invoke({"query": query})
+            results = response.get("results", [])
             
             # Convert to Document format
             documents = []
@@ -1,12 +1,32 @@
 """Utility functions for the Entity Tracker agent."""
 
 from entity_tracker.utils.llm import create_llm_from_config, create_llm_configs
-from entity_tracker.utils.sources import parse_and_cap_sources, parse_and_cap_source_content
+from entity_tracker.utils.sources import (
+    parse_and_cap_sources,
+    parse_and_cap_source_content,
+    estimate_source_tokens,
+    chunk_sources,
+)
+from entity_tracker.utils.prefilter import prefilter_sources, window_start_for
+from entity_tracker.utils.relevance import RunningTopK, profile_vector, select_relevant
+from entity_tracker.utils.clustering import cluster_sources
+from entity_tracker.utils.duplicates import ACCEPT, ESCALATE, REJECT, classify_entries
 
 __all__ = [
     "create_llm_from_config",
     "create_llm_configs",
     "parse_and_cap_sources",
     "parse_and_cap_source_content",
+    "estimate_source_tokens",
+    "chunk_sources",
+    "prefilter_sources",
+    "window_start_for",
+    "RunningTopK",
+    "profile_vector",
+    "select_relevant",
+    "cluster_sources",
+    "ACCEPT",
+    "ESCALATE",
+    "REJECT",
+    "classify_entries",
 ]
-
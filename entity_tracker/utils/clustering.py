@@ -0,0 +1,118 @@
+"""
+Event clustering of source documents.
+
+Groups sources that likely report the same event, so the history planner
+can look at one representative per event instead of every article about
+it. Two sources are similar when their texts are (cosine similarity of
+hashed embeddings) and when they name the same people, places and
+organizations (Jaccard overlap of capitalized phrases); sources published
+too many days apart are never grouped.
+"""
+
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from entity_tracker.utils.prefilter import publication_date
+from entity_tracker.utils.relevance import HashingEmbedder, get_embedder
+
+# Capitalized phrases, a cheap stand-in for named entities
+NAME_PATTERN = re.compile(r"\b[A-Z][\w&.-]*(?:\s+[A-Z][\w&.-]*)*")
+# Weight of text similarity against name overlap
+TEXT_WEIGHT = 0.7
+
+
+def _source_text(source) -> str:
+    return f"{(source.metadata or {}).get('title') or ''} {source.page_content or ''}"
+
+
+def similarity_matrix(
+    sources: list,
+    max_days_apart: Optional[float] = 2.0,
+    embedder: Optional[HashingEmbedder] = None
+) -> np.ndarray:
+    """
+    Return the pairwise event similarity of sources, between 0 and 1.
+
+    Args:
+        sources: Documents or SourceModels
+        max_days_apart: Sources whose publication dates are further apart
+            get similarity 0; None disables the date rule. Sources without a
+            date are never ruled out.
+        embedder: Defaults to the process-wide embedder
+    """
+    embedder = embedder or get_embedder()
+    texts = [_source_text(source) for source in sources]
+    vectors = embedder.embed_many(texts)
+    text_similarity = np.clip(vectors @ vectors.T, 0.0, 1.0)
+
+    # Name overlap as Jaccard similarity over a binary source x name matrix
+    names = [set(NAME_PATTERN.findall(text)) for text in texts]
+    vocabulary = {name: i for i, name in enumerate(set().union(*names))}
+    membership = np.zeros((len(sources), len(vocabulary)), dtype=np.float32)
+    for row, source_names in enumerate(names):
+        membership[row, [vocabulary[name] for name in source_names]] = 1.0
+    shared = membership @ membership.T
+    counts = membership.sum(axis=1)
+    union = counts[:, None] + counts[None, :] - shared
+    name_similarity = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+    similarity = TEXT_WEIGHT * text_similarity + (1 - TEXT_WEIGHT) * name_similarity
+
+    if max_days_apart is not None:
+        days = np.array([
+            published.timestamp() / 86400 if (published := publication_date(source.metadata or {})) else np.nan
+            for source in sources
+        ])
+        apart = np.abs(days[:, None] - days[None, :]) > max_days_apart
+        similarity[apart] = 0.0  # Comparisons with NaN are False, so undated sources pass
+
+    np.fill_diagonal(similarity, 1.0)
+    return similarity
+
+
+def cluster_sources(
+    sources: list,
+    threshold: float = 0.45,
+    max_days_apart: Optional[float] = 2.0,
+    embedder: Optional[HashingEmbedder] = None
+) -> List[List[int]]:
+    """
+    Group sources into candidate events.
+
+    Sources are taken in order and join the cluster whose first source they
+    are most similar to, if that similarity reaches the threshold; otherwise
+    they start a new cluster. Comparing against each cluster's first source
+    rather than any member keeps loosely related stories from chaining.
+
+    Args:
+        sources: Documents or SourceModels
+        threshold: Lowest similarity to join a cluster
+        max_days_apart: See similarity_matrix
+        embedder: Defaults to the process-wide embedder
+
+    Returns:
+        Clusters as lists of source indexes, each led by its representative:
+        the member most similar to the rest of its cluster
+    """
+    if not sources:
+        return []
+    similarity = similarity_matrix(sources, max_days_apart, embedder)
+
+    clusters: List[List[int]] = []
+    for i in range(len(sources)):
+        if clusters:
+            scores = similarity[i, [cluster[0] for cluster in clusters]]
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                clusters[best].append(i)
+                continue
+        clusters.append([i])
+
+    ordered = []
+    for cluster in clusters:
+        cohesion = similarity[np.ix_(cluster, cluster)].sum(axis=1)
+        representative = cluster[int(np.argmax(cohesion))]
+        ordered.append([representative] + [i for i in cluster if i != representative])
+    return ordered
@@ -0,0 +1,122 @@
+"""
+Local duplicate check of proposed history entries.
+
+Compares each proposed entry with the stored history, and with the entries
+proposed before it. Near-copies, by Jaccard overlap of word shingles, are
+clearly duplicates. Proposed entries are freshly written paraphrases, though,
+so sharing few shingles says little: an entry only counts as clearly new when
+it also shares few content words with every other entry and no numbers or
+names besides the tracked entity's. Everything in between needs an LLM to
+decide.
+"""
+
+import re
+from typing import Iterable, List, Optional, Set
+
+ACCEPT = "accept"
+REJECT = "reject"
+ESCALATE = "escalate"
+
+# Words per shingle
+SHINGLE_SIZE = 3
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a about after against ago all also an and any are around as at be been before but by can could did do does
+during for from had has have he her his in into is it its last more most new next no not of on or our over
+roughly said says she so some than that the their them there these they this those through to under up
+us was we were what when which while who will with would year years
+""".split())
+
+# Spelled-out numbers, so "two million" and "2 million" share the number
+NUMBER_WORDS = {
+    word: str(value) for value, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve".split()
+    )
+}
+
+# Suffixes stripped so "recall" and "recalling" count as the same content word
+_SUFFIXES = ("ings", "ing", "ed", "es", "s")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Return the word shingles of a text, lowercased; short texts are one shingle."""
+    words = _WORD_PATTERN.findall((text or "").lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Return the Jaccard similarity of two sets (0 when both are empty)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def content_words(text: str, ignore: Set[str] = frozenset()) -> Set[str]:
+    """Return the stemmed, lowercased words of a text other than stopwords and ignored words."""
+    words = (NUMBER_WORDS.get(word, word) for word in _WORD_PATTERN.findall((text or "").lower()))
+    return {_stem(word) for word in words if word not in STOPWORDS and word not in ignore}
+
+
+def anchors(text: str, ignore: Set[str] = frozenset()) -> Set[str]:
+    """Return the numbers and capitalized names of a text, lowercased, other than ignored words."""
+    found = set()
+    for word in _WORD_PATTERN.findall(text or ""):
+        lowered = word.lower()
+        if lowered in ignore or lowered in STOPWORDS:
+            continue
+        if word[0].isdigit() or lowered in NUMBER_WORDS:
+            found.add(NUMBER_WORDS.get(lowered, lowered))
+        elif word[0].isupper():
+            found.add(lowered)
+    return found
+
+
+def classify_entries(
+    entries: List[str],
+    history: Iterable[str],
+    accept_below: float = 0.05,
+    reject_above: float = 0.8,
+    entity_names: Optional[Iterable[str]] = None
+) -> List[str]:
+    """
+    Decide for each proposed entry whether it is new, a duplicate, or unclear.
+
+    Args:
+        entries: Contents of the proposed entries, in order
+        history: Contents of the stored history entries
+        accept_below: Entries whose content-word overlap with every other
+            entry is below this, and that share no numbers or names with
+            any, are accepted
+        reject_above: Entries whose shingle overlap with another entry
+            reaches this are rejected
+        entity_names: Names of the tracked entity, which every entry may mention
+
+    Returns:
+        ACCEPT, REJECT or ESCALATE for each entry
+    """
+    ignore = {word for name in entity_names or [] if name for word in _WORD_PATTERN.findall(name.lower())}
+    known = [(shingles(text), content_words(text, ignore), anchors(text, ignore)) for text in history]
+    decisions = []
+    for text in entries:
+        entry = (shingles(text), content_words(text, ignore), anchors(text, ignore))
+        if any(jaccard(entry[0], other[0]) >= reject_above for other in known):
+            decisions.append(REJECT)
+        elif all(jaccard(entry[1], other[1]) < accept_below and not entry[2] & other[2] for other in known):
+            decisions.append(ACCEPT)
+        else:
+            decisions.append(ESCALATE)
+        # Later entries are compared against this one too, unless it was rejected
+        if decisions[-1] != REJECT:
+            known.append(entry)
+    return decisions
@@ -75,6 +75,11 @@ def create_llm_configs(configurable: Any) -> Dict[str, Dict[str, Any]]:
             "temperature": configurable.llm_reviewer_temperature,
             "fallback_model": configurable.llm_reviewer_fallback_model
         },
+        "llm_reviewer_fallback": {
+            "name": configurable.llm_reviewer_fallback_model,
+            "temperature": configurable.llm_reviewer_temperature,
+            "fallback_model": configurable.llm_reviewer_fallback_model
+        },
         "llm_writer": {
             "name": configurable.llm_writer,
             "temperature": configurable.llm_writer_temperature,
@@ -0,0 +1,172 @@
+"""
+Rule-based pre-filter for source documents.
+
+Rejects sources that an LLM reviewer would reject anyway, without spending
+tokens on them: empty or boilerplate content, denylisted domains,
+publication dates outside the search window, and sources that never mention
+the entity. Each source is checked on its own, in a plain loop; the
+patterns are compiled once per call rather than once per source.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from langchain_core.documents import Document
+
+# Metadata keys searched for a publication date, in order
+DATE_METADATA_KEYS = ("published_date", "published_at", "publish_date", "date", "created_at")
+# Metadata keys searched for the source URL, in order
+URL_METADATA_KEYS = ("url", "link", "source")
+
+# Phrases of pages that carry no content: consent walls, errors, paywalls
+BOILERPLATE_PATTERNS = (
+    r"enable javascript",
+    r"access denied",
+    r"page not found",
+    r"\b404\b",
+    r"subscribe to (continue|read)",
+    r"sign in to continue",
+    r"are you a robot",
+    r"verify you are human",
+    r"we use cookies",
+)
+# Sources longer than this are never dropped as boilerplate
+BOILERPLATE_MAX_LENGTH = 500
+
+DROP_EMPTY = "empty"
+DROP_BOILERPLATE = "boilerplate"
+DROP_DOMAIN = "denylisted_domain"
+DROP_OUTSIDE_WINDOW = "outside_window"
+DROP_NO_MENTION = "entity_not_mentioned"
+
+
+def parse_publication_date(value) -> Optional[datetime]:
+    """
+    Parse a publication date from metadata.
+
+    Args:
+        value: ISO or RFC 2822 date string, datetime, or epoch seconds
+
+    Returns:
+        Timezone-aware datetime (UTC if none is given), or None if unparseable
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(str(value))
+            except (TypeError, ValueError):
+                return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def source_domain(source: Document) -> str:
+    """Return the lowercased host of a source's URL, without a leading www."""
+    metadata = source.metadata or {}
+    for key in URL_METADATA_KEYS:
+        url = metadata.get(key)
+        if isinstance(url, str) and url:
+            host = urlparse(url if "//" in url else f"//{url}").hostname or ""
+            return host.lower().removeprefix("www.")
+    return ""
+
+
+def _domain_denied(domain: str, denylist: frozenset) -> bool:
+    """Whether a domain or any parent domain is on the denylist."""
+    parts = domain.split(".")
+    return any(".".join(parts[i:]) in denylist for i in range(len(parts)))
+
+
+def prefilter_sources(
+    sources: List[Document],
+    entity_names: Iterable[str] = (),
+    window_start: Optional[datetime] = None,
+    domain_denylist: Iterable[str] = (),
+    min_content_length: int = 0
+) -> Tuple[List[Document], Counter]:
+    """
+    Drop the sources that fail a rule, keeping the rest in order.
+
+    Each source is dropped for the first rule it fails. Sources without a
+    parseable publication date pass the date rule.
+
+    Args:
+        sources: Documents to filter
+        entity_names: Names of the entity; a source must mention one of them
+            (case-insensitive). No names disables the rule.
+        window_start: Oldest publication date to keep; None disables the rule
+        domain_denylist: Domains whose sources (subdomains included) are dropped
+        min_content_length: Shortest content, in characters, to keep
+
+    Returns:
+        Tuple of the kept sources and a Counter of drop reasons
+    """
+    names = [name.strip() for name in entity_names if name and name.strip()]
+    mention = re.compile("|".join(re.escape(name) for name in names), re.IGNORECASE) if names else None
+    boilerplate = re.compile("|".join(BOILERPLATE_PATTERNS), re.IGNORECASE)
+    denylist = frozenset(domain.strip().lower().removeprefix("www.") for domain in domain_denylist if domain.strip())
+
+    reasons = []
+    for source in sources:
+        content = (source.page_content or "").strip()
+        metadata = source.metadata or {}
+        if len(content) < max(min_content_length, 1):
+            reasons.append(DROP_EMPTY)
+        elif len(content) <= BOILERPLATE_MAX_LENGTH and boilerplate.search(content):
+            reasons.append(DROP_BOILERPLATE)
+        elif denylist and _domain_denied(source_domain(source), denylist):
+            reasons.append(DROP_DOMAIN)
+        elif window_start is not None and _published_before(metadata, window_start):
+            reasons.append(DROP_OUTSIDE_WINDOW)
+        elif mention is not None and not (
+            mention.search(content) or mention.search(str(metadata.get("title") or ""))
+        ):
+            reasons.append(DROP_NO_MENTION)
+        else:
+            reasons.append(None)
+
+    kept = [source for source, reason in zip(sources, reasons) if reason is None]
+    return kept, Counter(reason for reason in reasons if reason is not None)
+
+
+def publication_date(metadata: dict) -> Optional[datetime]:
+    """Return the first parseable publication date in a source's metadata, if any."""
+    for key in DATE_METADATA_KEYS:
+        published = parse_publication_date(metadata.get(key))
+        if published is not None:
+            return published
+    return None
+
+
+def _published_before(metadata: dict, window_start: datetime) -> bool:
+    published = publication_date(metadata)
+    return published is not None and published < window_start
+
+
+def window_start_for(current_date: Optional[str], last_hours: int) -> Optional[datetime]:
+    """
+    Return the start of a search window ending with a run's current date.
+
+    Args:
+        current_date: The run's date in YYYY-MM-DD format; the window ends at
+            the end of that day (UTC)
+        last_hours: Length of the window in hours
+    """
+    if not current_date or not last_hours:
+        return None
+    try:
+        day = datetime.strptime(current_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return day + timedelta(days=1) - timedelta(hours=last_hours)
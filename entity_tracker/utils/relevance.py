@@ -0,0 +1,209 @@
+"""
+Local relevance scoring of sources against an entity profile.
+
+Sources and the entity profile (its name, related entity and recent history)
+are embedded with the hashing trick: word unigrams and bigrams are hashed
+into a fixed number of signed dimensions, so no model has to be downloaded
+or loaded. All sources of a batch are then scored against the profile with
+one matrix-vector product of unit vectors, i.e. cosine similarity.
+
+Embeddings are cached by content hash, so sources seen by several branches
+or runs are embedded once. Sources that arrive in batches can share a
+RunningTopK, so the top-k cut applies to everything scored so far rather
+than to each batch alone.
+"""
+
+import hashlib
+import heapq
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Embeds texts as L2-normalized hashed bag-of-words vectors.
+
+    Args:
+        dimensions: Length of the vectors
+        cache_size: Embeddings kept in the content-hash cache
+    """
+
+    def __init__(self, dimensions: int = 2048, cache_size: int = 10_000):
+        self.dimensions = dimensions
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, text: str) -> np.ndarray:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        if not features:
+            return vector
+
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features),
+            dtype=np.uint32,
+            count=len(features),
+        )
+        # The bit above the index bits picks the sign, so collisions cancel out on average
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dimensions, signs)
+        # Sublinear term frequency, so repeated words don't dominate
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Return a (len(texts), dimensions) matrix of unit vectors, using the cache."""
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for i, text in enumerate(texts):
+            key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            with self._lock:
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+            if vector is None:
+                vector = self._embed(text)
+                with self._lock:
+                    self.misses += 1
+                    self._cache[key] = vector
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            matrix[i] = vector
+        return matrix
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+_default_embedder: Optional[HashingEmbedder] = None
+_default_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> HashingEmbedder:
+    """Return the process-wide embedder, whose cache all callers share."""
+    global _default_embedder
+    with _default_embedder_lock:
+        if _default_embedder is None:
+            _default_embedder = HashingEmbedder()
+        return _default_embedder
+
+
+def profile_vector(
+    entity_names: Iterable[str],
+    history: Iterable[str] = (),
+    embedder: Optional[HashingEmbedder] = None
+) -> np.ndarray:
+    """
+    Embed an entity profile.
+
+    The names weigh twice as much as the history, so sources about the
+    entity score well even when its history is long.
+
+    Args:
+        entity_names: The entity's name, related entity and aliases
+        history: Contents of recent history entries
+        embedder: Defaults to the process-wide embedder
+    """
+    embedder = embedder or get_embedder()
+    names = " ".join(name for name in entity_names if name)
+    history_text = " ".join(entry for entry in history if entry)
+    vectors = embedder.embed_many([names, history_text])
+    vector = 2 * vectors[0] + vectors[1]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def score_sources(sources: list, profile: np.ndarray, embedder: Optional[HashingEmbedder] = None) -> np.ndarray:
+    """Return the cosine similarity of every source to a profile vector."""
+    embedder = embedder or get_embedder()
+    texts = [
+        f"{(source.metadata or {}).get('title') or ''} {source.page_content or ''}"
+        for source in sources
+    ]
+    if not texts:
+        return np.zeros(0, dtype=np.float32)
+    return embedder.embed_many(texts) @ profile
+
+
+class RunningTopK:
+    """
+    Top-k cut over scores that arrive in batches.
+
+    A score is admitted while fewer than k have been, or when it beats the
+    lowest of the k best admitted so far. Scores arriving in increasing
+    order are all admitted, so the cut is exact only in hindsight, but a
+    stream can never keep a score that k earlier ones beat.
+
+    Args:
+        k: Scores to keep; 0 admits every score
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._best: List[float] = []
+
+    def admit(self, scores: np.ndarray) -> np.ndarray:
+        """Return which of a batch's scores are admitted, best scores first within the batch."""
+        keep = np.zeros(len(scores), dtype=bool)
+        for i in np.argsort(-scores, kind="stable"):
+            score = float(scores[i])
+            if not self.k:
+                keep[i] = True
+            elif len(self._best) < self.k:
+                heapq.heappush(self._best, score)
+                keep[i] = True
+            elif score > self._best[0]:
+                heapq.heapreplace(self._best, score)
+                keep[i] = True
+        return keep
+
+
+def select_relevant(
+    sources: list,
+    profile: np.ndarray,
+    top_k: int = 0,
+    min_score: float = 0.0,
+    embedder: Optional[HashingEmbedder] = None,
+    running: Optional[RunningTopK] = None
+) -> Tuple[list, np.ndarray]:
+    """
+    Keep the sources most similar to a profile, in their original order.
+
+    Args:
+        sources: Documents to rank
+        profile: Unit profile vector, e.g. from profile_vector
+        top_k: Most sources to keep; 0 keeps all that pass min_score
+        min_score: Lowest cosine similarity to keep
+        embedder: Defaults to the process-wide embedder
+        running: Top-k cut shared with earlier batches, used instead of top_k
+
+    Returns:
+        Tuple of the kept sources and the scores of all sources
+    """
+    scores = score_sources(sources, profile, embedder)
+    keep = scores >= min_score
+    if running is not None:
+        keep[keep] = running.admit(scores[keep])
+    elif top_k and keep.sum() > top_k:
+        # Stable sort, so ties keep their original order
+        ranked = np.argsort(-scores, kind="stable")
+        keep = np.zeros(len(sources), dtype=bool)
+        keep[ranked[:top_k]] = True
+        keep &= scores >= min_score
+    return [source for source, kept in zip(sources, keep) if kept], scores
@@ -93,3 +93,50 @@ def parse_and_cap_sources(sources: List, max_length: int = 4000) -> List:
         
     return parsed_sources
 
+
+# Rough characters per token of English text, for prompt size estimates
+CHARS_PER_TOKEN = 4
+
+
+def estimate_source_tokens(source: Document) -> int:
+    """
+    Estimate the tokens a source takes up in a prompt.
+    
+    Args:
+        source: A source object (Document or SourceModel)
+        
+    Returns:
+        int: Estimated token count of the content and metadata
+    """
+    content = getattr(source, "page_content", None) or getattr(source, "content", "") or ""
+    metadata = getattr(source, "metadata", None) or {}
+    return (len(content) + len(str(metadata))) // CHARS_PER_TOKEN + 1
+
+
+def chunk_sources(sources: List, max_tokens: int) -> List[List]:
+    """
+    Split sources, in order, into chunks that fit a token budget.
+    
+    A source larger than the budget gets a chunk of its own.
+    
+    Args:
+        sources: List of source objects (Document or SourceModel)
+        max_tokens: Estimated token budget of one chunk
+        
+    Returns:
+        list: Chunks of consecutive sources
+    """
+    chunks = []
+    chunk = []
+    chunk_tokens = 0
+    for source in sources:
+        tokens = estimate_source_tokens(source)
+        if chunk and chunk_tokens + tokens > max_tokens:
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(source)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
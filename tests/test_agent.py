@@ -2,12 +2,41 @@
 Unit tests for the Entity Tracker agent.
 """
 
+import asyncio
+import re
+import threading
+import time
 import pytest
+from langchain_core.documents import Document
+from entity_tracker import agent
+from entity_tracker.agent import (
+    build_graph,
+    gather_sources,
+    iter_search_results,
+    make_review_node,
+    make_search_node,
+    review_sources,
+    update_entity_history,
+)
+from entity_tracker.configuration import Configuration
+from entity_tracker.metrics import get_pipeline_metrics, reset_pipeline_metrics
 from entity_tracker.schemas import (
     EntityHistory,
     EntityHistoryEntry,
+    EntityHistoryPlan,
     SourceModel,
+    SourcesReview,
+    SourcesTriage,
+    SourceTriage,
     Queries,
+    ShouldUpdateEntityHistory,
+    ShouldWriteHistoryEntries,
+)
+from entity_tracker.sources import (
+    SourceAdapter,
+    get_source_adapter,
+    register_source_adapter,
+    unregister_source_adapter,
 )
 from entity_tracker.database.operations import (
     get_entity_history,
@@ -174,3 +203,544 @@ async def test_agent_with_relationship():
     assert result["main_entity_name"] == "inflation"
     assert result["related_entity_name"] == "United States"
 
+
+
+@pytest.mark.asyncio
+async def test_retried_history_update_does_not_duplicate_entries():
+    """Test that running update_entity_history twice for the same run saves each entry once."""
+    state = {
+        "entity_id": "test_entity",
+        "current_date": "2024-01-15",
+        "entity_history_entries_filtered": [
+            EntityHistoryEntry(content="Event A"),
+            EntityHistoryEntry(content="Event B"),
+        ],
+    }
+    config = {"metadata": {"langgraph_checkpoint_ns": "update_entity_history:task-1"}}
+
+    await update_entity_history(state, config)
+    await update_entity_history(state, config)
+    assert len(get_entity_history("test_entity").entries) == 2
+
+    # A different run saves the same content again
+    await update_entity_history(state, {"metadata": {"langgraph_checkpoint_ns": "update_entity_history:task-2"}})
+    assert len(get_entity_history("test_entity").entries) == 4
+
+
+def test_build_graph_only_compiles_enabled_sources():
+    """Test that the graph factory drops disabled branches and caches graphs."""
+    default = build_graph()
+    nodes = set(default.get_graph().nodes)
+    assert {"search_web", "review_web_sources"} <= nodes
+    assert "search_email" not in nodes and "search_scraper" not in nodes
+    assert build_graph({"configurable": {"search_web_enabled": True}}) is default
+
+    scraper_only = build_graph(sources=["scraper"])
+    nodes = set(scraper_only.get_graph().nodes)
+    assert "search_scraper" in nodes and "search_web" not in nodes
+
+    no_search = build_graph(sources=[])
+    assert not any(node.startswith("search_") for node in no_search.get_graph().nodes)
+
+    # Without query generation, each search goes straight to its review
+    no_generation = build_graph(sources=["web", "scraper"], generate_queries=False)
+    nodes = set(no_generation.get_graph().nodes)
+    assert {"search_web", "review_web_sources", "search_scraper", "review_scraper_sources"} <= nodes
+    assert not {"create_universal_queries", "search_web_generated", "search_scraper_generated"} & nodes
+    assert ("search_web", "review_web_sources") in {
+        (edge.source, edge.target) for edge in no_generation.get_graph().edges
+    }
+
+    assert {"search_email", "search_youtube", "search_speeches"} <= set(agent.graph.get_graph().nodes)
+    with pytest.raises(ValueError):
+        build_graph(sources=["fax"])
+
+
+@pytest.mark.asyncio
+async def test_registered_source_adapter_gets_branch_and_concurrency_limit():
+    """Test that a registered adapter is searched within its concurrency limit."""
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def search(query, configurable, current_date):
+        with lock:
+            running.append(query)
+            peak.append(len(running))
+        time.sleep(0.05 if query != "slow" else 1.0)
+        with lock:
+            running.remove(query)
+        return [Document(page_content=f"news about {query}", metadata={"url": f"https://example.com/{query}"})]
+
+    register_source_adapter(SourceAdapter("wire", search, max_concurrency=2, timeout_seconds=0.5))
+    try:
+        nodes = set(build_graph(sources=["wire", "web"]).get_graph().nodes)
+        assert {"search_wire", "review_wire_sources", "search_web"} <= nodes
+
+        result = await make_search_node("wire")(
+            {"entity_name": "a", "graph_settings": {"search_queries": ["b", "slow", "c", "d"]}}, {}
+        )
+        sources = result["wire_sources"]
+        assert max(peak) == 2
+        # The timed-out query is skipped; the rest keep query order
+        assert [s.page_content for s in sources] == [f"news about {q}" for q in "abcd"]
+        assert [s.metadata["source_number"] for s in sources] == [1, 2, 3, 4]
+
+        gathered = await gather_sources({"web_sources": [], "wire_sources": sources}, {})
+        assert len(gathered["sources"]) == 4 and gathered["wire_sources"] == []
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_timed_out_search_keeps_its_slot_until_its_thread_returns():
+    """Test that abandoned searches still count against max_concurrency and run in the adapter's pool."""
+    events = []
+    timeouts = []
+    threads = set()
+
+    def search(query, configurable, current_date, timeout=None):
+        threads.add(threading.current_thread().name)
+        timeouts.append(timeout)
+        events.append(f"start {query}")
+        time.sleep(0.4 if query == "hung" else 0.01)
+        events.append(f"end {query}")
+        return []
+
+    adapter = register_source_adapter(
+        SourceAdapter("wire", search, max_concurrency=1, timeout_seconds=0.1, accepts_timeout=True)
+    )
+    try:
+        timed_out = []
+        results = [result async for result in iter_search_results(
+            adapter, ["hung", "b"], {}, Configuration(), timed_out, deadline=time.time() + 5
+        )]
+        assert sorted(results) == [(0, []), (1, [])]
+        assert timed_out == ["hung"]
+        # The second search waited for the hung thread instead of running next to it
+        assert events == ["start hung", "end hung", "start b", "end b"]
+        assert all(name.startswith("search-wire") for name in threads)
+        assert timeouts == [0.1, 0.1]
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_search_branch_deadline_keeps_partial_results():
+    """Test that a branch past its deadline returns what finished and is recorded."""
+    def search(query, configurable, current_date):
+        time.sleep(2.0 if query == "hung" else 0.01)
+        return [Document(page_content=query, metadata={})]
+
+    register_source_adapter(SourceAdapter("wire", search, branch_timeout_seconds=0.3))
+    try:
+        started = time.time()
+        result = await make_search_node("wire")(
+            {"entity_name": "a", "graph_settings": {"search_queries": ["hung", "b"]}}, {}
+        )
+        assert time.time() - started < 1.0
+        assert [s.page_content for s in result["wire_sources"]] == ["a", "b"]
+        assert result["timed_out_sources"] == ["wire"]
+
+        # The review of a branch already past its deadline is cut off without an LLM call
+        state = {**result, "branch_deadlines": result["branch_deadlines"], "timed_out_sources": []}
+        time.sleep(0.3)
+        reviewed = await make_review_node("wire")(state, {})
+        assert reviewed == {"wire_sources": [], "timed_out_sources": ["wire"]}
+
+        # A run deadline less its reserve bounds the branch as well
+        result = await make_search_node("wire")(
+            {"entity_name": "hung", "run_deadline": time.time() + 0.2},
+            {"configurable": {"run_deadline_reserve_seconds": 0.1}},
+        )
+        assert result["wire_sources"] == [] and result["timed_out_sources"] == ["wire"]
+
+        # Built-in sources have no branch deadline unless one is configured
+        assert get_source_adapter("web").branch_timeout(Configuration()) is None
+        assert get_source_adapter("web").branch_timeout(Configuration(search_web_timeout=30)) == 30
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_base_queries_are_searched_during_query_generation():
+    """Test that base-query searches overlap query generation and merge before review."""
+    searched = {}
+
+    def search(query, configurable, current_date):
+        searched[query] = time.time()
+        return [Document(page_content=f"about {query}", metadata={"url": f"https://example.com/{query}"})]
+
+    async def create_universal_queries(state, config):
+        await asyncio.sleep(0.3)
+        return {"queries": agent.base_queries(state) + ["generated"]}
+
+    register_source_adapter(SourceAdapter("wire", search, review_enabled=lambda configurable: False))
+    try:
+        nodes = set(agent.build_graph(sources=["wire"]).get_graph().nodes)
+        assert {"search_wire", "search_wire_generated", "review_wire_sources"} <= nodes
+
+        # The base search runs right after initialization, before generation ends
+        started = time.time()
+        state = {"entity_name": "Acme", "graph_settings": {"search_queries": ["Acme earnings"]}}
+        base, generation = await asyncio.gather(
+            agent.make_search_node("wire")(state, {}), create_universal_queries(state, {})
+        )
+        assert set(searched) == {"Acme", "Acme earnings"}
+        assert max(searched.values()) - started < 0.3
+
+        state.update(base, queries=generation["queries"])
+        generated = await agent.make_search_node("wire", generated=True)(state, {})
+        assert [s.page_content for s in generated["generated_sources"]["wire"]] == ["about generated"]
+
+        # The review node sees base and generated results, numbered in order
+        state["generated_sources"] = generated["generated_sources"]
+        reviewed = (await agent.make_review_node("wire")(state, {}))["wire_sources"]
+        assert [s.page_content for s in reviewed] == ["about Acme", "about Acme earnings", "about generated"]
+        assert [s.metadata["source_number"] for s in reviewed] == [1, 2, 3]
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_streaming_review_overlaps_searches(monkeypatch):
+    """Test that streamed micro-batches are reviewed while later searches run."""
+    events = []
+
+    def search(query, configurable, current_date):
+        time.sleep(0.4 if query == "late" else 0.01)
+        events.append(("searched", query))
+        return [Document(page_content=f"{query} {i}", metadata={}) for i in range(2)]
+
+    class Reviewer:
+        async def ainvoke(self, messages):
+            events.append(("reviewed", None))
+            # Keep the first source of every batch
+            return SourcesReview(sources_to_keep=[1])
+
+    async def create_llm_from_config(llm_config, schema):
+        return Reviewer()
+
+    monkeypatch.setattr(agent, "create_llm_from_config", create_llm_from_config)
+    register_source_adapter(SourceAdapter("wire", search))
+    try:
+        state = {
+            "entity_name": "late",
+            "graph_settings": {"search_queries": ["a", "b"]},
+            "entity_history_without_sources": None,
+        }
+        config = {"configurable": {"stream_review_enabled": True, "stream_review_batch_size": 2}}
+        result = await agent.make_search_node("wire")(state, config)
+
+        assert events.index(("reviewed", None)) < events.index(("searched", "late"))
+        assert [s.page_content for s in result["wire_sources"]] == ["late 0", "a 0", "b 0"]
+        assert [s.metadata["source_number"] for s in result["wire_sources"]] == [1, 2, 3]
+
+        # The review node only passes streamed results on
+        reviewed = await agent.make_review_node("wire")({**state, **result}, config)
+        assert reviewed["wire_sources"] == result["wire_sources"]
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_streaming_review_applies_top_k_across_batches(monkeypatch):
+    """Test that relevance_top_k bounds a streamed review as a whole, not each micro-batch."""
+    reviewed = []
+    # Queries and their results; the most relevant sources return first
+    texts = {
+        "Acme Robotics": "Acme Robotics unveils a warehouse robot",
+        "shares": "Acme Robotics shares rise after earnings",
+        "weather": "Weather forecast for Acme county: sunny",
+        "bakery": "Robotics fair draws local bakery crowds",
+        "trains": "Acme train timetable changes next month",
+        "parking": "City council debates Robotics parking fees",
+    }
+    queries = list(texts)
+
+    def search(query, configurable, current_date):
+        time.sleep(0.05 * queries.index(query))
+        return [Document(page_content=texts[query], metadata={})]
+
+    class Reviewer:
+        async def ainvoke(self, messages):
+            count = messages[0].content.count("page_content=")
+            reviewed.append(count)
+            return SourcesReview(sources_to_keep=list(range(1, count + 1)))
+
+    async def create_llm_from_config(llm_config, schema):
+        return Reviewer()
+
+    monkeypatch.setattr(agent, "create_llm_from_config", create_llm_from_config)
+    register_source_adapter(SourceAdapter("wire", search, max_concurrency=6))
+    try:
+        state = {
+            "entity_name": "Acme Robotics",
+            "graph_settings": {"search_queries": queries[1:]},
+            "entity_history_without_sources": None,
+        }
+        config = {"configurable": {
+            "stream_review_enabled": True,
+            "stream_review_batch_size": 1,
+            "relevance_scoring_enabled": True,
+            "relevance_top_k": 2,
+        }}
+        result = await agent.make_search_node("wire")(state, config)
+
+        # Six batches, but only the two best sources reach the reviewer
+        assert sum(reviewed) == 2
+        assert [s.page_content for s in result["wire_sources"]] == [texts["Acme Robotics"], texts["shares"]]
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_large_review_is_split_into_chunks():
+    """Test that a review over the token budget is chunked and merged by source number."""
+    chunk_numbers = []
+
+    class Reviewer:
+        async def ainvoke(self, messages):
+            numbers = [int(n) for n in re.findall(r"'source_number': (\d+)", messages[0].content)]
+            chunk_numbers.append(numbers)
+            return SourcesReview(sources_to_keep=[n for n in numbers if n % 3 == 0])
+
+    sources = [Document(page_content="x" * 400, metadata={}) for _ in range(10)]
+    state = {"entity_name": "Acme", "entity_history_without_sources": None}
+    configurable = Configuration(review_chunk_max_tokens=250)
+
+    kept = await review_sources(Reviewer(), sources, state, configurable, last_hours=24)
+
+    assert len(chunk_numbers) == 5
+    assert sorted(n for chunk in chunk_numbers for n in chunk) == list(range(1, 11))
+    assert [s.metadata["source_number"] for s in kept] == [3, 6, 9]
+
+
+@pytest.mark.asyncio
+async def test_review_cascade_escalates_only_unsure_sources():
+    """Test that the triage tier settles confident decisions and records its rates."""
+    escalated = []
+    triage_prompts = []
+
+    class Triage:
+        async def ainvoke(self, messages):
+            triage_prompts.append(messages[0].content)
+            return SourcesTriage(sources=[
+                SourceTriage(source_number=1, decision="keep", confidence=0.95),
+                SourceTriage(source_number=2, decision="drop", confidence=0.9),
+                SourceTriage(source_number=3, decision="drop", confidence=0.5),
+                SourceTriage(source_number=4, decision="unsure", confidence=1.0),
+            ])
+
+    class Reviewer:
+        async def ainvoke(self, messages):
+            numbers = [int(n) for n in re.findall(r"'source_number': (\d+)", messages[0].content)]
+            escalated.extend(numbers)
+            return SourcesReview(sources_to_keep=[4])
+
+    reset_pipeline_metrics()
+    sources = [Document(page_content=f"source {i}", metadata={}) for i in range(5)]
+    state = {"entity_name": "Acme", "entity_history_without_sources": None}
+    configurable = Configuration(review_cascade_enabled=True)
+
+    kept = await review_sources(Reviewer(), sources, state, configurable, 24, llm_triage=Triage())
+
+    # Source 3 is below the confidence threshold and source 5 got no decision
+    assert escalated == [3, 4, 5]
+    assert [s.metadata["source_number"] for s in kept] == [1, 4]
+    metrics = get_pipeline_metrics()["review_cascade"]
+    assert metrics["triaged"] == 5 and metrics["escalated"] == 3
+    assert metrics["triage_keep_rate"] == 0.2 and metrics["triage_drop_rate"] == 0.2
+    assert metrics["reviewer_keep_rate"] == pytest.approx(1 / 3)
+    assert "Sources to Triage" in triage_prompts[0] and "sources_to_keep" not in triage_prompts[0]
+
+
+def test_review_cascade_tier_must_be_a_known_tier():
+    """Test that an unknown cascade tier is rejected when the configuration is built."""
+    with pytest.raises(ValueError, match="review_cascade_tier"):
+        Configuration.from_runnable_config({"configurable": {"review_cascade_tier": "llm_fast"}})
+
+
+@pytest.mark.asyncio
+async def test_prefilter_runs_before_review(capsys):
+    """Test that the review node drops pre-filtered sources and reports the reasons."""
+    register_source_adapter(SourceAdapter("wire", lambda *args: [], review_enabled=lambda configurable: False))
+    try:
+        reset_pipeline_metrics()
+        sources = [
+            Document(page_content="Acme raised prices across its product range this week.", metadata={}),
+            Document(page_content="Unrelated news about the weather this weekend.", metadata={}),
+            Document(page_content="Acme opened a store.", metadata={"url": "https://blocked.test/x"}),
+        ]
+        state = {"entity_name": "Acme", "current_date": "2024-06-02", "wire_sources": sources}
+        config = {"configurable": {
+            "source_prefilter_enabled": True,
+            "source_prefilter_min_content_length": 10,
+            "source_prefilter_domain_denylist": "blocked.test",
+            "debug": True,
+        }}
+
+        result = await make_review_node("wire")(state, config)
+
+        assert [s.page_content for s in result["wire_sources"]] == [sources[0].page_content]
+        assert result["wire_sources"][0].metadata["source_number"] == 1
+        assert "entity_not_mentioned=1" in capsys.readouterr().out
+        metrics = get_pipeline_metrics()["prefilter"]
+        assert metrics["checked"] == 3 and metrics["dropped"] == 2
+        assert metrics["denylisted_domain"] == 1
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_relevance_scoring_keeps_top_sources_before_review():
+    """Test that the review node passes only the most relevant sources on."""
+    register_source_adapter(SourceAdapter("wire", lambda *args: [], review_enabled=lambda configurable: False))
+    try:
+        sources = [
+            Document(page_content="Weather forecast: sunny with light winds", metadata={}),
+            Document(page_content="Acme Robotics unveils a warehouse robot", metadata={}),
+            Document(page_content="Acme Robotics shares rise after earnings", metadata={}),
+        ]
+        state = {"entity_name": "Acme Robotics", "entity_history_without_sources": None, "wire_sources": sources}
+        config = {"configurable": {"relevance_scoring_enabled": True, "relevance_top_k": 2}}
+
+        result = await make_review_node("wire")(state, config)
+
+        assert [s.page_content for s in result["wire_sources"]] == [s.page_content for s in sources[1:]]
+        assert [s.metadata["source_number"] for s in result["wire_sources"]] == [1, 2]
+    finally:
+        unregister_source_adapter("wire")
+
+
+@pytest.mark.asyncio
+async def test_planner_sees_cluster_representatives(monkeypatch):
+    """Test that clustered sources reach the planner once and plans cover whole clusters."""
+    prompts = []
+
+    class Planner:
+        async def ainvoke(self, messages):
+            prompts.append(messages[0].content)
+            return ShouldWriteHistoryEntries(entity_history_plans=[
+                EntityHistoryPlan(event="Acme buys Widget", reasoning="Deal", source_numbers=[first])
+            ])
+
+    async def create_llm_from_config(llm_config, schema):
+        return Planner()
+
+    monkeypatch.setattr(agent, "create_llm_from_config", create_llm_from_config)
+    deal = "Acme Corp agreed to buy Widget Inc for $2 billion, the companies said."
+    documents = [
+        Document(page_content=deal, metadata={"url": "https://a.test/deal"}),
+        Document(page_content="Heavy rain expected across the valley this weekend.", metadata={"url": "https://b.test/rain"}),
+        Document(page_content="Acme Corp will buy Widget Inc for $2 billion in cash.", metadata={"url": "https://c.test/deal"}),
+    ]
+    config = {"configurable": {"source_clustering_enabled": True}}
+    gathered = await agent.gather_sources({"web_sources": documents}, config)
+
+    assert len(gathered["source_clusters"]) == 2
+    deal_cluster = next(cluster for cluster in gathered["source_clusters"] if len(cluster) == 2)
+    first = deal_cluster[0]
+
+    state = {
+        "entity_name": "Acme",
+        "entity_history_without_sources": None,
+        "sources": gathered["sources"],
+        "source_clusters": gathered["source_clusters"],
+    }
+    sends = await agent.should_write_history_entry(state, config)
+
+    assert prompts[0].count("Widget Inc") == 1 and "related_urls" in prompts[0]
+    assert sorted(sends[0].arg["entity_history_plans"][0].source_numbers) == sorted(deal_cluster)
+
+
+@pytest.mark.asyncio
+async def test_parallel_planning_runs_one_call_per_cluster(monkeypatch):
+    """Test that multi-source clusters are planned concurrently into one entry each, singletons together."""
+    running = []
+    peak = []
+    planned = []
+
+    class Planner:
+        async def ainvoke(self, messages):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.05)
+            running.pop()
+            numbers = [int(n) for n in re.findall(r"'source_number': (\d+)", messages[0].content)]
+            planned.append(numbers)
+            if "weather" in messages[0].content:
+                return ShouldWriteHistoryEntries(entity_history_plans=[])
+            if "single event" in messages[1].content:
+                plans = [EntityHistoryPlan(event=f"event {i}", reasoning="", source_numbers=[99]) for i in range(2)]
+            else:
+                plans = [EntityHistoryPlan(event=f"event {n}", reasoning="", source_numbers=[n]) for n in numbers]
+            return ShouldWriteHistoryEntries(entity_history_plans=plans)
+
+    async def create_llm_from_config(llm_config, schema):
+        return Planner()
+
+    monkeypatch.setattr(agent, "create_llm_from_config", create_llm_from_config)
+    texts = ["deal one", "deal one again", "weather", "weather again", "deal two", "deal three"]
+    sources = [
+        SourceModel(id=i + 1, page_content=text, metadata={"source_number": i + 1})
+        for i, text in enumerate(texts)
+    ]
+    state = {
+        "entity_name": "Acme",
+        "entity_history_without_sources": None,
+        "sources": sources,
+        "source_clusters": [[1, 2], [3, 4], [5], [6]],
+    }
+    config = {"configurable": {"parallel_planning_enabled": True, "planning_max_concurrency": 2}}
+
+    sends = await agent.should_write_history_entry(state, config)
+
+    assert max(peak) == 2
+    assert sorted(planned) == [[1, 2], [3, 4], [5, 6]]
+    assert [send.node for send in sends] == ["assemble_history_entry"] * 3
+    assert [send.arg["entity_history_plans"][0].source_numbers for send in sends] == [[1, 2], [5], [6]]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_check_escalates_only_unclear_entries(monkeypatch):
+    """Test that the LLM only reviews entries the local duplicate check can't settle."""
+    reviewed = []
+
+    class Reviewer:
+        async def ainvoke(self, messages):
+            reviewed.append(messages[0].content)
+            return ShouldUpdateEntityHistory(entity_history_entries=[1])
+
+    async def create_llm_from_config(llm_config, schema):
+        return Reviewer()
+
+    monkeypatch.setattr(agent, "create_llm_from_config", create_llm_from_config)
+    reset_pipeline_metrics()
+    history = EntityHistory(entries=[
+        EntityHistoryEntry(content="Acme Corp agreed to buy Widget Inc for $2 billion in cash on Monday.")
+    ])
+    entries = [
+        EntityHistoryEntry(content="Acme Corp agreed to buy Widget Inc for $2 billion in cash on Monday."),
+        EntityHistoryEntry(content="The chief executive of Acme Corp stepped down after ten years."),
+        EntityHistoryEntry(content="Acme Corp agreed to buy Widget Inc for $2 billion, and regulators opened a review."),
+    ]
+    state = {
+        "entity_name": "Acme Corp",
+        "entity_id": "acme",
+        "entity_history": history,
+        "entity_history_without_sources": history,
+        "entity_history_entries": entries,
+    }
+    config = {"configurable": {"duplicate_check_enabled": True}}
+
+    command = await agent.should_update_entity_history(state, config)
+
+    assert len(reviewed) == 1
+    assert "regulators opened a review" in reviewed[0]
+    assert "stepped down" not in reviewed[0]
+    assert command.update["entity_history_entries_filtered"] == entries[1:]
+
+    stats = get_pipeline_metrics()["duplicate_check"]
+    assert (stats["accepted"], stats["rejected"], stats["escalated"]) == (1, 1, 1)
+    assert stats["escalation_rate"] == pytest.approx(1 / 3)
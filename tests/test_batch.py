@@ -0,0 +1,40 @@
+"""Tests for the batch runner."""
+
+import pytest
+from entity_tracker.batch import track_entities
+from entity_tracker.database.operations import (
+    get_history_cache_stats,
+    save_entity_history_entry,
+    reset_database,
+)
+
+
+class RecordingGraph:
+    """Stand-in graph that records the order of invocations."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, entity_input, config=None):
+        self.calls.append(entity_input["entity_name"])
+        return {"entity_name": entity_input["entity_name"]}
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    """Reset database before each test."""
+    reset_database()
+
+
+@pytest.mark.asyncio
+async def test_track_entities_prefetches_histories():
+    """Test that the batch runner runs every entity and warms the cache."""
+    save_entity_history_entry("Entity 0", "Earlier event", [], timestamp="2024-01-14")
+    inputs = [{"entity_name": f"Entity {i}", "current_date": "2024-01-15"} for i in range(5)]
+    graph = RecordingGraph()
+
+    results = await track_entities(inputs, chunk_size=2, graph=graph)
+
+    assert [r["entity_name"] for r in results] == [i["entity_name"] for i in inputs]
+    assert sorted(graph.calls) == sorted(i["entity_name"] for i in inputs)
+    assert get_history_cache_stats()["entries"] >= 1
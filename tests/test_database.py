@@ -0,0 +1,758 @@
+"""Tests for the history storage layer."""
+
+import asyncio
+import csv
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from entity_tracker.schemas import EntityHistory, EntityHistoryEntry, SourceModel
+from entity_tracker.database import compression, operations
+from entity_tracker.database.operations import (
+    asave_entity_history_entry,
+    configure_change_feed,
+    configure_retention,
+    configure_write_behind,
+    enforce_retention,
+    enqueue_entity_history_entry,
+    export_entity_history,
+    flush_write_behind,
+    get_entity_histories,
+    get_entity_history,
+    get_entity_history_projections,
+    get_history_cache_stats,
+    get_store,
+    get_store_metrics,
+    import_entity_history,
+    prefetch_entity_histories,
+    query_entity_timeline,
+    restore_database,
+    save_entity_history_entry,
+    reset_database,
+    snapshot_database,
+    subscribe_changes,
+)
+from entity_tracker.database.cache import HistoryCache
+from entity_tracker.database.changes import iter_outbox
+from entity_tracker.database.compression import (
+    CompressedText,
+    SourceContentCodec,
+    StoredEntityHistory,
+    StoredSourceModel,
+    compress_text,
+    decompress_text,
+    evaluate_compression_levels,
+    get_compression_stats,
+    reset_compression_stats,
+    train_compression_dictionary,
+)
+from entity_tracker.database.importer import main as import_main
+from entity_tracker.database.log_store import LogHistoryStore
+from entity_tracker.database.retention import RetentionWorker
+from entity_tracker.database.snapshot import read_snapshot
+from entity_tracker.database.store import make_idempotency_key, timestamp_to_epoch
+from entity_tracker.database.write_behind import WriteBehindQueue
+
+
+NEWS_SAMPLES = [
+    f"The company announced on Monday that its chief executive officer would step down "
+    f"at the end of the quarter, according to a statement released to investors. "
+    f"Shares fell {i} percent in early trading as analysts questioned the succession plan."
+    for i in range(40)
+]
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    """Reset database before each test."""
+    reset_database()
+
+
+def test_compression_roundtrip():
+    """Test that compressed content decodes to the original text."""
+    text = NEWS_SAMPLES[0] * 3
+    compressed = compress_text(text)
+
+    assert isinstance(compressed, CompressedText)
+    assert len(compressed) < len(text)
+    assert decompress_text(compressed) == text
+    assert decompress_text("plain") == "plain"
+    assert decompress_text(None) == ""
+
+
+def test_saved_sources_are_stored_compressed():
+    """Test that history reads return the original source content."""
+    save_entity_history_entry(
+        entity_id="test_entity",
+        content="CEO steps down",
+        sources=[SourceModel(page_content=NEWS_SAMPLES[1], metadata={"url": "https://example.com"})],
+        timestamp="2024-01-15"
+    )
+
+    history = get_entity_history("test_entity")
+
+    assert history.entries[0].sources[0].page_content == NEWS_SAMPLES[1]
+    assert history.entries[0].sources[0].metadata["url"] == "https://example.com"
+    assert get_compression_stats()["decode_count"] >= 1
+
+
+def test_history_sources_decode_only_when_read():
+    """Test that building a history leaves source content compressed until page_content is read."""
+    save_entity_history_entry(
+        entity_id="test_entity",
+        content="CEO steps down",
+        sources=[SourceModel(page_content=NEWS_SAMPLES[2], metadata={"url": "https://example.com"})],
+        timestamp="2024-01-15"
+    )
+    reset_compression_stats()
+
+    history = get_entity_history("test_entity")
+    source = history.entries[0].sources[0]
+    assert isinstance(source, StoredSourceModel)
+    assert get_compression_stats()["decode_count"] == 0
+
+    assert source.page_content == NEWS_SAMPLES[2]
+    assert get_compression_stats()["decode_count"] == 1
+    # The decoded text isn't kept on the model
+    assert source.page_content == NEWS_SAMPLES[2]
+    assert get_compression_stats()["decode_count"] == 2
+    assert source.stored_size < len(NEWS_SAMPLES[2])
+
+    # Serialized and printed histories carry the decoded content, and load back
+    dumped = history.model_dump()
+    assert dumped["entries"][0]["sources"][0]["page_content"] == NEWS_SAMPLES[2]
+    assert NEWS_SAMPLES[2] in str(history)
+    loaded = StoredEntityHistory.model_validate_json(history.model_dump_json())
+    assert loaded.entries[0].sources[0].page_content == NEWS_SAMPLES[2]
+    assert EntityHistory.model_validate(dumped).entries[0].sources[0].page_content == NEWS_SAMPLES[2]
+
+    # Sources built outside the store are plain models
+    assert "page_content" in SourceModel(page_content="Body").model_dump()
+
+
+def test_shared_dictionary_improves_small_text_ratio():
+    """Test that a trained dictionary compresses short prose better."""
+    dictionary = train_compression_dictionary(NEWS_SAMPLES[:30])
+    plain = SourceContentCodec()
+    primed = SourceContentCodec()
+    primed.set_dictionary(dictionary)
+
+    for sample in NEWS_SAMPLES[30:]:
+        plain.compress(sample)
+        value = primed.compress(sample)
+        assert primed.decompress(value) == sample
+
+    assert primed.stats()["ratio"] > plain.stats()["ratio"]
+
+
+def test_retrained_dictionary_keeps_old_content_readable():
+    """Test that content compressed with an earlier dictionary still decodes."""
+    codec = SourceContentCodec()
+    codec.set_dictionary(train_compression_dictionary(NEWS_SAMPLES[:10]))
+    old_value = codec.compress(NEWS_SAMPLES[20])
+    codec.set_dictionary(train_compression_dictionary(["other words entirely"] * 5))
+
+    assert codec.decompress(old_value) == NEWS_SAMPLES[20]
+
+
+def test_codec_stats_count_every_thread():
+    """Test that compressions and decodes from many threads are all counted."""
+    codec = SourceContentCodec()
+
+    def work(n):
+        for _ in range(200):
+            codec.decompress(codec.compress(NEWS_SAMPLES[n]))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(8)))
+
+    stats = codec.stats()
+    assert stats["compressed_count"] == stats["decode_count"] == 8 * 200
+
+
+def test_evaluate_compression_levels():
+    """Test per-level compression stats."""
+    results = evaluate_compression_levels(NEWS_SAMPLES[:5], levels=[1, 9])
+
+    assert [r["level"] for r in results] == [1, 9]
+    assert all(r["ratio"] > 1.0 for r in results)
+
+
+def test_history_cache_hit_and_invalidation():
+    """Test that repeated reads are cached and saves invalidate them."""
+    save_entity_history_entry("cached", "First event", [SourceModel(page_content="Body")], timestamp="2024-01-14")
+
+    full, stripped = get_entity_history_projections("cached", last_hours=720, current_date="2024-01-15")
+    again, _ = get_entity_history_projections("cached", last_hours=720, current_date="2024-01-15")
+
+    assert again is full
+    assert full.entries[0].sources[0].page_content == "Body"
+    assert stripped.entries[0].content == "First event"
+    assert stripped.entries[0].sources == []
+    assert get_history_cache_stats()["hits"] >= 1
+
+    save_entity_history_entry("cached", "Second event", [], timestamp="2024-01-15")
+    refreshed, _ = get_entity_history_projections("cached", last_hours=720, current_date="2024-01-15")
+
+    assert [e.content for e in refreshed.entries] == ["Second event", "First event"]
+
+
+def test_history_cache_lru_eviction():
+    """Test that the cache stays within its entry and byte caps."""
+    cache = HistoryCache(max_entries=2)
+    history = EntityHistory(entries=[EntityHistoryEntry(content="x" * 100)])
+    for name in ("a", "b", "c"):
+        cache.put((name, None, None, 100), (history, history))
+
+    assert cache.get(("a", None, None, 100)) is None
+    assert cache.get(("c", None, None, 100)) is not None
+    assert cache.stats()["evictions"] == 1
+
+    small = HistoryCache(max_bytes=1000)
+    for name in ("a", "b", "c", "d"):
+        small.put((name, None, None, 100), (history, history))
+
+    assert small.resident_bytes <= 1000
+
+
+def test_get_entity_histories_bulk_read():
+    """Test reading several histories at once."""
+    save_entity_history_entry("a", "A event", [], timestamp="2024-01-15")
+    save_entity_history_entry("b", "B event", [], timestamp="2024-01-15")
+
+    histories = get_entity_histories(["a", "b", "unknown"], last_hours=720, current_date="2024-01-15")
+
+    assert histories["a"].entries[0].content == "A event"
+    assert histories["b"].entries[0].content == "B event"
+    assert histories["unknown"].entries == []
+
+    # The bulk read leaves both projections cached for initialize_search
+    full, _ = get_entity_history_projections("a", last_hours=720, current_date="2024-01-15")
+    assert full is histories["a"]
+
+
+def test_prefetch_entity_histories():
+    """Test warming the cache in the background."""
+    save_entity_history_entry("a", "A event", [], timestamp="2024-01-15")
+
+    future = prefetch_entity_histories(["a"], last_hours=720, current_date="2024-01-15")
+    histories = future.result(timeout=5)
+
+    assert histories["a"].entries[0].content == "A event"
+    assert get_entity_history("a", last_hours=720, current_date="2024-01-15") is histories["a"]
+    assert get_history_cache_stats()["hits"] >= 1
+
+
+def test_stale_prefetch_is_not_cached():
+    """Test that a read racing a save doesn't cache the old history."""
+    generation = operations._history_cache.generation("a")
+    save_entity_history_entry("a", "A event", [], timestamp="2024-01-15")
+    stale = operations._to_entity_history([])
+    operations._history_cache.put(("a", None, None, 100), (stale, stale), generation)
+
+    assert get_entity_history("a").entries[0].content == "A event"
+
+
+def test_prefetch_racing_reset_is_not_cached():
+    """Test that a read started before a reset doesn't cache the pre-reset history."""
+    save_entity_history_entry("a", "A event", [], timestamp="2024-01-15")
+    generation = operations._history_cache.generation("a")
+    stale = operations.get_entity_history_projections("a")
+    reset_database()
+    operations._history_cache.put(("a", None, None, 100), stale, generation)
+
+    assert get_entity_history("a").entries == []
+
+
+def test_cache_generations_stay_bounded():
+    """Test that invalidating many entities keeps few generations, and pruned ones still reject stale reads."""
+    cache = HistoryCache(max_entries=2)
+    history = EntityHistory(entries=[EntityHistoryEntry(content="x")])
+    generation = cache.generation("a")
+    cache.invalidate("a")
+    for n in range(100):
+        cache.invalidate(f"entity{n}")
+
+    assert len(cache._generations) == 2
+    cache.put(("a", None, None, 100), (history, history), generation)
+    assert cache.get(("a", None, None, 100)) is None
+
+    # A read started after the pruning is cached
+    cache.put(("a", None, None, 100), (history, history), cache.generation("a"))
+    assert cache.get(("a", None, None, 100)) is not None
+
+    cache.clear()
+    assert len(cache._generations) == 0
+
+
+def test_cache_holds_compressed_source_content():
+    """Test that cached histories are sized by their stored, compressed sources."""
+    save_entity_history_entry(
+        "a", "A event", [SourceModel(page_content=NEWS_SAMPLES[3] * 20)], timestamp="2024-01-15"
+    )
+    get_entity_history("a")
+
+    assert get_history_cache_stats()["resident_bytes"] < len(NEWS_SAMPLES[3] * 20)
+
+
+def test_concurrent_saves_lose_no_entries():
+    """Stress test: many threads saving to shared and separate entities."""
+    def worker(n):
+        ids = []
+        for i in range(50):
+            entity_id = "shared" if i % 2 else f"entity{n}"
+            ids.append(save_entity_history_entry(
+                entity_id, f"worker {n} entry {i}", [SourceModel(page_content="Body")], timestamp="2024-01-15"
+            ))
+        return ids
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        ids = [i for batch in pool.map(worker, range(16)) for i in batch]
+
+    assert len(ids) == len(set(ids)) == 16 * 50
+
+    shared = get_entity_history("shared", limit=10_000)
+    assert len(shared.entries) == 16 * 25
+    source_ids = [s.id for e in shared.entries for s in e.sources]
+    assert len(source_ids) == len(set(source_ids))
+    for n in range(16):
+        assert len(get_entity_history(f"entity{n}", limit=10_000).entries) == 25
+
+
+def test_retention_by_age_and_count():
+    """Test that retention evicts old entries and caps entries per entity."""
+    for day in range(1, 11):
+        save_entity_history_entry("a", f"Day {day}", [SourceModel(page_content="Body")], timestamp=f"2024-01-{day:02d}")
+    for day in range(1, 4):
+        save_entity_history_entry("b", f"Day {day}", [], timestamp=f"2024-01-{day:02d}")
+    get_entity_history("a")
+
+    configure_retention(max_age_hours=24 * 5, max_entries_per_entity=4)
+    try:
+        removed = enforce_retention(now=timestamp_to_epoch("2024-01-10T12:00:00"))
+    finally:
+        configure_retention()
+
+    assert removed == {"a": 6, "b": 3}
+    assert [e.content for e in get_entity_history("a").entries] == ["Day 10", "Day 9", "Day 8", "Day 7"]
+    assert get_entity_history("b").entries == []
+
+
+def test_retention_memory_budget_is_incremental():
+    """Test that the byte budget evicts the globally oldest entries in bounded steps."""
+    for day in range(1, 11):
+        for entity_id in ("a", "b"):
+            save_entity_history_entry(entity_id, "x" * 1000, [], timestamp=f"2024-01-{day:02d}")
+    full_size = get_store_metrics()["store"]["resident_bytes"]
+
+    configure_retention(max_bytes=full_size // 2)
+    try:
+        first_step = enforce_retention(max_entities=2)
+        while enforce_retention(max_entities=2):
+            pass
+    finally:
+        configure_retention()
+
+    assert sum(first_step.values()) == 2
+    metrics = get_store_metrics()
+    assert metrics["store"]["resident_bytes"] <= full_size // 2
+    assert metrics["store"]["entries"] == 10
+    assert len(get_entity_history("a").entries) == len(get_entity_history("b").entries) == 5
+
+
+def _fill_for_snapshot():
+    for i in range(30):
+        save_entity_history_entry(
+            f"entity{i % 3}", f"Event {i}",
+            [SourceModel(page_content=NEWS_SAMPLES[i], metadata={"url": f"https://example.com/{i}"})],
+            timestamp="2024-01-15"
+        )
+    return {f"entity{n}": get_entity_history(f"entity{n}").model_dump() for n in range(3)}
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_snapshot_and_restore(tmp_path, lazy):
+    """Test that a restored store returns the same histories and keeps counting ids."""
+    before = _fill_for_snapshot()
+    path = str(tmp_path / "history.snapshot")
+    result = snapshot_database(path)
+    assert result["entities"] == 3
+    assert result["entries"] == 30
+
+    reset_database()
+    restore_database(path, lazy=lazy)
+
+    if lazy:
+        assert get_store_metrics()["store"]["lazy_entities"] == 3
+    for entity_id, dumped in before.items():
+        assert get_entity_history(entity_id).model_dump() == dumped
+    assert save_entity_history_entry("entity0", "After restore", [], timestamp="2024-01-16") == 31
+
+
+def test_lazy_restore_unmaps_the_snapshot(tmp_path):
+    """Test that a lazy restore's mapping is closed once loaded, or by the next restore."""
+    _fill_for_snapshot()
+    path = str(tmp_path / "history.snapshot")
+    snapshot_database(path)
+
+    store = read_snapshot(path, lazy=True)
+    first = store._lazy_releases[0].__self__
+    list(store.iter_entries("entity0"))
+    assert not first.closed
+
+    read_snapshot(path, store, lazy=True)
+    assert first.closed
+    second = store._lazy_releases[0].__self__
+    for n in range(3):
+        assert len(list(store.iter_entries(f"entity{n}"))) == 10
+    assert second.closed
+    assert store._lazy_releases == []
+
+
+def test_retention_leaves_lazy_entities_until_they_load(tmp_path):
+    """Test that retention doesn't load lazily restored entities and trims them on load."""
+    _fill_for_snapshot()
+    path = str(tmp_path / "history.snapshot")
+    snapshot_database(path)
+    reset_database()
+    restore_database(path, lazy=True)
+
+    configure_retention(max_entries_per_entity=4)
+    try:
+        assert enforce_retention() == {}
+        assert get_store_metrics()["store"]["lazy_entities"] == 3
+        assert len(get_entity_history("entity0").entries) == 4
+        assert get_store_metrics()["store"]["lazy_entities"] == 2
+    finally:
+        configure_retention()
+
+
+def test_retention_worker_survives_failing_steps():
+    """Test that a step that raises doesn't stop the worker thread."""
+    calls = []
+
+    def step():
+        calls.append(1)
+        raise RuntimeError("store unavailable")
+
+    worker = RetentionWorker(step, interval_seconds=0.01)
+    worker.start()
+    time.sleep(0.2)
+    worker.stop()
+
+    assert len(calls) > 1
+    assert worker.errors == len(calls) and "store unavailable" in worker.last_error
+
+
+def test_snapshot_remaps_compression_dictionaries(tmp_path):
+    """Test restoring content compressed with a dictionary unknown to this process."""
+    codec = compression.get_codec()
+    saved_dictionaries, saved_id = dict(codec.dictionaries), codec.dictionary_id
+    try:
+        compression.configure_compression(dictionary=train_compression_dictionary(NEWS_SAMPLES))
+        before = _fill_for_snapshot()
+        path = str(tmp_path / "history.snapshot")
+        snapshot_database(path)
+
+        # Simulate a fresh process that registered a different dictionary first
+        codec.dictionaries, codec.dictionary_id = {0: b"", 1: b"unrelated dictionary"}, 0
+        reset_database()
+        restore_database(path)
+
+        assert get_entity_history("entity1").model_dump() == before["entity1"]
+    finally:
+        codec.dictionaries, codec.dictionary_id = saved_dictionaries, saved_id
+
+
+def test_restore_rejects_other_files(tmp_path):
+    """Test that a file that isn't a snapshot is refused."""
+    path = tmp_path / "not-a-snapshot"
+    path.write_bytes(b"x" * 64)
+
+    with pytest.raises(ValueError):
+        restore_database(str(path))
+
+
+def _write_dump(path, count):
+
+    rows = [
+        {
+            "entity_id": f"entity{i % 4}",
+            "content": f"Event {i}",
+            "timestamp": f"2024-01-{1 + i // 24:02d}T{i % 24:02d}:00:00",
+            "sources": [{"page_content": NEWS_SAMPLES[i % 40], "metadata": {"n": i}}],
+        }
+        for i in range(count)
+    ]
+    random.Random(7).shuffle(rows)
+    rows.append({"content": "No entity id"})
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def test_bulk_import_sorts_with_spilled_runs(tmp_path):
+    """Test that an unsorted dump imports in timestamp order with bounded buffers."""
+    path = str(tmp_path / "dump.jsonl")
+    _write_dump(path, 200)
+    reports = []
+
+    result = import_entity_history(path, buffer_entries=30, progress=reports.append)
+
+    assert result["imported"] == 200
+    assert result["skipped"] == 1
+    assert result["runs"] == 7
+    assert reports[-1]["phase"] == "load"
+
+    history = get_entity_history("entity1")
+    assert len(history.entries) == 50
+    assert [entry.content for entry in history.entries] == [f"Event {i}" for i in range(197, 0, -4)]
+    assert history.entries[0].sources[0].page_content == NEWS_SAMPLES[197 % 40]
+    assert history.entries[0].sources[0].created_at == "2024-01-09T05:00:00"
+
+
+def test_bulk_import_cli_into_log_store(tmp_path):
+    """Test the command line importer writing a log store."""
+    path = str(tmp_path / "dump.jsonl")
+    _write_dump(path, 100)
+
+    assert import_main([path, "--store-path", str(tmp_path / "history"), "--buffer-entries", "40"]) == 0
+
+    store = LogHistoryStore(str(tmp_path / "history"))
+    try:
+        records = list(store.iter_entries("entity2"))
+        assert len(records) == 25
+        assert records[0]["content"] == "Event 98"
+        assert [r["id"] for r in records] == sorted((r["id"] for r in records), reverse=True)
+    finally:
+        store.close()
+
+
+def test_export_filters_and_streams_csv(tmp_path):
+    """Test exporting entries and sources to CSV with entity and time filters."""
+    dump = str(tmp_path / "dump.jsonl")
+    _write_dump(dump, 100)
+    import_entity_history(dump)
+
+    entries_path, sources_path = str(tmp_path / "entries.csv"), str(tmp_path / "sources.csv")
+    result = export_entity_history(
+        entries_path, sources_path, entity_ids=["entity0", "entity3"],
+        start="2024-01-02T00:00:00", end="2024-01-03T23:00:00"
+    )
+
+    with open(entries_path, newline="") as f:
+        entries = list(csv.DictReader(f))
+    with open(sources_path, newline="") as f:
+        sources = list(csv.DictReader(f))
+
+    # Hours 24-71 are in range, a quarter each for entity0 and entity3
+    assert result["entries"] == len(entries) == 24
+    assert {row["entity_id"] for row in entries} == {"entity0", "entity3"}
+    assert entries[0]["content"] == "Event 68"
+    assert len(sources) == 24
+    assert sources[0]["page_content"] == NEWS_SAMPLES[68 % 40]
+    assert json.loads(sources[0]["metadata"]) == {"n": 68}
+
+
+def test_timeline_pagination_and_filters():
+    """Test cursor pages, relationship and time filters, and excluded source bodies."""
+    for i in range(25):
+        save_entity_history_entry(
+            "entity", f"Event {i}",
+            [SourceModel(page_content="body", metadata={"n": i})],
+            timestamp=f"2024-01-{i + 1:02d}T00:00:00",
+            relationship_id="partner" if i % 2 else None
+        )
+
+    contents, cursor, pages = [], None, 0
+    while True:
+        page = query_entity_timeline("entity", cursor=cursor, page_size=10)
+        contents.extend(entry.content for entry in page.entries)
+        pages += 1
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+        # Entries saved between pages don't shift the next page
+        save_entity_history_entry("entity", "Later", [], timestamp="2024-02-01T00:00:00")
+
+    assert pages == 3
+    assert contents == [f"Event {i}" for i in range(24, -1, -1)]
+
+    page = query_entity_timeline(
+        "entity", start="2024-01-05", end="2024-01-15", relationship_id="partner",
+        page_size=3, include_source_content=False
+    )
+    assert [entry.content for entry in page.entries] == ["Event 13", "Event 11", "Event 9"]
+    assert page.entries[0].sources[0].page_content == ""
+    assert page.entries[0].sources[0].metadata == {"n": 13}
+
+    page = query_entity_timeline(
+        "entity", start="2024-01-05", end="2024-01-15", relationship_id="partner",
+        cursor=page.next_cursor, page_size=3
+    )
+    assert [entry.content for entry in page.entries] == ["Event 7", "Event 5"]
+    assert page.next_cursor is None
+
+    with pytest.raises(ValueError):
+        query_entity_timeline("other", cursor=query_entity_timeline("entity", page_size=1).next_cursor)
+
+
+@pytest.mark.asyncio
+async def test_change_feed_pushes_and_resumes(tmp_path):
+    """Test that saved entries reach subscribers and that offsets resume via the outbox."""
+    outbox = str(tmp_path / "outbox.jsonl")
+    configure_change_feed(outbox_path=outbox, max_buffered=3)
+    try:
+        subscription = subscribe_changes()
+        first = asyncio.ensure_future(subscription.__anext__())
+        await asyncio.sleep(0)
+        await asave_entity_history_entry("entity", "Pushed", [], timestamp="2024-01-15")
+        event = await asyncio.wait_for(first, timeout=5)
+        assert (event.entity_id, event.content) == ("entity", "Pushed")
+        await subscription.aclose()
+
+        for i in range(5):
+            save_entity_history_entry("entity", f"Event {i}", [], timestamp="2024-01-16")
+
+        # Only three events are buffered; the rest are read back from the outbox
+        resumed = subscribe_changes(after=event.offset)
+        contents = [(await resumed.__anext__()).content for _ in range(5)]
+        await resumed.aclose()
+        assert contents == [f"Event {i}" for i in range(5)]
+
+        assert [e.content for e in iter_outbox(outbox)] == ["Pushed"] + contents
+        assert [e.content for e in iter_outbox(outbox, after=event.offset)] == contents
+    finally:
+        configure_change_feed()
+
+
+def test_racing_saves_of_one_key_publish_once(tmp_path):
+    """Test that threads saving the same idempotency key store and publish one entry."""
+    outbox = str(tmp_path / "outbox.jsonl")
+    configure_change_feed(outbox_path=outbox)
+    key = make_idempotency_key("entity", "run-1", "Event")
+    start = threading.Barrier(8)
+
+    def save(_):
+        start.wait()
+        return save_entity_history_entry("entity", "Event", [], timestamp="2024-01-15", idempotency_key=key)
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            entry_ids = list(pool.map(save, range(8)))
+    finally:
+        configure_change_feed()
+
+    assert len(set(entry_ids)) == 1
+    assert [event.entry_id for event in iter_outbox(outbox)] == entry_ids[:1]
+
+
+def test_write_behind_reads_own_writes_and_flushes(tmp_path):
+    """Test that queued entries are readable at once and reach the store in batches."""
+    save_entity_history_entry("entity", "Saved", [], timestamp="2024-01-14")
+    get_entity_history("entity")  # Cached before the queued writes
+    queue = configure_write_behind(journal_path=str(tmp_path / "queue.journal"), flush_interval=60, fsync=False)
+    try:
+        for i in range(3):
+            assert enqueue_entity_history_entry(
+                "entity", f"Queued {i}", [SourceModel(page_content="body")], timestamp="2024-01-15",
+                idempotency_key=f"key-{i}"
+            )
+        # A key already in the queue is rejected
+        assert not enqueue_entity_history_entry("entity", "Queued 0", [], timestamp="2024-01-15", idempotency_key="key-0")
+
+        assert [e.content for e in get_entity_history("entity").entries] == ["Queued 2", "Queued 1", "Queued 0", "Saved"]
+        assert get_store_metrics()["write_behind"]["queue_depth"] == 3
+
+        assert flush_write_behind(timeout=5)
+        stats = get_store_metrics()["write_behind"]
+        assert (stats["queue_depth"], stats["flushed"], stats["batches"]) == (0, 3, 1)
+        assert [r["content"] for r in get_store().iter_entries("entity")] == ["Queued 2", "Queued 1", "Queued 0", "Saved"]
+        assert [e.content for e in get_entity_history("entity").entries][:2] == ["Queued 2", "Queued 1"]
+    finally:
+        configure_write_behind(enabled=False)
+    assert queue.stats()["queue_depth"] == 0
+
+
+def test_write_behind_journal_survives_restart(tmp_path):
+    """Test that entries left in the journal are written by the next queue."""
+    journal = str(tmp_path / "queue.journal")
+    written = []
+
+    def failing_write(batch):
+        raise ConnectionError("backend down")
+
+    queue = WriteBehindQueue(failing_write, journal, flush_interval=0.01)
+    for i in range(5):
+        queue.enqueue(f"entity{i % 2}", {"content": f"Event {i}", "sources": [], "timestamp": "2024-01-15"})
+    assert not queue.flush(timeout=0.1)
+    assert queue.stats()["errors"] > 0
+    queue.close(drain=False)
+
+    queue = WriteBehindQueue(written.extend, journal, batch_size=2)
+    assert queue.flush(timeout=5)
+    queue.close()
+
+    assert [(entity_id, record["content"]) for entity_id, record in written] == [
+        (f"entity{i % 2}", f"Event {i}") for i in range(5)
+    ]
+    assert os.path.getsize(journal) == 0
+
+    # Nothing is replayed once the journal is drained
+    queue = WriteBehindQueue(written.extend, journal)
+    queue.close()
+    assert len(written) == 5
+
+
+def test_write_behind_requires_journal_and_surfaces_failing_writes(tmp_path, monkeypatch):
+    """Test that unjournaled write-behind is refused and a flush against a failing store raises."""
+    with pytest.raises(ValueError):
+        operations.configure_write_behind()
+
+    with pytest.raises(RuntimeError):
+        operations.enqueue_entity_history_entry("entity", "Not queued", [], timestamp="2024-01-15")
+
+    def insert_many(items):
+        raise ConnectionError("backend down")
+
+    operations.configure_write_behind(journal_path=str(tmp_path / "queue.journal"), flush_interval=0.01)
+    try:
+        monkeypatch.setattr(operations._store, "insert_many", insert_many)
+        operations.enqueue_entity_history_entry("entity", "Queued", [], timestamp="2024-01-16")
+        with pytest.raises(RuntimeError, match="backend down"):
+            operations.flush_write_behind(timeout=0.2)
+    finally:
+        # Leave the queued entry in the journal rather than retry the failing store
+        operations._write_behind.close(drain=False)
+        operations._write_behind = None
+
+
+def test_idempotency_keys_in_memory_store():
+    """Test that a repeated key returns the stored id and is forgotten once evicted."""
+    key = make_idempotency_key("entity", "run-1", "Event")
+    first = save_entity_history_entry("entity", "Event", [], timestamp="2024-01-15", idempotency_key=key)
+    assert save_entity_history_entry("entity", "Event", [], timestamp="2024-01-15", idempotency_key=key) == first
+    assert len(get_entity_history("entity").entries) == 1
+
+    save_entity_history_entry("entity", "Newer", [], timestamp="2024-01-16")
+    configure_retention(max_entries_per_entity=1)
+    try:
+        enforce_retention()
+    finally:
+        configure_retention()
+    assert save_entity_history_entry("entity", "Event", [], timestamp="2024-01-15", idempotency_key=key) != first
+
+
+def test_bulk_import_twice_does_not_duplicate(tmp_path):
+    """Test that re-running an import leaves the store unchanged."""
+    path = str(tmp_path / "dump.jsonl")
+    _write_dump(path, 40)
+    first = import_entity_history(path)
+    second = import_entity_history(path)
+
+    assert len(get_entity_history("entity0").entries) == 10
+    assert (first["imported"], first["skipped_duplicates"]) == (40, 0)
+    assert (second["imported"], second["skipped_duplicates"]) == (0, 40)
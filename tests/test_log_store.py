@@ -0,0 +1,284 @@
+"""Tests for the append-only log history store."""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from entity_tracker.schemas import SourceModel
+from entity_tracker.database.log_store import LogHistoryStore
+from entity_tracker.database.retention import RetentionPolicy
+from entity_tracker.database.store import timestamp_to_epoch
+from entity_tracker.database.operations import (
+    configure_store,
+    get_entity_history,
+    save_entity_history_entry,
+)
+
+
+def make_record(content, timestamp="2024-01-15T00:00:00", sources=None):
+    return {
+        "content": content,
+        "sources": sources or [],
+        "timestamp": timestamp,
+        "relationship_id": None,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogHistoryStore(str(tmp_path / "history"), max_segment_bytes=512)
+    yield store
+    store.close()
+
+
+def test_append_and_read_newest_first(store):
+    """Test that entries come back newest first with store-assigned ids."""
+    for i in range(5):
+        store.append("a", make_record(f"A{i}", sources=[{"page_content": "body", "metadata": {}}]))
+    store.append("b", make_record("B0"))
+
+    records = list(store.iter_entries("a"))
+
+    assert [r["content"] for r in records] == ["A4", "A3", "A2", "A1", "A0"]
+    assert records[0]["sources"][0]["page_content"] == "body"
+    assert len({r["id"] for r in records}) == 5
+    assert sorted(store.entity_ids()) == ["a", "b"]
+
+
+def test_time_window_and_read_many(store):
+    """Test windowed reads and the bulk read."""
+    store.append("a", make_record("old", timestamp="2024-01-01T00:00:00"))
+    store.append("a", make_record("new", timestamp="2024-01-15T00:00:00"))
+    store.append("b", make_record("b new", timestamp="2024-01-15T00:00:00"))
+
+    since = timestamp_to_epoch("2024-01-14T00:00:00")
+    assert [r["content"] for r in store.iter_entries("a", since)] == ["new"]
+
+    results = store.read_many(["a", "b", "c"], limit=1)
+    assert [r["content"] for r in results["a"]] == ["new"]
+    assert [r["content"] for r in results["b"]] == ["b new"]
+    assert results["c"] == []
+
+
+def test_reopen_and_torn_tail_recovery(tmp_path):
+    """Test that a reopened store keeps its entries and drops a torn frame."""
+    path = str(tmp_path / "history")
+    store = LogHistoryStore(path)
+    store.append("a", make_record("first"))
+    store.append("a", make_record("second"))
+    store.close()
+
+    segment = os.path.join(path, "segment-000001.log")
+    with open(segment, "ab") as f:
+        f.write(b"\x50\x00\x00\x00garbage")
+
+    reopened = LogHistoryStore(path)
+    assert [r["content"] for r in reopened.iter_entries("a")] == ["second", "first"]
+    assert reopened.append("a", make_record("third")) == 3
+    reopened.close()
+
+
+def test_segments_roll_and_compaction_drops_expired(store):
+    """Test that compaction merges segments and drops expired entries."""
+    for i in range(20):
+        timestamp = "2024-01-01T00:00:00" if i < 10 else "2024-01-15T00:00:00"
+        store.append(f"entity{i % 3}", make_record(f"entry {i} " + "x" * 50, timestamp=timestamp))
+    assert len(store.segment_numbers()) > 2
+
+    result = store.compact(max_age_hours=24 * 7, now=timestamp_to_epoch("2024-01-16T00:00:00"))
+
+    assert result["kept"] == 10
+    assert result["dropped"] == 10
+    assert sum(result["dropped_entities"].values()) == 10
+    contents = [r["content"].split()[1] for r in store.iter_entries("entity0")]
+    assert contents == ["18", "15", "12"]
+    store.append("entity0", make_record("after compaction"))
+    assert next(store.iter_entries("entity0"))["content"] == "after compaction"
+
+
+def test_ids_are_not_reused_after_compacting_everything(tmp_path):
+    """Test that a reopened store keeps counting ids past entries compaction dropped."""
+    path = str(tmp_path / "history")
+    store = LogHistoryStore(path, max_segment_bytes=200)
+    for i in range(5):
+        store.append("a", make_record(f"old {i}", timestamp="2024-01-01T00:00:00",
+                                      sources=[{"page_content": "body", "metadata": {}}]))
+    assert store.compact(max_age_hours=1)["dropped"] == 5
+    store.close()
+
+    store = LogHistoryStore(path, max_segment_bytes=200)
+    try:
+        assert store.append("a", make_record("new", sources=[{"page_content": "body", "metadata": {}}])) == 6
+        assert next(store.iter_entries("a"))["sources"][0]["id"] == 6
+    finally:
+        store.close()
+
+
+def test_operations_use_configured_store(tmp_path):
+    """Test the database functions on top of the log store."""
+    store = LogHistoryStore(str(tmp_path / "history"))
+    previous = configure_store(store)
+    try:
+        save_entity_history_entry(
+            "entity", "Event", [SourceModel(page_content="Body", metadata={"url": "https://example.com"})],
+            timestamp="2024-01-15"
+        )
+        history = get_entity_history("entity", last_hours=24, current_date="2024-01-15T12:00:00")
+
+        assert history.entries[0].content == "Event"
+        assert history.entries[0].sources[0].page_content == "Body"
+    finally:
+        configure_store(previous)
+        store.close()
+
+
+def test_iteration_survives_compaction(store):
+    """Test that a reader in the middle of an entity's history resumes after compaction."""
+    for i in range(6):
+        store.append("a", make_record(f"A{i}"))
+
+    entries = store.iter_entries("a")
+    first = [next(entries)["content"], next(entries)["content"]]
+    store.compact()
+    rest = [r["content"] for r in entries]
+
+    assert first + rest == ["A5", "A4", "A3", "A2", "A1", "A0"]
+
+
+def test_background_compaction(store):
+    """Test that the background thread compacts sealed segments."""
+    for i in range(20):
+        store.append("a", make_record("x" * 100))
+    store.start_compaction(interval_seconds=0.01, min_sealed_segments=2)
+    deadline = time.time() + 5
+    while store.compaction_count == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    store.stop_compaction()
+
+    assert store.compaction_count >= 1
+    assert len(list(store.iter_entries("a"))) == 20
+
+
+def _append_from_process(path, worker, count):
+    store = LogHistoryStore(path, max_segment_bytes=2048)
+    ids = [store.append("shared", make_record(f"worker {worker} entry {i}")) for i in range(count)]
+    store.close()
+    return ids
+
+
+def test_concurrent_appends_from_threads_and_processes(tmp_path):
+    """Stress test: threads and processes appending to one store directory."""
+    path = str(tmp_path / "history")
+    store = LogHistoryStore(path, max_segment_bytes=2048)
+
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        process_results = pool.starmap_async(_append_from_process, [(path, w, 40) for w in range(3)])
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            thread_ids = list(threads.map(
+                lambda i: store.append("shared", make_record(f"thread entry {i}")), range(80)
+            ))
+        process_ids = [i for ids in process_results.get(timeout=60) for i in ids]
+
+    all_ids = thread_ids + process_ids
+    assert len(all_ids) == len(set(all_ids)) == 200
+
+    records = list(store.iter_entries("shared"))
+    assert len(records) == 200
+    assert sorted(r["id"] for r in records) == sorted(all_ids)
+    store.close()
+
+
+def test_retention_caps_entries_per_entity(store):
+    """Test per-entity retention through compaction."""
+    for i in range(6):
+        store.append("a", make_record(f"A{i}"))
+    store.append("b", make_record("B0"))
+
+    removed = store.apply_retention(RetentionPolicy(max_entries_per_entity=2))
+
+    assert removed == {"a": 4}
+    assert [r["content"] for r in store.iter_entries("a")] == ["A5", "A4"]
+    assert store.stats()["entries"] == 3
+
+
+def test_incremental_retention_compacts_a_few_segments_per_step(tmp_path):
+    """Test that a bounded retention step rewrites only retention_segments_per_step segments."""
+    store = LogHistoryStore(str(tmp_path / "history"), max_segment_bytes=512, retention_segments_per_step=1)
+    try:
+        for i in range(20):
+            store.append(f"entity{i % 3}", make_record(f"entry {i} " + "x" * 50, timestamp="2024-01-01T00:00:00"))
+        sealed = len(store.segment_numbers())
+        assert sealed > 2
+
+        policy = RetentionPolicy(max_age_hours=24 * 7)
+        now = timestamp_to_epoch("2024-01-16T00:00:00")
+        first = store.apply_retention(policy, max_entities=10, now=now)
+        assert 0 < sum(first.values()) < 20
+
+        steps = 1
+        while store.stats()["entries"] and steps <= sealed + 1:
+            store.apply_retention(policy, max_entities=10, now=now)
+            steps += 1
+        assert store.stats()["entries"] == 0
+        assert steps > 2
+    finally:
+        store.close()
+
+
+def test_background_compaction_survives_errors(store, monkeypatch):
+    """Test that a failing compaction is logged and retried on the next tick."""
+    calls = []
+
+    def compact(*args, **kwargs):
+        calls.append(1)
+        raise OSError("disk full")
+
+    for i in range(20):
+        store.append("a", make_record(f"entry {i} " + "x" * 50))
+    monkeypatch.setattr(store, "compact", compact)
+    store.start_compaction(interval_seconds=0.01, min_sealed_segments=1)
+    time.sleep(0.2)
+    store.stop_compaction()
+
+    assert len(calls) > 1
+
+
+def test_seek_before_id_across_compaction(store):
+    """Test resuming a walk by entry id, including after the entry was compacted away."""
+    ids = []
+    for i in range(20):
+        ids.append(store.append("a", make_record(f"A{i}", timestamp=f"2024-01-{i + 1:02d}T00:00:00")))
+        store.append("b", make_record(f"B{i}"))
+
+    records = list(store.iter_entries("a", before_id=ids[10]))
+    assert [r["content"] for r in records] == [f"A{i}" for i in range(9, -1, -1)]
+
+    until = timestamp_to_epoch("2024-01-05T00:00:00")
+    assert [r["content"] for r in store.iter_entries("a", until=until, before_id=ids[10])][:2] == ["A4", "A3"]
+
+    store.compact(max_entries_per_entity=15)
+    records = list(store.iter_entries("a", before_id=ids[3]))
+    assert [r["content"] for r in records] == []
+    records = list(store.iter_entries("a", before_id=ids[12]))
+    assert [r["content"] for r in records] == [f"A{i}" for i in range(11, 4, -1)]
+
+
+def test_idempotency_keys_survive_batches_reopen_and_compaction(tmp_path):
+    """Test that a keyed entry is written once, whatever happens in between."""
+    path = str(tmp_path / "history")
+    store = LogHistoryStore(path, max_segment_bytes=512)
+    keyed = {**make_record("Keyed"), "idempotency_key": "key-1"}
+    first = store.append_many([("a", keyed), ("a", make_record("Other")), ("a", keyed)])
+    assert first[0] == first[2]
+    assert store.append("b", keyed) != first[0]  # Keys are per entity
+    store.close()
+
+    store = LogHistoryStore(path, max_segment_bytes=512)
+    try:
+        assert store.append("a", keyed) == first[0]
+        store.compact()
+        assert store.find_idempotency_key("a", "key-1") == first[0]
+        assert [r["content"] for r in store.iter_entries("a")] == ["Other", "Keyed"]
+    finally:
+        store.close()
@@ -1,8 +1,18 @@
 """Tests for utility functions."""
 
+from datetime import datetime, timezone
 import pytest
 from langchain_core.documents import Document
-from entity_tracker.utils.sources import parse_and_cap_source_content, parse_and_cap_sources
+from entity_tracker.utils.clustering import cluster_sources
+from entity_tracker.utils.duplicates import ACCEPT, ESCALATE, REJECT, classify_entries, jaccard, shingles
+from entity_tracker.utils.prefilter import prefilter_sources, window_start_for
+from entity_tracker.utils.relevance import HashingEmbedder, profile_vector, select_relevant
+from entity_tracker.utils.sources import (
+    chunk_sources,
+    estimate_source_tokens,
+    parse_and_cap_source_content,
+    parse_and_cap_sources,
+)
 
 
 def test_parse_and_cap_source_content():
@@ -64,3 +74,124 @@ def test_parse_and_cap_sources_preserves_metadata():
     assert capped[0].metadata["url"] == "https://example.com"
     assert capped[0].metadata["title"] == "Test"
 
+
+
+def test_chunk_sources_fits_token_budget():
+    """Test that sources are split in order into chunks within the budget."""
+    docs = [Document(page_content="A" * 400, metadata={"source_number": i}) for i in range(10)]
+    tokens = estimate_source_tokens(docs[0])
+    chunks = chunk_sources(docs, max_tokens=tokens * 3)
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+    assert [doc for chunk in chunks for doc in chunk] == docs
+    # An oversized source still gets a chunk
+    assert chunk_sources(docs[:2], max_tokens=1) == [[docs[0]], [docs[1]]]
+    assert chunk_sources([], max_tokens=100) == []
+
+
+def test_prefilter_sources_drop_reasons():
+    """Test that each rule drops its sources and reports why."""
+    body = "Acme Corp announced a new product line today, with shipments starting next quarter."
+    sources = [
+        Document(page_content=body, metadata={"url": "https://news.example.com/a", "published_date": "2024-06-02"}),
+        Document(page_content="", metadata={}),
+        Document(page_content="Access denied. Are you a robot?", metadata={}),
+        Document(page_content=body, metadata={"url": "https://www.spam.test/acme"}),
+        Document(page_content=body, metadata={"published_date": "2024-05-20T10:00:00Z"}),
+        Document(page_content=body.replace("Acme Corp", "A company"), metadata={"title": "Widgets"}),
+        Document(page_content=body.replace("Acme Corp", "The firm"), metadata={"title": "ACME expands"}),
+    ]
+
+    window_start = window_start_for("2024-06-02", 48)
+    assert window_start == datetime(2024, 6, 1, tzinfo=timezone.utc)
+    kept, reasons = prefilter_sources(
+        sources,
+        entity_names=["Acme"],
+        window_start=window_start,
+        domain_denylist=["spam.test"],
+        min_content_length=10,
+    )
+
+    assert kept == [sources[0], sources[6]]
+    assert reasons == {
+        "empty": 1,
+        "boilerplate": 1,
+        "denylisted_domain": 1,
+        "outside_window": 1,
+        "entity_not_mentioned": 1,
+    }
+    # With no rules configured only empty and boilerplate sources go
+    kept, reasons = prefilter_sources(sources)
+    assert len(kept) == 5 and reasons == {"empty": 1, "boilerplate": 1}
+
+
+def test_select_relevant_ranks_by_cosine_similarity():
+    """Test that hashed embeddings rank on-topic sources first and are cached."""
+    embedder = HashingEmbedder(dimensions=512)
+    profile = profile_vector(["Federal Reserve"], ["Federal Reserve held interest rates steady"], embedder)
+    sources = [
+        Document(page_content="Local bakery wins a prize for its sourdough bread", metadata={}),
+        Document(page_content="The Federal Reserve raised interest rates by a quarter point", metadata={}),
+        Document(page_content="Football club signs a new striker", metadata={}),
+        Document(page_content="Minutes show the Federal Reserve debating rates", metadata={"title": "Fed minutes"}),
+    ]
+
+    kept, scores = select_relevant(sources, profile, top_k=2, embedder=embedder)
+    assert kept == [sources[1], sources[3]]
+    assert scores.shape == (4,) and scores[1] > scores[0]
+
+    kept, _ = select_relevant(sources, profile, min_score=float(scores[1]), embedder=embedder)
+    assert sources[1] in kept and sources[0] not in kept
+
+    # The second and third scoring embedded nothing new
+    assert embedder.stats()["misses"] == 6
+
+
+def test_cluster_sources_groups_same_event():
+    """Test that reports of one event cluster and a far-apart date splits them."""
+    embedder = HashingEmbedder(dimensions=1024)
+    sources = [
+        Document(page_content="Acme Corp agreed to buy Widget Inc for $2 billion, the companies said on Monday.",
+                 metadata={"published_date": "2024-06-03"}),
+        Document(page_content="Regional weather service warns of heavy rain across the valley this weekend.",
+                 metadata={}),
+        Document(page_content="Acme Corp will buy Widget Inc for $2 billion in cash, the companies said.",
+                 metadata={"published_date": "2024-06-03"}),
+        Document(page_content="Acme Corp agreed to buy Widget Inc for $2 billion, the companies said.",
+                 metadata={"published_date": "2024-06-20"}),
+    ]
+
+    clusters = cluster_sources(sources, threshold=0.45, embedder=embedder)
+    assert sorted(sorted(cluster) for cluster in clusters) == [[0, 2], [1], [3]]
+
+    # Without the date rule the late copy joins the acquisition cluster
+    clusters = cluster_sources(sources, threshold=0.45, max_days_apart=None, embedder=embedder)
+    assert sorted(sorted(cluster) for cluster in clusters) == [[0, 2, 3], [1]]
+    assert cluster_sources([], embedder=embedder) == []
+
+
+def test_classify_entries_by_shingle_overlap():
+    """Test that new entries are accepted, copies rejected and the rest escalated."""
+    history = ["Acme Corp agreed to buy Widget Inc for $2 billion in cash on Monday."]
+    entries = [
+        "Acme Corp agreed to buy Widget Inc for $2 billion in cash on Monday.",
+        "Acme Corp agreed to buy Widget Inc for $2 billion, and regulators opened a review.",
+        "The chief executive of Acme Corp stepped down after ten years.",
+        "The chief executive of Acme Corp stepped down after ten years.",
+    ]
+
+    decisions = classify_entries(entries, history, entity_names=["Acme Corp"])
+    # The last entry repeats the one accepted before it
+    assert decisions == [REJECT, ESCALATE, ACCEPT, REJECT]
+    # Without the entity's name, the shared name keeps the new entry from being accepted
+    assert classify_entries(entries[2:3], history) == [ESCALATE]
+    assert classify_entries(entries[2:3], []) == [ACCEPT]
+
+
+def test_classify_entries_escalates_paraphrases():
+    """Test that a reworded duplicate with little shingle overlap is not accepted."""
+    history = ["Tesla announced a recall of about 2 million vehicles in the US over its Autopilot system."]
+    paraphrase = "Tesla is recalling roughly two million US vehicles to fix its driver-assistance software."
+
+    assert jaccard(shingles(paraphrase), shingles(history[0])) < 0.1
+    assert classify_entries([paraphrase], history, entity_names=["Tesla"]) == [ESCALATE]